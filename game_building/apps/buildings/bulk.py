@@ -0,0 +1,148 @@
+from collections import deque
+from game_building.apps.buildings.models import Building
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.buildings.mongo import (
+    allocate_building_ids,
+    reserve_building_ids,
+)
+from game_building.apps.buildings.notifications import notify_catalog_changed
+from game_building.apps.buildings.serializers import BuildingImportSerializer
+
+INSERT_BATCH_SIZE = 1000
+
+
+def cyclic_ids(dependencies):
+    """Return the ids of ``dependencies`` (id -> dependency ids) that can
+    never be ordered, because they are on or behind a dependency cycle."""
+    pending = {}
+    dependents = {}
+    for b_id, deps in dependencies.items():
+        deps = {d for d in deps if d in dependencies}
+        pending[b_id] = len(deps)
+        for dep_id in deps:
+            dependents.setdefault(dep_id, []).append(b_id)
+    queue = deque(b_id for b_id, count in pending.items() if count == 0)
+    while queue:
+        b_id = queue.popleft()
+        del pending[b_id]
+        for dependent in dependents.get(b_id, ()):
+            pending[dependent] -= 1
+            if pending[dependent] == 0:
+                queue.append(dependent)
+    return set(pending)
+
+
+def existing_building_ids(building_ids):
+    """Return which of ``building_ids`` are taken, in one $in query."""
+    return set(
+        Building.objects.filter(building_id__in=building_ids).values_list(
+            "building_id", flat=True
+        )
+    )
+
+
+def validate_entry(entry):
+    """Field-check one entry; returns (validated data, errors)."""
+    serializer = BuildingImportSerializer(data=entry)
+    if serializer.is_valid():
+        return serializer.validated_data, None
+    return None, serializer.errors
+
+
+def validate_import(entries):
+    """Validate a batch of building entries as a whole.
+
+    Entries may give an explicit ``building_id`` and depend on existing
+    buildings or on other entries of the batch by id. Returns the validated
+    entries, or None and the errors keyed by entry index.
+    """
+    if not isinstance(entries, list) or not entries:
+        return None, {"non_field_errors": ["Expected a non-empty list of buildings."]}
+    validated, errors = [], {}
+    for i, entry in enumerate(entries):
+        data, entry_errors = validate_entry(entry)
+        if entry_errors:
+            errors[i] = entry_errors
+        else:
+            validated.append(data)
+    if errors:
+        return None, errors
+
+    batch_ids = {}
+    for i, data in enumerate(validated):
+        if "building_id" in data:
+            if data["building_id"] in batch_ids:
+                errors[i] = {"building_id": ["Duplicate building_id in batch."]}
+            batch_ids[data["building_id"]] = i
+    # A single $in query covers id collisions and every dependency
+    referenced = set(batch_ids)
+    for data in validated:
+        referenced.update(data["dependencies"])
+    existing = existing_building_ids(referenced)
+    for i, data in enumerate(validated):
+        if data.get("building_id") in existing:
+            errors[i] = {"building_id": [f"Building {data['building_id']} exists."]}
+        missing = [
+            d for d in data["dependencies"] if d not in existing and d not in batch_ids
+        ]
+        if missing:
+            errors.setdefault(i, {})["dependencies"] = [
+                f"Dependency with id {dep_id} does not exist." for dep_id in missing
+            ]
+    if not errors:
+        cyclic = cyclic_ids(
+            {
+                data["building_id"]: data["dependencies"]
+                for data in validated
+                if "building_id" in data
+            }
+        )
+        for b_id in cyclic:
+            errors[batch_ids[b_id]] = {"dependencies": ["Dependency cycle."]}
+    if errors:
+        return None, errors
+    return validated, None
+
+
+def import_buildings(entries):
+    """Validate and insert a batch of buildings.
+
+    Returns the created Buildings, or None and the errors; nothing is
+    written unless the whole batch is valid.
+    """
+    validated, errors = validate_import(entries)
+    if errors:
+        return None, errors
+    buildings = write_buildings(validated)
+    notify_catalog_changed(building_catalog.bump(), buildings)
+    return buildings, None
+
+
+def largest_building_id(validated):
+    """Return the largest explicit ``building_id`` of ``validated``, or None."""
+    return max(
+        (data["building_id"] for data in validated if "building_id" in data),
+        default=None,
+    )
+
+
+def write_buildings(validated, reserve=True):
+    """Insert validated entries, giving ids to those without one.
+
+    Pass ``reserve=False`` when the caller has already reserved every
+    explicit id of the import, e.g. once for a whole file written in
+    batches. The caller is responsible for bumping the catalog version
+    afterwards.
+    """
+    unassigned = [data for data in validated if "building_id" not in data]
+    # Reserve explicit ids first so allocated ones are always above them
+    largest = largest_building_id(validated) if reserve else None
+    if largest is not None:
+        reserve_building_ids(largest)
+    if unassigned:
+        first_id = allocate_building_ids(len(unassigned))
+        for offset, data in enumerate(unassigned):
+            data["building_id"] = first_id + offset
+    return Building.objects.bulk_create(
+        [Building(**data) for data in validated], batch_size=INSERT_BATCH_SIZE
+    )
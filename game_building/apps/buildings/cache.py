@@ -0,0 +1,99 @@
+import threading
+from game_building.apps.buildings.models import Building
+from game_building.apps.buildings.index import CatalogIndex
+from game_building.redis_client import get_redis
+
+CATALOG_VERSION_KEY = "buildings:catalog_version"
+
+
+class BuildingCatalog:
+    """Process-local, read-through copy of the Building catalog.
+
+    The catalog is loaded once and kept keyed by ``building_id``. Before
+    serving a read the cached version is compared with the shared version
+    key in Redis, so a ``create_building`` on any uvicorn or Celery worker
+    invalidates every other worker's copy on its next read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_id = {}
+        self._ordered = []
+        self._index = None
+
+    def version(self):
+        return int(get_redis().get(CATALOG_VERSION_KEY) or 0)
+
+    def bump(self):
+        """Publish a new catalog version and drop the local copy."""
+        version = get_redis().incr(CATALOG_VERSION_KEY)
+        self.invalidate()
+        return version
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def is_current(self, version):
+        return self._version == version
+
+    @property
+    def loaded_version(self):
+        """Version of the local copy, as of the last check."""
+        return self._version
+
+    def install(self, version, buildings):
+        """Replace the local copy with ``buildings`` as of ``version``."""
+        with self._lock:
+            self._install(version, buildings)
+
+    def _install(self, version, buildings):
+        self._by_id = {b.building_id: b for b in buildings}
+        self._ordered = buildings
+        self._index = None
+        self._version = version
+
+    def _ensure_loaded(self):
+        version = self.version()
+        if self._version == version:
+            return
+        with self._lock:
+            if self._version == version:
+                return
+            # The version is read before loading, so a concurrent bump only
+            # ever causes one extra reload, never a stale catalog.
+            self._install(version, list(Building.objects.all()))
+
+    def all(self):
+        """Return every Building, in the model's default ordering."""
+        self._ensure_loaded()
+        return self._ordered
+
+    def index(self):
+        """Return the CatalogIndex for the current catalog version."""
+        self._ensure_loaded()
+        return self.current_index()
+
+    def current_index(self):
+        """Return the CatalogIndex of the local copy, without a version check."""
+        with self._lock:
+            if self._index is None:
+                self._index = CatalogIndex(self._ordered)
+            return self._index
+
+    def get(self, building_id):
+        """Return the Building with ``building_id``, or None if not found."""
+        self._ensure_loaded()
+        return self.lookup(building_id)
+
+    def lookup(self, building_id):
+        """Like get(), but from the local copy without a version check."""
+        try:
+            building_id = int(building_id)
+        except (TypeError, ValueError):
+            return None
+        return self._by_id.get(building_id)
+
+
+building_catalog = BuildingCatalog()
@@ -0,0 +1,88 @@
+from collections import deque
+from django.utils import timezone
+from game_building.apps.buildings.serializers import serialize_building
+
+
+def topological_order(buildings):
+    """Order buildings so every building comes after its dependencies.
+
+    Buildings caught in a dependency cycle can never be allowed, so they are
+    simply appended at the end.
+    """
+    by_id = {str(b.building_id): b for b in buildings}
+    pending = {}
+    dependents = {}
+    for b in buildings:
+        deps = {str(d) for d in b.dependencies if str(d) in by_id}
+        pending[str(b.building_id)] = len(deps)
+        for dep_id in deps:
+            dependents.setdefault(dep_id, []).append(str(b.building_id))
+    queue = deque(b_id for b_id, count in pending.items() if count == 0)
+    order = []
+    while queue:
+        b_id = queue.popleft()
+        order.append(by_id[b_id])
+        for dependent in dependents.get(b_id, ()):
+            pending[dependent] -= 1
+            if pending[dependent] == 0:
+                queue.append(dependent)
+    placed = {str(b.building_id) for b in order}
+    order += [b for b in buildings if str(b.building_id) not in placed]
+    return order
+
+
+class CatalogIndex:
+    """Dependency index over one version of the Building catalog.
+
+    Every building gets an integer slot in topological order, so a set of
+    buildings is a bitset (a Python int) and "all dependencies completed"
+    is a single mask test per building instead of a scan of the player's
+    buildings per dependency.
+    """
+
+    def __init__(self, buildings):
+        self.buildings = list(buildings)
+        self.slots = {}
+        for slot, building in enumerate(topological_order(self.buildings)):
+            self.slots[str(building.building_id)] = slot
+        # Dependencies missing from the catalog still get a slot, so a
+        # player holding such an id behaves exactly as before.
+        for building in self.buildings:
+            for dep_id in building.dependencies:
+                self.slots.setdefault(str(dep_id), len(self.slots))
+        self.bits = [1 << self.slots[str(b.building_id)] for b in self.buildings]
+        self.dependency_masks = []
+        for building in self.buildings:
+            mask = 0
+            for dep_id in building.dependencies:
+                mask |= 1 << self.slots[str(dep_id)]
+            self.dependency_masks.append(mask)
+        self.data = [serialize_building(b) for b in self.buildings]
+
+    def player_masks(self, player_buildings):
+        """Return ``(present, completed)`` bitsets for a player's buildings."""
+        present = completed = 0
+        now = timezone.now()
+        for b in player_buildings:
+            slot = self.slots.get(str(b.building_id))
+            if slot is None:
+                continue
+            present |= 1 << slot
+            if b.current_status(now) == "completed":
+                completed |= 1 << slot
+        return present, completed
+
+    def allowed(self, player_buildings):
+        """Yield ``(building, data)`` for buildings the player may start.
+
+        ``data`` is the building's cached serialized form and must be copied
+        before it is modified.
+        """
+        present, completed = self.player_masks(player_buildings)
+        for building, bit, mask, data in zip(
+            self.buildings, self.bits, self.dependency_masks, self.data
+        ):
+            if present & bit:
+                continue
+            if completed & mask == mask:
+                yield building, data
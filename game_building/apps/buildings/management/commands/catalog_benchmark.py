@@ -0,0 +1,60 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.buildings.models import Building
+from game_building.metrics import MONGO_COMMANDS
+
+
+def measure(func, iterations):
+    """Return ``(mongo commands, microseconds)`` per call of ``func``."""
+    commands = MONGO_COMMANDS.value("find") + MONGO_COMMANDS.value("aggregate")
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    elapsed = time.perf_counter() - started
+    commands = (
+        MONGO_COMMANDS.value("find") + MONGO_COMMANDS.value("aggregate") - commands
+    )
+    return commands / iterations, elapsed / iterations * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare catalog reads through the process-local cache with the direct "
+        "Mongo queries they replace, against the configured database and Redis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        ids = list(Building.objects.values_list("building_id", flat=True))
+        if not ids:
+            raise CommandError("The catalog is empty; run load_buildings first")
+        building_catalog.all()
+        cases = {
+            "get": (
+                lambda i: Building.objects.get(building_id=ids[i % len(ids)]),
+                lambda i: building_catalog.get(ids[i % len(ids)]),
+            ),
+            "all": (
+                lambda i: list(Building.objects.all()),
+                lambda i: building_catalog.all(),
+            ),
+        }
+        self.stdout.write(
+            f"{'read':<6}{'mongo/op':>10}{'cached/op':>11}"
+            f"{'direct us':>11}{'cached us':>11}"
+        )
+        for name, (direct, cached) in cases.items():
+            direct_commands, direct_us = measure(direct, iterations)
+            cached_commands, cached_us = measure(cached, iterations)
+            self.stdout.write(
+                f"{name:<6}{direct_commands:>10.2f}{cached_commands:>11.2f}"
+                f"{direct_us:>11.1f}{cached_us:>11.1f}"
+            )
+        self.stdout.write(
+            f"{len(ids)} buildings. Cached reads cost one Redis GET each for the "
+            "version check instead of the Mongo query."
+        )
@@ -0,0 +1,120 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from game_building.apps.buildings.index import CatalogIndex, topological_order
+from game_building.apps.buildings.models import Building
+from game_building.apps.players.models import PlayerBuilding
+
+
+def synthetic_catalog(count, max_dependencies, rng):
+    """Unsaved Buildings forming a DAG, as generate_catalog writes them."""
+    buildings = []
+    for building_id in range(1, count + 1):
+        deps = rng.sample(
+            range(1, building_id),
+            min(building_id - 1, rng.randint(0, max_dependencies)),
+        )
+        buildings.append(
+            Building(
+                building_id=building_id,
+                name=f"Building {building_id}",
+                build_time=rng.randint(5, 3600),
+                required_wood=rng.randint(0, 500),
+                required_stone=rng.randint(0, 500),
+                dependencies=sorted(deps),
+            )
+        )
+    return buildings
+
+
+def synthetic_player_buildings(catalog, owned, rng):
+    """The first ``owned`` buildings in dependency order, a tenth still running."""
+    now = timezone.now()
+    entries = []
+    for building in topological_order(catalog)[:owned]:
+        running = rng.random() < 0.1
+        entries.append(
+            PlayerBuilding(
+                building_id=str(building.building_id),
+                status="in_progress" if running else "completed",
+                started_at=now,
+                finish_eta=now + timedelta(seconds=3600 if running else -1),
+            )
+        )
+    return entries
+
+
+def scan_allowed(buildings, player_buildings):
+    """The dependency filter get_allowed_buildings ran before the index."""
+    completed_ids = [
+        str(b.building_id) for b in player_buildings if b.status == "completed"
+    ]
+    allowed = []
+    for building in buildings:
+        if any(
+            str(b.building_id) == str(building.building_id) for b in player_buildings
+        ):
+            continue
+        if all(str(dep_id) in completed_ids for dep_id in building.dependencies):
+            allowed.append(building)
+    return allowed
+
+
+def per_call_ms(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = func()
+    return (time.perf_counter() - started) / iterations * 1000, result
+
+
+class Command(BaseCommand):
+    help = (
+        "Time CatalogIndex.allowed() against the linear dependency scan it "
+        "replaced, on a synthetic catalog. Needs no database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buildings", type=int, default=10_000)
+        parser.add_argument(
+            "--owned",
+            type=int,
+            nargs="+",
+            default=[0, 100, 1000, 5000],
+            help="Buildings the player holds; one row per value",
+        )
+        parser.add_argument("--max-dependencies", type=int, default=3)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        catalog = synthetic_catalog(
+            options["buildings"], options["max_dependencies"], rng
+        )
+        build_ms, index = per_call_ms(lambda: CatalogIndex(catalog), 1)
+        self.stdout.write(
+            f"{len(catalog)} buildings; index built in {build_ms:.0f} ms "
+            "(once per catalog version)"
+        )
+        self.stdout.write(
+            f"{'owned':>7}{'allowed':>9}{'scan ms':>10}{'index ms':>10}{'speedup':>9}"
+        )
+        for owned in options["owned"]:
+            player_buildings = synthetic_player_buildings(catalog, owned, rng)
+            # The scan is quadratic; a few runs are enough to time it
+            scan_ms, expected = per_call_ms(
+                lambda: scan_allowed(catalog, player_buildings),
+                max(1, options["iterations"] // 10),
+            )
+            index_ms, allowed = per_call_ms(
+                lambda: [b for b, _ in index.allowed(player_buildings)],
+                options["iterations"],
+            )
+            if [b.building_id for b in allowed] != [b.building_id for b in expected]:
+                self.stderr.write(f"Results differ with {owned} buildings owned")
+            self.stdout.write(
+                f"{owned:>7}{len(allowed):>9}{scan_ms:>10.2f}{index_ms:>10.2f}"
+                f"{scan_ms / index_ms if index_ms else 0:>8.1f}x"
+            )
@@ -0,0 +1,64 @@
+import sys
+import time
+from django.core.management.base import BaseCommand
+from game_building.serialization import dumps
+from game_building.apps.buildings.mongo import building_collection
+
+EXPORT_FIELDS = (
+    "building_id",
+    "name",
+    "build_time",
+    "required_wood",
+    "required_stone",
+    "wood_rate",
+    "stone_rate",
+    "dependencies",
+)
+
+
+class Command(BaseCommand):
+    help = "Stream the Building catalog to a JSON Lines file, one building per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file, or - for stdout")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Cursor batch size"
+        )
+        parser.add_argument(
+            "--progress-every", type=int, default=100000, help="Report every N rows"
+        )
+
+    def handle(self, *args, **options):
+        # A server-side cursor over raw documents: memory stays at one batch
+        cursor = building_collection().find(
+            {},
+            projection={"_id": 0, **{name: 1 for name in EXPORT_FIELDS}},
+            sort=[("building_id", 1)],
+            batch_size=options["batch_size"],
+        )
+        out = (
+            sys.stdout
+            if options["path"] == "-"
+            else open(options["path"], "w", encoding="utf-8")
+        )
+        started = time.perf_counter()
+        count = 0
+        try:
+            for document in cursor:
+                out.write(dumps(document))
+                out.write("\n")
+                count += 1
+                if count % options["progress_every"] == 0:
+                    self.report(count, started)
+        finally:
+            cursor.close()
+            if out is not sys.stdout:
+                out.close()
+        self.report(count, started, done=True)
+
+    def report(self, count, started, done=False):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        prefix = "Exported" if done else "..."
+        # stderr, so exporting to stdout stays valid JSONL
+        self.stderr.write(f"{prefix} {count} buildings ({rate:.0f}/s)")
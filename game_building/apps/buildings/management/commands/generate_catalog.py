@@ -0,0 +1,43 @@
+import json
+import random
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a synthetic catalog as JSON Lines for import_catalog benchmarks. "
+        "Each building depends on up to --max-dependencies earlier ones, so the "
+        "result is always a DAG."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("count", type=int)
+        parser.add_argument("path")
+        parser.add_argument("--first-id", type=int, default=1)
+        parser.add_argument("--max-dependencies", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        first_id = options["first_id"]
+        with open(options["path"], "w", encoding="utf-8") as out:
+            for building_id in range(first_id, first_id + options["count"]):
+                earlier = building_id - first_id
+                deps = rng.sample(
+                    range(first_id, building_id),
+                    min(earlier, rng.randint(0, options["max_dependencies"])),
+                )
+                out.write(
+                    json.dumps(
+                        {
+                            "building_id": building_id,
+                            "name": f"Building {building_id}",
+                            "build_time": rng.randint(5, 3600),
+                            "required_wood": rng.randint(0, 500),
+                            "required_stone": rng.randint(0, 500),
+                            "dependencies": sorted(deps),
+                        }
+                    )
+                )
+                out.write("\n")
+        self.stdout.write(f"Wrote {options['count']} buildings to {options['path']}")
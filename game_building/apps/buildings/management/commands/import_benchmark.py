@@ -0,0 +1,71 @@
+import os
+import resource
+import tempfile
+import time
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.buildings.management.commands.import_catalog import (
+    Command as ImportCommand,
+)
+from game_building.apps.buildings.models import Building
+from game_building.apps.buildings.mongo import reserve_building_ids
+from game_building.apps.buildings.notifications import notify_catalog_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Time import_catalog's validation and write passes on a synthetic "
+        "catalog, by default 1M buildings, against the configured database. "
+        "The buildings get ids above the current catalog and are deleted "
+        "afterwards unless --keep is given; the id counter stays reserved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--max-dependencies", type=int, default=3)
+        parser.add_argument("--keep", action="store_true")
+
+    def handle(self, *args, **options):
+        last = Building.objects.order_by("-building_id").first()
+        first_id = (last.building_id if last else 0) + 1
+        count = options["count"]
+        with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as quiet:
+            path = os.path.join(tmp, "catalog.jsonl")
+            call_command(
+                "generate_catalog",
+                count,
+                path,
+                first_id=first_id,
+                max_dependencies=options["max_dependencies"],
+                stdout=self.stdout,
+            )
+            importer = ImportCommand(stdout=quiet)
+            import_options = {
+                "path": path,
+                "batch_size": options["batch_size"],
+                "progress_every": count,
+            }
+            self.stdout.write(f"{'pass':<10}{'seconds':>9}{'rows/s':>10}")
+            started = time.perf_counter()
+            errors, largest_id = importer.validate(import_options)
+            self.row("validate", count, started)
+            if errors:
+                self.stderr.write(f"{len(errors)} validation errors, e.g. {errors[0]}")
+                return
+            started = time.perf_counter()
+            try:
+                reserve_building_ids(largest_id)
+                importer.write(import_options)
+                self.row("write", count, started)
+            finally:
+                if not options["keep"]:
+                    Building.objects.filter(building_id__gte=first_id).delete()
+                    notify_catalog_changed(building_catalog.bump())
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"Peak RSS {peak_mb:.0f} MB")
+
+    def row(self, name, count, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{name:<10}{elapsed:>9.1f}{count / elapsed:>10.0f}")
@@ -0,0 +1,178 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.buildings.mongo import reserve_building_ids
+from game_building.apps.buildings.notifications import notify_catalog_changed
+from game_building.apps.buildings.bulk import (
+    cyclic_ids,
+    existing_building_ids,
+    validate_entry,
+    write_buildings,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream buildings from a JSON Lines file into the catalog in batches. "
+        "A validation pass first checks every entry, dependency reference and "
+        "the dependency graph, keeping only ids in memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON Lines file, one building per line")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only run the validation pass"
+        )
+        parser.add_argument(
+            "--skip-validation",
+            action="store_true",
+            help="Write straight away, e.g. for a file that was already checked",
+        )
+        parser.add_argument(
+            "--progress-every", type=int, default=100000, help="Report every N rows"
+        )
+        parser.add_argument("--max-errors", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options["dry_run"] and options["skip_validation"]:
+            raise CommandError("--dry-run and --skip-validation exclude each other")
+        if options["skip_validation"]:
+            largest_id = self.largest_id(options)
+        else:
+            started = time.perf_counter()
+            errors, largest_id = self.validate(options)
+            if errors:
+                for line_no, error in errors[: options["max_errors"]]:
+                    self.stderr.write(f"line {line_no}: {error}")
+                raise CommandError(f"{len(errors)} errors, nothing imported")
+            self.stdout.write(
+                f"Catalog is valid ({time.perf_counter() - started:.1f}s)"
+            )
+            if options["dry_run"]:
+                return
+        # Once for the whole file: ids allocated to entries without one in an
+        # early batch must not collide with an explicit id further down
+        if largest_id is not None:
+            reserve_building_ids(largest_id)
+        self.write(options)
+
+    def read_entries(self, path):
+        """Yield (line number, entry, error) for each non-blank line."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield line_no, json.loads(line), None
+                    except ValueError as e:
+                        yield line_no, None, f"Invalid JSON: {e}"
+        except OSError as e:
+            raise CommandError(f"Could not read {path}: {e}")
+
+    def batches(self, options):
+        batch = []
+        for item in self.read_entries(options["path"]):
+            batch.append(item)
+            if len(batch) >= options["batch_size"]:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def largest_id(self, options):
+        """Return the largest explicit building_id in the file, or None."""
+        largest = None
+        for _, entry, _ in self.read_entries(options["path"]):
+            if not isinstance(entry, dict) or entry.get("building_id") is None:
+                continue
+            try:
+                b_id = int(entry["building_id"])
+            except (TypeError, ValueError):
+                continue  # The write pass reports the line
+            if largest is None or b_id > largest:
+                largest = b_id
+        return largest
+
+    def validate(self, options):
+        """Return the errors and the largest explicit building_id."""
+        errors = []
+        # building_id -> dependencies of every entry seen so far
+        graph = {}
+        # dependency id -> first line referring to it, until it is defined
+        references = {}
+        for batch in self.batches(options):
+            valid = []
+            for line_no, entry, error in batch:
+                if error is None:
+                    data, error = validate_entry(entry)
+                if error:
+                    errors.append((line_no, error))
+                else:
+                    valid.append((line_no, data))
+            taken = existing_building_ids(
+                [data["building_id"] for _, data in valid if "building_id" in data]
+            )
+            for line_no, data in valid:
+                b_id = data.get("building_id")
+                if b_id in taken:
+                    errors.append((line_no, f"Building {b_id} already exists"))
+                elif b_id in graph:
+                    errors.append((line_no, f"Duplicate building_id {b_id}"))
+                elif b_id is not None:
+                    graph[b_id] = tuple(data["dependencies"])
+                for dep_id in data["dependencies"]:
+                    references.setdefault(dep_id, line_no)
+        # Dependencies not defined in the file must already be in the catalog
+        unresolved = [dep_id for dep_id in references if dep_id not in graph]
+        for i in range(0, len(unresolved), options["batch_size"]):
+            chunk = unresolved[i : i + options["batch_size"]]
+            existing = existing_building_ids(chunk)
+            for dep_id in chunk:
+                if dep_id not in existing:
+                    errors.append(
+                        (references[dep_id], f"Dependency {dep_id} does not exist")
+                    )
+        cyclic = sorted(cyclic_ids(graph))
+        if cyclic:
+            errors.append(
+                (
+                    "-",
+                    f"{len(cyclic)} buildings are on or behind a dependency "
+                    f"cycle, e.g. {cyclic[:10]}",
+                )
+            )
+        return errors, max(graph, default=None)
+
+    def write(self, options):
+        started = time.perf_counter()
+        count = 0
+        reported = 0
+        try:
+            for batch in self.batches(options):
+                validated = []
+                for line_no, entry, error in batch:
+                    if error is None:
+                        data, error = validate_entry(entry)
+                    if error:
+                        raise CommandError(
+                            f"line {line_no}: {error} "
+                            f"({count} buildings were imported before it)"
+                        )
+                    validated.append(data)
+                write_buildings(validated, reserve=False)
+                count += len(validated)
+                if count - reported >= options["progress_every"]:
+                    reported = count
+                    self.report("...", count, started)
+        finally:
+            if count:
+                notify_catalog_changed(building_catalog.bump())
+        self.report("Imported", count, started)
+
+    def report(self, prefix, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f"{prefix} {count} buildings ({rate:.0f}/s)")
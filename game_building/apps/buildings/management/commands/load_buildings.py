@@ -0,0 +1,35 @@
+import json
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from game_building.apps.buildings.bulk import import_buildings
+
+
+class Command(BaseCommand):
+    help = (
+        "Create buildings from a JSON array in one validated batch. Entries "
+        "may set building_id and depend on each other by id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON file, or - for stdin")
+
+    def handle(self, *args, **options):
+        try:
+            if options["path"] == "-":
+                entries = json.load(sys.stdin)
+            else:
+                with open(options["path"]) as f:
+                    entries = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        started = time.perf_counter()
+        buildings, errors = import_buildings(entries)
+        if errors:
+            for index, error in sorted(errors.items(), key=lambda item: str(item[0])):
+                self.stderr.write(f"{index}: {error}")
+            raise CommandError(f"{len(errors)} invalid entries, nothing created")
+        self.stdout.write(
+            f"Created {len(buildings)} buildings "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def seed_counter(apps, schema_editor):
+    from game_building.apps.buildings.mongo import reserve_building_ids
+
+    Building = apps.get_model("buildings", "Building")
+    last = Building.objects.order_by("-building_id").first()
+    if last:
+        reserve_building_ids(last.building_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("buildings", "0002_building_buildings_b_buildin_a134d0_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('buildings', '0003_seed_building_id_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='building',
+            name='wood_rate',
+            field=models.PositiveIntegerField(default=0, help_text='Wood produced per second once completed'),
+        ),
+        migrations.AddField(
+            model_name='building',
+            name='stone_rate',
+            field=models.PositiveIntegerField(default=0, help_text='Stone produced per second once completed'),
+        ),
+    ]
@@ -12,6 +12,12 @@ class Building(models.Model):
     )
     required_wood = models.PositiveIntegerField(blank=False)
     required_stone = models.PositiveIntegerField(blank=False)
+    wood_rate = models.PositiveIntegerField(
+        default=0, help_text="Wood produced per second once completed"
+    )
+    stone_rate = models.PositiveIntegerField(
+        default=0, help_text="Stone produced per second once completed"
+    )
     dependencies = models.JSONField(
         blank=True,
         default=list,
@@ -0,0 +1,40 @@
+from django.db import connections
+from pymongo import ReturnDocument
+from game_building.apps.buildings.models import Building
+
+COUNTERS_COLLECTION = "counters"
+BUILDING_ID_COUNTER = "buildings.building_id"
+
+
+def building_collection():
+    """Return the raw pymongo collection backing Building."""
+    return connections[Building.objects.db].get_collection(Building._meta.db_table)
+
+
+def counter_collection():
+    return connections[Building.objects.db].get_collection(COUNTERS_COLLECTION)
+
+
+def allocate_building_ids(count=1):
+    """Reserve ``count`` consecutive building ids and return the first.
+
+    A single ``$inc`` on the counter document, so concurrent creates on any
+    worker never hand out the same id.
+    """
+    document = counter_collection().find_one_and_update(
+        {"_id": BUILDING_ID_COUNTER},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return document["seq"] - count + 1
+
+
+def reserve_building_ids(up_to):
+    """Make sure the counter never hands out ids up to ``up_to`` again.
+
+    Used after writing buildings whose ids were chosen explicitly.
+    """
+    counter_collection().update_one(
+        {"_id": BUILDING_ID_COUNTER}, {"$max": {"seq": up_to}}, upsert=True
+    )
@@ -0,0 +1,15 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from game_building.apps.buildings.serializers import serialize_building
+
+CATALOG_GROUP = "catalog"
+# Bigger changes only announce the new version; clients re-fetch the catalog.
+CATALOG_PUSH_LIMIT = 100
+
+
+def notify_catalog_changed(version, buildings=()):
+    """Tell every connection that catalog ``version`` now exists."""
+    event = {"type": "catalog.changed", "version": version}
+    if 0 < len(buildings) <= CATALOG_PUSH_LIMIT:
+        event["buildings"] = [serialize_building(b) for b in buildings]
+    async_to_sync(get_channel_layer().group_send)(CATALOG_GROUP, event)
@@ -0,0 +1,26 @@
+"""Async catalog reads for the WebSocket hot paths.
+
+The catalog itself is the process-local BuildingCatalog; this module only
+checks its version with the async Redis client and, when it is stale,
+reloads it through the async Mongo driver.
+"""
+
+from game_building.mongo_client import get_async_collection, model_from_document
+from game_building.redis_client import get_async_redis
+from game_building.apps.buildings.models import Building
+from game_building.apps.buildings.cache import CATALOG_VERSION_KEY, building_catalog
+
+
+async def refresh_catalog():
+    version = int(await get_async_redis().get(CATALOG_VERSION_KEY) or 0)
+    if not building_catalog.is_current(version):
+        cursor = get_async_collection(Building).find().sort("name", 1)
+        building_catalog.install(
+            version, [model_from_document(Building, doc) async for doc in cursor]
+        )
+    return building_catalog
+
+
+async def get_building(building_id):
+    """Return the Building with ``building_id``, or None if not found."""
+    return (await refresh_catalog()).lookup(building_id)
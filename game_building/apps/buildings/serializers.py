@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Building
+from game_building.serialization import CompiledSerializer
 
 
 class BuildingSerializer(serializers.ModelSerializer):
@@ -14,6 +15,8 @@ class BuildingSerializer(serializers.ModelSerializer):
             "build_time",
             "required_wood",
             "required_stone",
+            "wood_rate",
+            "stone_rate",
             "dependencies",
         ]
         read_only_fields = ["id"]
@@ -22,6 +25,9 @@ class BuildingSerializer(serializers.ModelSerializer):
         return str(obj.id)
 
 
+serialize_building = CompiledSerializer(BuildingSerializer)
+
+
 class BuildingCreateSerializer(serializers.ModelSerializer):
     dependencies = serializers.JSONField(default=list, required=False)
 
@@ -33,14 +39,48 @@ class BuildingCreateSerializer(serializers.ModelSerializer):
             "build_time",
             "required_wood",
             "required_stone",
+            "wood_rate",
+            "stone_rate",
             "dependencies",
         ]
+        # Allocated from the id counter on save
+        read_only_fields = ["building_id"]
 
     def validate_dependencies(self, value):
-        print(f"Validating dependencies: {value}")
-        for dep_id in value:
-            if not Building.objects.filter(building_id=dep_id).exists():
+        try:
+            if not isinstance(value, list):
+                raise TypeError
+            ids = [int(dep_id) for dep_id in value]
+        except (TypeError, ValueError):
+            raise serializers.ValidationError("Expected a list of building ids.")
+        # One $in query for the whole list instead of one exists() per id
+        found = set(
+            Building.objects.filter(building_id__in=ids).values_list(
+                "building_id", flat=True
+            )
+        )
+        for dep_id, building_id in zip(value, ids):
+            if building_id not in found:
                 raise serializers.ValidationError(
                     f"Dependency with id {dep_id} does not exist."
                 )
         return value
+
+
+class BuildingImportSerializer(BuildingCreateSerializer):
+    """Field checks for one entry of a bulk import.
+
+    Uniqueness and dependency existence are checked for the whole batch at
+    once by import_buildings, so nothing here touches the database.
+    """
+
+    building_id = serializers.IntegerField(min_value=1, required=False)
+    dependencies = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), default=list, required=False
+    )
+
+    class Meta(BuildingCreateSerializer.Meta):
+        read_only_fields = []
+
+    def validate_dependencies(self, value):
+        return value
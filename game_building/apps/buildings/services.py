@@ -1,46 +1,46 @@
 from asgiref.sync import sync_to_async
-from game_building.apps.buildings.models import Building
-from game_building.apps.buildings.serializers import (
-    BuildingCreateSerializer,
-    BuildingSerializer,
-)
+from game_building.metrics import timed_async, timed_sync_to_async
+from game_building.apps.buildings.bulk import import_buildings
+from game_building.apps.buildings.mongo import allocate_building_ids
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.buildings.notifications import notify_catalog_changed
+from game_building.apps.buildings.repository import refresh_catalog
+from game_building.apps.buildings.serializers import BuildingCreateSerializer
 from datetime import timedelta
 from django.utils import timezone
-from game_building.apps.players.tasks import complete_building_task
-from game_building.config.celery import app as celery_app
+from game_building.apps.players.leaderboard import arecord_player
+from game_building.apps.players.notifications import anotify_player_changed
+from game_building.apps.players.repository import update_player_building
+from game_building.apps.players.build_queue import project_queue
+from game_building.apps.players.scheduler import schedule_wake
 
-revoke = celery_app.control.revoke
 
-
-@sync_to_async
+@timed_sync_to_async
 def create_building(data):
-    last = Building.objects.order_by("-building_id").first()
-    next_id = (last.building_id + 1) if last else 1
-    data["building_id"] = next_id
     serializer = BuildingCreateSerializer(data=data)
     if not serializer.is_valid():
         return None, serializer.errors
-    building = serializer.save(building_id=next_id)
+    building = serializer.save(building_id=allocate_building_ids())
+    notify_catalog_changed(building_catalog.bump(), [building])
     return building, None
 
 
-@sync_to_async
+@timed_sync_to_async
+def create_buildings(entries):
+    return import_buildings(entries)
+
+
+@timed_sync_to_async
 def get_building(building_id):
-    try:
-        building = Building.objects.get(building_id=building_id)
-        return building
-    except Building.DoesNotExist:
-        return None
+    return building_catalog.get(building_id)
 
 
-@sync_to_async
-def accelerate_building(player, building_id, percent):
-    pb = next(
-        (b for b in player.buildings if str(b.building_id) == str(building_id)), None
-    )
-    if not pb or pb.status != "in_progress":
-        return {"type": "error", "error": "Building not in progress"}
+@timed_async
+async def accelerate_building(player, building_id, percent):
     now = timezone.now()
+    pb = player.get_building(building_id)
+    if not pb or pb.current_status(now) != "in_progress":
+        return {"type": "error", "error": "Building not in progress"}
     finish_eta = pb.finish_eta
     time_left = (finish_eta - now).total_seconds()
     if time_left <= 0:
@@ -48,82 +48,104 @@ def accelerate_building(player, building_id, percent):
     reduction = time_left * (percent / 100)
     new_time_left = max(0, time_left - reduction)
     new_finish_eta = now + timedelta(seconds=new_time_left)
-    # Cancel old celery task
-    if pb.celery_task_id:
-        revoke(pb.celery_task_id, terminate=True)
     # If new_time_left == 0, complete immediately
     if new_time_left == 0:
-        complete_building_task.delay(str(player.id), str(building_id))
-        pb.finish_eta = now
-        pb.status = "completed"
-        pb.celery_task_id = None
-        player.save()
-        return {
+        await update_player_building(
+            player, building_id, finish_eta=now, status="completed", celery_task_id=None
+        )
+        # The freed slot lets the build queue start at once
+        await sync_to_async(schedule_wake)(player, now)
+        await anotify_player_changed(player.id, player.version)
+        await arecord_player(player, now)
+        return await with_queue(
+            player,
+            {
+                "type": "building_accelerated",
+                "building_id": building_id,
+                "status": "completed",
+                "version": player.version,
+            },
+        )
+    await update_player_building(
+        player, building_id, finish_eta=new_finish_eta, celery_task_id=None
+    )
+    # Moving the completion moves the player's single wake-up, and with it
+    # every queued build waiting on this one
+    await sync_to_async(schedule_wake)(player, now)
+    await anotify_player_changed(player.id, player.version)
+    return await with_queue(
+        player,
+        {
             "type": "building_accelerated",
             "building_id": building_id,
-            "status": "completed",
-        }
-    # Schedule new celery task
-    result = complete_building_task.apply_async(
-        args=[str(player.id), str(building_id)],
-        countdown=new_time_left,
+            "new_finish_eta": new_finish_eta.isoformat(),
+            "version": player.version,
+        },
     )
-    pb.finish_eta = new_finish_eta
-    pb.celery_task_id = result.id
-    player.save()
-    return {
-        "type": "building_accelerated",
-        "building_id": building_id,
-        "new_finish_eta": new_finish_eta.isoformat(),
-    }
-
-
-@sync_to_async
-def get_allowed_buildings(player):
+
+
+async def with_queue(player, result):
+    """Add the shifted queue estimates to ``result`` if the player has a queue."""
+    if player.queue:
+        catalog = await refresh_catalog()
+        result["queue"] = project_queue(player, timezone.now(), catalog.lookup)
+    return result
+
+
+def not_modified(request, version):
+    return {"type": "not_modified", "request": request, "version": version}
+
+
+@timed_async
+async def get_catalog(if_version=None):
+    catalog = await refresh_catalog()
+    index = catalog.current_index()
+    version = str(catalog.loaded_version)
+    if if_version == version:
+        return not_modified("get_catalog", version)
+    return {"type": "catalog", "version": version, "buildings": index.data}
+
+
+@timed_async
+async def get_allowed_buildings(player, if_version=None):
     try:
-        all_buildings = Building.objects.all()
+        catalog = await refresh_catalog()
+        index = catalog.current_index()
+        catalog_version = str(catalog.loaded_version)
+        # "<catalog version>:<player state version>", sent back as if_version
+        version = f"{catalog_version}:{player.state_version()}"
+        if if_version == version:
+            return not_modified("get_allowed_buildings", version)
+        # A client holding this catalog version only needs the flags
+        prefix = f"{catalog_version}:"
+        flags_only = isinstance(if_version, str) and if_version.startswith(prefix)
+        resources = player.current_resources()
         allowed_buildings = []
-        # Get player's completed buildings
-        completed_building_ids = [
-            str(b.building_id) for b in player.buildings if b.status == "completed"
-        ]
-
-        for building in all_buildings:
-            # Check if player already has this building (in progress or completed)
-            player_has_building = any(
-                str(b.building_id) == str(building.building_id)
-                for b in player.buildings
+        for building, data in index.allowed(player.buildings):
+            # Check if player has enough resources
+            has_resources = (
+                resources.wood >= building.required_wood
+                and resources.stone >= building.required_stone
             )
-
-            if player_has_building:
-                continue
-            # Check if player has all dependencies
-            dependencies_met = True
-            for dep_id in building.dependencies:
-                if str(dep_id) not in completed_building_ids:
-                    dependencies_met = False
-                    break
-            if dependencies_met:
-                # Check if player has enough resources
-                has_resources = player.has_sufficient_resources(
-                    building.required_wood, building.required_stone
-                )
-                building_data = BuildingSerializer(building).data
-                building_data["can_afford"] = has_resources
-                building_data["missing_resources"] = (
-                    {
-                        "wood": max(0, building.required_wood - player.resources.wood),
-                        "stone": max(
-                            0, building.required_stone - player.resources.stone
-                        ),
-                    }
-                    if not has_resources
-                    else None
-                )
-                allowed_buildings.append(building_data)
+            if flags_only:
+                building_data = {"building_id": building.building_id}
+            else:
+                building_data = dict(data)
+            building_data["can_afford"] = has_resources
+            building_data["missing_resources"] = (
+                {
+                    "wood": max(0, building.required_wood - resources.wood),
+                    "stone": max(0, building.required_stone - resources.stone),
+                }
+                if not has_resources
+                else None
+            )
+            allowed_buildings.append(building_data)
 
         return {
             "type": "allowed_buildings",
+            "version": version,
+            "flags_only": flags_only,
             "buildings": allowed_buildings,
             "total_count": len(allowed_buildings),
         }
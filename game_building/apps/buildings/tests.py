@@ -0,0 +1,152 @@
+from unittest import mock
+from asgiref.sync import sync_to_async
+import io
+import json
+import os
+import tempfile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.buildings.models import Building
+from game_building.apps.buildings.mongo import BUILDING_ID_COUNTER, counter_collection
+from game_building.apps.buildings.serializers import (
+    BuildingSerializer,
+    serialize_building,
+)
+from game_building.apps.buildings.services import get_allowed_buildings
+from game_building.apps.players.models import Player, Resources
+
+
+class SerializationTests(SimpleTestCase):
+    def test_compiled_serializer_matches_drf(self):
+        building = Building(
+            building_id=7,
+            name="Sägewerk",
+            build_time=120,
+            required_wood=300,
+            required_stone=150,
+            wood_rate=2,
+            dependencies=[1, 4],
+        )
+        self.assertEqual(
+            json.dumps(serialize_building(building)),
+            json.dumps(BuildingSerializer(building).data),
+        )
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class ImportCatalogTests(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(building_catalog, "bump", return_value=1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def import_lines(self, entries, *args):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "catalog.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in entries)
+            call_command("import_catalog", path, *args, stdout=io.StringIO())
+
+    def entry(self, name, **fields):
+        return {"name": name, "build_time": 10, "dependencies": [], **fields}
+
+    def test_explicit_id_after_unassigned_entries_is_not_allocated_early(self):
+        counter = counter_collection().find_one({"_id": BUILDING_ID_COUNTER})
+        explicit_id = (counter["seq"] if counter else 0) + 1
+        for args in ((), ("--skip-validation",)):
+            with self.subTest(args=args):
+                # Batches of one: the unassigned entries are written before
+                # the line that claims the next free id explicitly
+                self.import_lines(
+                    [
+                        self.entry("First"),
+                        self.entry("Second"),
+                        self.entry("Explicit", building_id=explicit_id),
+                    ],
+                    "--batch-size",
+                    "1",
+                    *args,
+                )
+                ids = dict(Building.objects.values_list("name", "building_id"))
+                self.assertEqual(ids["Explicit"], explicit_id)
+                self.assertGreater(ids["First"], explicit_id)
+                self.assertGreater(ids["Second"], ids["First"])
+                Building.objects.all().delete()
+                explicit_id = ids["Second"] + 1
+
+
+@override_settings(LAZY_BUILD_COMPLETION=False)
+class AllowedBuildingsVersionTests(TransactionTestCase):
+    def setUp(self):
+        Building.objects.bulk_create(
+            [
+                Building(building_id=1, name="Farm", build_time=10, required_wood=100),
+                Building(building_id=2, name="Mill", build_time=10, required_wood=200),
+                Building(
+                    building_id=3,
+                    name="Bakery",
+                    build_time=10,
+                    dependencies=[1],
+                ),
+            ]
+        )
+        building_catalog.bump()
+        self.player = Player(
+            version=3, resources=Resources(wood=150, stone=1000), buildings=[]
+        )
+
+    async def test_unchanged_version_is_not_modified(self):
+        full = await get_allowed_buildings(self.player)
+        self.assertEqual(full["type"], "allowed_buildings")
+        self.assertFalse(full["flags_only"])
+        self.assertEqual(
+            [(b["building_id"], b["name"], b["can_afford"]) for b in full["buildings"]],
+            [(1, "Farm", True), (2, "Mill", False)],
+        )
+        self.assertEqual(
+            full["buildings"][1]["missing_resources"], {"wood": 50, "stone": 0}
+        )
+        result = await get_allowed_buildings(self.player, if_version=full["version"])
+        self.assertEqual(
+            result,
+            {
+                "type": "not_modified",
+                "request": "get_allowed_buildings",
+                "version": full["version"],
+            },
+        )
+
+    async def test_player_change_sends_flags_only(self):
+        full = await get_allowed_buildings(self.player)
+        self.player.version += 1
+        self.player.resources.wood = 250
+        result = await get_allowed_buildings(self.player, if_version=full["version"])
+        self.assertEqual(result["type"], "allowed_buildings")
+        self.assertNotEqual(result["version"], full["version"])
+        self.assertTrue(result["flags_only"])
+        self.assertEqual(
+            result["buildings"],
+            [
+                {"building_id": 1, "can_afford": True, "missing_resources": None},
+                {"building_id": 2, "can_afford": True, "missing_resources": None},
+            ],
+        )
+
+    async def test_catalog_bump_sends_full_payload(self):
+        full = await get_allowed_buildings(self.player)
+        await sync_to_async(building_catalog.bump)()
+        result = await get_allowed_buildings(self.player, if_version=full["version"])
+        self.assertEqual(result["type"], "allowed_buildings")
+        self.assertNotEqual(result["version"], full["version"])
+        self.assertFalse(result["flags_only"])
+        self.assertEqual(result["buildings"], full["buildings"])
+
+    async def test_unknown_version_sends_full_payload(self):
+        for if_version in (None, "", "garbage", 7):
+            with self.subTest(if_version=if_version):
+                result = await get_allowed_buildings(self.player, if_version=if_version)
+                self.assertEqual(result["type"], "allowed_buildings")
+                self.assertFalse(result["flags_only"])
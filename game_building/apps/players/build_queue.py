@@ -0,0 +1,163 @@
+"""Per-player build queue.
+
+Queued buildings start on their own once the player has a free build slot
+(fewer than ``BUILD_QUEUE_SLOTS`` builds in progress), the building's
+dependencies are completed and the player can afford it. Items are
+considered in queue order. One still waiting for a dependency is passed
+over, but the first one the player cannot afford yet holds back everything
+behind it, so the order decides what resources are spent on first.
+
+The queue is advanced by the completion scheduler, which keeps a single
+wake-up per player at next_wake(): the earliest of the player's next
+completion and the moment the queue can move on.
+"""
+
+from bisect import insort
+from datetime import timedelta
+from django.conf import settings
+from game_building.apps.players.models import PlayerBuilding
+
+
+def in_progress_count(player, now):
+    return sum(1 for b in player.buildings if b.current_status(now) == "in_progress")
+
+
+def dependencies_met(player, building, now):
+    for dep_id in building.dependencies:
+        dep = player.get_building(dep_id)
+        if dep is None or dep.current_status(now) != "completed":
+            return False
+    return True
+
+
+def scan_queue(player, now, lookup):
+    """Return the queue's next step at ``now``, or None if it cannot move.
+
+    ``("start", item, building)`` for the first item that can start,
+    ``("drop", item, building)`` for an item that never can (its building
+    is gone or already started) and ``("wait", item, building)`` when the
+    first item with its dependencies met is not affordable yet. ``lookup``
+    maps a building_id to its Building.
+    """
+    if in_progress_count(player, now) >= settings.BUILD_QUEUE_SLOTS:
+        return None
+    for item in player.queue:
+        building = lookup(item.building_id)
+        if building is None or player.get_building(item.building_id) is not None:
+            return "drop", item, building
+        if not dependencies_met(player, building, now):
+            continue
+        if player.has_sufficient_resources(
+            building.required_wood, building.required_stone, now
+        ):
+            return "start", item, building
+        return "wait", item, building
+    return None
+
+
+def start_queued(player, now, lookup):
+    """Start every queued building that can start at ``now``, in memory.
+
+    Returns ``(started, dropped)``: the ``(PlayerBuilding, Building)`` pairs
+    started and the number of items removed as unstartable. The caller
+    persists the player.
+    """
+    started = []
+    dropped = 0
+    while True:
+        step = scan_queue(player, now, lookup)
+        if step is None or step[0] == "wait":
+            return started, dropped
+        action, item, building = step
+        player.queue = [q for q in player.queue if q is not item]
+        if action == "drop":
+            dropped += 1
+            continue
+        player.settle_resources(now)
+        player.resources.wood -= building.required_wood
+        player.resources.stone -= building.required_stone
+        pb = PlayerBuilding(
+            building_id=str(building.building_id),
+            status="in_progress",
+            started_at=now,
+            finish_eta=now + timedelta(seconds=building.build_time),
+            celery_task_id=None,
+            wood_rate=building.wood_rate,
+            stone_rate=building.stone_rate,
+        )
+        player.buildings.append(pb)
+        started.append((pb, building))
+
+
+def next_wake(player, now, lookup):
+    """Return when the scheduler next has work for ``player``, or None."""
+    times = [b.finish_eta for b in player.buildings if b.status == "in_progress"]
+    step = scan_queue(player, now, lookup) if player.queue else None
+    if step is not None:
+        action, item, building = step
+        if action != "wait":
+            times.append(now)
+        else:
+            affordable = player.affordable_at(
+                building.required_wood, building.required_stone, now
+            )
+            if affordable is not None:
+                times.append(affordable)
+    return min(times, default=None)
+
+
+def project_queue(player, now, lookup):
+    """Estimate when each queued building starts and finishes.
+
+    Follows slots and dependencies but not resources, so an item the
+    player cannot afford yet starts later than estimated. Items whose
+    dependencies are neither started nor queued get no estimate.
+    """
+    finished = {}
+    running = []
+    for b in player.buildings:
+        status = b.current_status(now)
+        if status == "completed":
+            finished[str(b.building_id)] = now
+        elif status == "in_progress":
+            finished[str(b.building_id)] = b.finish_eta
+            running.append(b.finish_eta)
+    running.sort()
+    estimates = {}
+    pending = list(player.queue)
+    # Repeat until stuck: an item may wait on one queued behind it
+    while pending:
+        waiting = []
+        for item in pending:
+            building = lookup(item.building_id)
+            if building is None or not all(
+                str(dep_id) in finished for dep_id in building.dependencies
+            ):
+                waiting.append(item)
+                continue
+            start = max(
+                [now] + [finished[str(dep_id)] for dep_id in building.dependencies]
+            )
+            busy = [eta for eta in running if eta > start]
+            if len(busy) >= settings.BUILD_QUEUE_SLOTS:
+                # Wait until enough of them finish to free a slot
+                start = busy[len(busy) - settings.BUILD_QUEUE_SLOTS]
+            finish = start + timedelta(seconds=building.build_time)
+            insort(running, finish)
+            finished[item.building_id] = finish
+            estimates[item.building_id] = (start, finish)
+        if len(waiting) == len(pending):
+            break
+        pending = waiting
+    projection = []
+    for item in player.queue:
+        start, finish = estimates.get(item.building_id, (None, None))
+        projection.append(
+            {
+                "building_id": item.building_id,
+                "queued_at": item.queued_at.isoformat(),
+                "estimated_start": start.isoformat() if start else None,
+                "estimated_finish": finish.isoformat() if finish else None,
+            }
+        )
+    return projection
@@ -0,0 +1,2 @@
+class StalePlayerError(Exception):
+    """Raised when a Player is saved over a newer version of itself."""
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class HashingPoolBusy(Exception):
+    """Raised instead of queueing when the hashing pool is saturated."""
+
+
+_executor = None
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def _init_worker():
+    django.setup()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASHING_WORKERS, initializer=_init_worker
+        )
+    return _executor
+
+
+def _release(future):
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight -= 1
+
+
+async def _run(func, *args):
+    global _in_flight
+    with _in_flight_lock:
+        if _in_flight >= settings.PASSWORD_HASHING_QUEUE_LIMIT:
+            raise HashingPoolBusy("Server busy, please retry")
+        _in_flight += 1
+    try:
+        future = _get_executor().submit(func, *args)
+    except BaseException:
+        _release(None)
+        raise
+    # The slot is held by the pool job, not by the caller: a cancelled
+    # caller (e.g. a client that disconnected) leaves a running job
+    # behind, and it counts until the pool reports it done.
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password(raw_password):
+    """Hash a password in the process pool, off the sync_to_async executor."""
+    return await _run(make_password, raw_password)
+
+
+async def verify_password(raw_password, encoded):
+    return await _run(check_password, raw_password, encoded)
@@ -0,0 +1,166 @@
+"""Player rankings kept in Redis sorted sets.
+
+Scores are maintained where players are written instead of being computed
+from the Player documents:
+
+- ``completed``: buildings completed.
+- ``spent``: wood plus stone of every building the player has started,
+  directly or from the build queue, at catalog prices.
+
+Both are written as the player's absolute value and only ever raised
+(ZADD GT), so a retried write, a build settled lazily by another write or
+two writers racing cannot skew them.
+
+Members are player ids; usernames live in one hash next to the boards.
+Ranks are ZREVRANK lookups, O(log n) in the number of players. Players
+with equal scores are ordered by id. ``manage.py rebuild_leaderboard``
+recomputes every board from the database.
+"""
+
+import logging
+import redis
+from django.utils import timezone
+from game_building.apps.buildings.cache import building_catalog
+from game_building.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+BOARDS = ("completed", "spent")
+NAMES_KEY = "leaderboard:names"
+
+# Writes go to the live boards and, while rebuild_leaderboard is running,
+# to its staging keys as well, so the swap at the end keeps them.
+# KEYS are the names hash and the boards, then their staging keys; ARGV
+# the member, its username and one score per board.
+_RECORD_SCRIPT = """
+local boards = #KEYS / 2 - 1
+local staging = boards + 2
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+for i = 1, boards do
+    redis.call('ZADD', KEYS[1 + i], 'GT', ARGV[2 + i], ARGV[1])
+end
+if redis.call('EXISTS', KEYS[staging]) == 1 then
+    redis.call('HSET', KEYS[staging], ARGV[1], ARGV[2])
+    for i = 1, boards do
+        redis.call('ZADD', KEYS[staging + i], 'GT', ARGV[2 + i], ARGV[1])
+    end
+end
+return 0
+"""
+
+
+def board_key(board):
+    return f"leaderboard:{board}"
+
+
+def staging_key(key):
+    """Where rebuild_leaderboard builds the replacement for ``key``."""
+    return f"{key}:rebuild"
+
+
+def leaderboard_keys():
+    return [NAMES_KEY] + [board_key(board) for board in BOARDS]
+
+
+def record_keys():
+    keys = leaderboard_keys()
+    return keys + [staging_key(key) for key in keys]
+
+
+def completed_count(player, now=None):
+    now = now or timezone.now()
+    return sum(1 for b in player.buildings if b.current_status(now) == "completed")
+
+
+def building_cost(building):
+    return building.required_wood + building.required_stone
+
+
+def spent_total(player, lookup):
+    """Cost of every building the player has started; ``lookup`` maps a
+    building_id to its Building."""
+    total = 0
+    for b in player.buildings:
+        building = lookup(b.building_id)
+        if building is not None:
+            total += building_cost(building)
+    return total
+
+
+def record_args(player, now):
+    scores = {
+        "completed": completed_count(player, now),
+        "spent": spent_total(player, building_catalog.lookup),
+    }
+    return [str(player.id), player.username] + [scores[board] for board in BOARDS]
+
+
+def record_players(players, now=None):
+    """Write the scores of each of ``players`` as written.
+
+    Costs come from this process's catalog copy as last loaded; a building
+    missing from it only leaves ``spent`` short until the next write.
+    """
+    if not players:
+        return
+    client = get_redis()
+    try:
+        record = client.register_script(_RECORD_SCRIPT)
+        pipe = client.pipeline(transaction=False)
+        for player in players:
+            record(keys=record_keys(), args=record_args(player, now), client=pipe)
+        pipe.execute()
+    except redis.RedisError as e:
+        # The game state is already written; rebuild_leaderboard catches up
+        logger.warning(
+            "Failed to update leaderboard for %d players: %s", len(players), e
+        )
+
+
+async def arecord_player(player, now=None):
+    """Async record_players() for a single player."""
+    client = get_async_redis()
+    try:
+        await client.register_script(_RECORD_SCRIPT)(
+            keys=record_keys(), args=record_args(player, now)
+        )
+    except redis.RedisError as e:
+        logger.warning("Failed to update leaderboard for player %s: %s", player.id, e)
+
+
+def _score(value):
+    return int(value) if value == int(value) else value
+
+
+async def get_page(board, offset, limit):
+    """Return ``(entries, total)`` for ranks ``offset + 1`` onwards."""
+    client = get_async_redis()
+    pipe = client.pipeline(transaction=False)
+    pipe.zrevrange(board_key(board), offset, offset + limit - 1, withscores=True)
+    pipe.zcard(board_key(board))
+    rows, total = await pipe.execute()
+    names = (
+        await client.hmget(NAMES_KEY, [member for member, _ in rows]) if rows else []
+    )
+    entries = [
+        {
+            "rank": offset + i + 1,
+            "player_id": member.decode(),
+            "username": name.decode() if name is not None else None,
+            "score": _score(score),
+        }
+        for i, ((member, score), name) in enumerate(zip(rows, names))
+    ]
+    return entries, total
+
+
+async def get_rank(board, player_id):
+    """Return ``(rank, score, total)``; rank and score are None if unranked."""
+    pipe = get_async_redis().pipeline(transaction=False)
+    pipe.zrevrank(board_key(board), str(player_id))
+    pipe.zscore(board_key(board), str(player_id))
+    pipe.zcard(board_key(board))
+    rank, score, total = await pipe.execute()
+    if rank is None:
+        return None, None, total
+    return rank + 1, _score(score), total
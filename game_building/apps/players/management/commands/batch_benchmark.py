@@ -0,0 +1,91 @@
+import asyncio
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from game_building.apps.players.management.commands.loadtest import (
+    CommunicatorTransport,
+    SimulatedClient,
+    WebsocketTransport,
+    percentile,
+)
+
+DEFAULT_COMMANDS = "get_player_info,get_allowed_buildings,get_catalog,get_my_rank"
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a set of commands sent one at a time, each waiting for its "
+        "response, against the same commands in one batch frame."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=200)
+        parser.add_argument(
+            "--commands", default=DEFAULT_COMMANDS, help="Comma-separated types"
+        )
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument(
+            "--url",
+            help="ws:// URL of a running server; its rate limits apply, and "
+            "rate_limited replies are counted as errors. Without it, "
+            "GameConsumer runs in-process like loadtest, with rate limiting "
+            "off, against MONGO_URI and REDIS_URL.",
+        )
+
+    def handle(self, *args, **options):
+        commands = [c.strip() for c in options["commands"].split(",") if c.strip()]
+        if options["url"]:
+            sequential, batched, errors = asyncio.run(self.run(commands, options))
+        else:
+            with override_settings(
+                CHANNEL_LAYERS={
+                    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+                },
+                BUILD_COMPLETION_BACKEND="memory",
+                WS_RATE_LIMIT=0,
+                WS_RATE_LIMITS={},
+            ):
+                sequential, batched, errors = asyncio.run(self.run(commands, options))
+        self.stdout.write(f"{len(commands)} commands per round: {', '.join(commands)}")
+        self.stdout.write(f"{'':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, latencies in (("sequential", sequential), ("batch", batched)):
+            self.stdout.write(
+                f"{name:<12}"
+                + "".join(
+                    f"{percentile(latencies, pct) * 1000:>9.2f}" for pct in (50, 95, 99)
+                )
+            )
+        if errors:
+            self.stderr.write(f"{errors} responses were errors or rate_limited")
+
+    async def run(self, commands, options):
+        stats = {}
+        transport = (
+            WebsocketTransport(options["url"])
+            if options["url"]
+            else CommunicatorTransport()
+        )
+        client = SimulatedClient(
+            transport, f"batch-{uuid.uuid4().hex[:8]}", stats, options["timeout"]
+        )
+        await transport.connect()
+        sequential, batched = [], []
+        try:
+            await client.authenticate()
+            for _ in range(options["rounds"]):
+                started = time.perf_counter()
+                for msg_type in commands:
+                    await client.request(msg_type)
+                sequential.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                response = await client.request(
+                    "batch", {"commands": [{"type": t} for t in commands]}
+                )
+                batched.append(time.perf_counter() - started)
+                if response["type"] != "batch_result":
+                    raise CommandError(f"Batch failed: {response}")
+        finally:
+            await transport.close()
+        errors = sum(entry["errors"] for entry in stats.values())
+        return sequential, batched, errors
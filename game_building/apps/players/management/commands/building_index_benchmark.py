@@ -0,0 +1,59 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from game_building.apps.players.management.commands.patch_benchmark import (
+    sample_player,
+)
+
+
+def scan_building(player, building_id):
+    """Player.get_building as it was before buildings_by_id."""
+    for b in player.buildings:
+        if str(b.building_id) == str(building_id):
+            return b
+    return None
+
+
+def per_lookup_us(func, player, ids):
+    started = time.perf_counter()
+    for building_id in ids:
+        func(player, building_id)
+    return (time.perf_counter() - started) / len(ids) * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        "Time Player.get_building through the buildings_by_id index against "
+        "a linear scan, for players holding many buildings. Needs no database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--buildings",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000, 5000],
+            help="Buildings the player holds; one row per value",
+        )
+        parser.add_argument("--lookups", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self.stdout.write(
+            f"{'buildings':>10}{'build us':>10}{'scan us':>10}"
+            f"{'index us':>10}{'speedup':>9}"
+        )
+        for count in options["buildings"]:
+            player = sample_player(count)
+            # A quarter of the lookups miss, as dependency checks often do
+            ids = [rng.randrange(count + count // 3) for _ in range(options["lookups"])]
+            started = time.perf_counter()
+            player.buildings_by_id()
+            build_us = (time.perf_counter() - started) * 1e6
+            scan_us = per_lookup_us(scan_building, player, ids)
+            index_us = per_lookup_us(type(player).get_building, player, ids)
+            self.stdout.write(
+                f"{count:>10}{build_us:>10.0f}{scan_us:>10.2f}{index_us:>10.2f}"
+                f"{scan_us / index_us:>8.1f}x"
+            )
@@ -0,0 +1,149 @@
+import asyncio
+import time
+import uuid
+from contextlib import ExitStack
+from unittest import mock
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.players.management.commands.loadtest import (
+    CommunicatorTransport,
+    SimulatedClient,
+    percentile,
+)
+from game_building.apps.players.models import Player
+
+DEFAULT_COMMANDS = "get_player_info,get_allowed_buildings,get_catalog,update_resources"
+# The default mix's one write, which also goes out as a player_updated push
+PAYLOADS = {"update_resources": {"wood": 1000}}
+
+
+async def sync_refresh_player(player):
+    await sync_to_async(player.refresh_from_db)()
+    player.invalidate_building_index()
+    return player
+
+
+async def sync_get_player(player_id):
+    try:
+        player_id = ObjectId(player_id)
+    except (InvalidId, TypeError):
+        return None
+    return await sync_to_async(Player.objects.filter(id=player_id).first)()
+
+
+async def sync_refresh_catalog():
+    await sync_to_async(building_catalog.all)()
+    return building_catalog
+
+
+# Where the hot paths call the async repositories, and what they did
+# before: the same reads through the ORM and sync Redis client, each one a
+# hop to the thread-sensitive sync_to_async executor.
+SYNC_PATHS = {
+    "game_building.consumers.refresh_player": sync_refresh_player,
+    "game_building.apps.players.services.refresh_player": sync_refresh_player,
+    "game_building.apps.players.services.get_player": sync_get_player,
+    "game_building.apps.players.services.refresh_catalog": sync_refresh_catalog,
+    "game_building.apps.buildings.services.refresh_catalog": sync_refresh_catalog,
+    "game_building.apps.buildings.repository.refresh_catalog": sync_refresh_catalog,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive GameConsumer in-process on the in-memory channel layer with "
+        "clients that send their next command as soon as the last one is "
+        "answered, and report messages per second. The sync mode puts the "
+        "hot-path reads back on sync_to_async, as before the async "
+        "repositories. Needs the Mongo in MONGO_URI and Redis (or "
+        "--fake-redis)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=50)
+        parser.add_argument("--duration", type=float, default=10, help="Seconds")
+        parser.add_argument(
+            "--commands", default=DEFAULT_COMMANDS, help="Comma-separated types"
+        )
+        parser.add_argument(
+            "--modes", nargs="+", choices=("sync", "async"), default=["sync", "async"]
+        )
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument("--fake-redis", action="store_true")
+
+    def handle(self, *args, **options):
+        commands = [c.strip() for c in options["commands"].split(",") if c.strip()]
+        self.stdout.write(
+            f"{options['clients']} clients, {options['duration']:.0f}s per mode: "
+            f"{', '.join(commands)}"
+        )
+        self.stdout.write(
+            f"{'mode':<8}{'messages':>10}{'msg/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+            f"{'errors':>8}"
+        )
+        for mode in options["modes"]:
+            with ExitStack() as stack:
+                stack.enter_context(
+                    override_settings(
+                        CHANNEL_LAYERS={
+                            "default": {
+                                "BACKEND": "channels.layers.InMemoryChannelLayer"
+                            }
+                        },
+                        BUILD_COMPLETION_BACKEND="memory",
+                        REDIS_BACKEND="fake" if options["fake_redis"] else "redis",
+                        WS_RATE_LIMIT=0,
+                        WS_RATE_LIMITS={},
+                    )
+                )
+                if mode == "sync":
+                    for target, replacement in SYNC_PATHS.items():
+                        stack.enter_context(mock.patch(target, replacement))
+                latencies, errors, elapsed = asyncio.run(self.run(commands, options))
+            self.stdout.write(
+                f"{mode:<8}{len(latencies):>10}{len(latencies) / elapsed:>10.0f}"
+                f"{percentile(latencies, 50) * 1000:>9.2f}"
+                f"{percentile(latencies, 99) * 1000:>9.2f}{errors:>8}"
+            )
+
+    async def run(self, commands, options):
+        run_id = uuid.uuid4().hex[:8]
+        stats = {}
+        clients = [
+            SimulatedClient(
+                CommunicatorTransport(),
+                f"bench_{run_id}_{i}",
+                stats,
+                options["timeout"],
+            )
+            for i in range(options["clients"])
+        ]
+        for client in clients:
+            await client.transport.connect()
+        try:
+            await asyncio.gather(*(client.authenticate() for client in clients))
+            stats.clear()
+            started = time.perf_counter()
+            deadline = started + options["duration"]
+
+            async def drive(client, offset):
+                i = offset
+                while time.perf_counter() < deadline:
+                    msg_type = commands[i % len(commands)]
+                    await client.request(msg_type, PAYLOADS.get(msg_type))
+                    i += 1
+
+            await asyncio.gather(
+                *(drive(client, i) for i, client in enumerate(clients))
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            for client in clients:
+                await client.transport.close()
+        latencies = [lat for entry in stats.values() for lat in entry["latencies"]]
+        errors = sum(entry["errors"] for entry in stats.values())
+        return latencies, errors, elapsed
@@ -0,0 +1,295 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+DEFAULT_MIX = (
+    "get_player_info=4,get_allowed_buildings=4,start_building=1,accelerate_building=1"
+)
+DEFAULT_MIX_TYPES = [part.split("=")[0] for part in DEFAULT_MIX.split(",")]
+# Server pushes that can arrive while a client is waiting for a response.
+PUSH_TYPES = {
+    "building_completed",
+    "player_updated",
+    "player_patch",
+    "catalog_updated",
+    "queued_building_started",
+}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        msg_type, _, weight = part.partition("=")
+        mix[msg_type.strip()] = float(weight or 1)
+    unknown = set(mix) - set(DEFAULT_MIX_TYPES)
+    if unknown:
+        raise CommandError(f"Unknown message types in --mix: {', '.join(unknown)}")
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[k]
+
+
+class CommunicatorTransport:
+    """Drives GameConsumer in-process through the channels test client."""
+
+    def __init__(self):
+        # channels.testing itself imports daphne, which is not a dependency
+        from channels.testing.websocket import WebsocketCommunicator
+        from game_building.consumers import GameConsumer
+
+        self.communicator = WebsocketCommunicator(GameConsumer.as_asgi(), "/ws/game/")
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect()
+        if not connected:
+            raise CommandError("GameConsumer refused the connection")
+
+    async def send(self, data):
+        await self.communicator.send_to(text_data=json.dumps(data))
+
+    async def receive(self, timeout):
+        return json.loads(await self.communicator.receive_from(timeout=timeout))
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class WebsocketTransport:
+    """Talks to a running server over a real WebSocket."""
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+
+    async def connect(self):
+        import websockets
+
+        self.ws = await websockets.connect(self.url)
+
+    async def send(self, data):
+        await self.ws.send(json.dumps(data))
+
+    async def receive(self, timeout):
+        return json.loads(await asyncio.wait_for(self.ws.recv(), timeout))
+
+    async def close(self):
+        await self.ws.close()
+
+
+class SimulatedClient:
+    def __init__(self, transport, username, stats, timeout):
+        self.transport = transport
+        self.username = username
+        self.stats = stats
+        self.timeout = timeout
+        self.allowed = []
+        self.in_progress = []
+
+    async def request(self, msg_type, data=None):
+        """Send one command and wait for its response, recording latency."""
+        started = time.perf_counter()
+        await self.transport.send({"type": msg_type, **(data or {})})
+        while True:
+            response = await self.transport.receive(self.timeout)
+            if response.get("type") not in PUSH_TYPES:
+                break
+            if response["type"] == "building_completed":
+                self.in_progress = [
+                    b for b in self.in_progress if b != str(response["building_id"])
+                ]
+        latency = time.perf_counter() - started
+        entry = self.stats.setdefault(msg_type, {"latencies": [], "errors": 0})
+        entry["latencies"].append(latency)
+        if (
+            "error" in response
+            or response.get("type", "").endswith("_failed")
+            or response.get("type") == "rate_limited"
+        ):
+            entry["errors"] += 1
+        return response
+
+    async def authenticate(self):
+        credentials = {"username": self.username, "password": "loadtest-password"}
+        response = await self.request(
+            "register", {**credentials, "email": f"{self.username}@loadtest.local"}
+        )
+        if response["type"] != "register_success":
+            response = await self.request("login", credentials)
+            if response["type"] != "login_success":
+                raise CommandError(f"Could not authenticate {self.username}")
+
+    async def run_one(self, msg_type):
+        if msg_type == "start_building":
+            if not self.allowed:
+                msg_type = "get_allowed_buildings"
+            else:
+                building_id = self.allowed.pop(random.randrange(len(self.allowed)))
+                response = await self.request(
+                    "start_building", {"building_id": building_id}
+                )
+                if response["type"] == "building_started":
+                    self.in_progress.append(str(building_id))
+                return
+        if msg_type == "accelerate_building":
+            if not self.in_progress:
+                msg_type = "get_player_info"
+            else:
+                building_id = random.choice(self.in_progress)
+                await self.request(
+                    "accelerate_building",
+                    {"building_id": building_id, "percent": random.randint(10, 100)},
+                )
+                return
+        response = await self.request(msg_type)
+        if response["type"] == "allowed_buildings":
+            self.allowed = [
+                b["building_id"] for b in response["buildings"] if b["can_afford"]
+            ]
+
+    async def run(self, mix, rate, deadline):
+        types, weights = zip(*mix.items())
+        interval = 1 / rate
+        next_at = time.perf_counter()
+        while time.perf_counter() < deadline:
+            await self.run_one(random.choices(types, weights)[0])
+            next_at += interval
+            await asyncio.sleep(max(0, next_at - time.perf_counter()))
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate concurrent players against ws/game/ and report throughput "
+        "and latency percentiles per message type."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=50)
+        parser.add_argument("--duration", type=float, default=30, help="Seconds")
+        parser.add_argument(
+            "--rate", type=float, default=2, help="Messages per second per client"
+        )
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="type=weight,...")
+        parser.add_argument(
+            "--buildings", type=int, default=20, help="Buildings to seed first"
+        )
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument(
+            "--url",
+            help="ws:// URL of a running server. Without it, GameConsumer runs "
+            "in-process on the in-memory channel layer and completion "
+            "scheduler, but still needs the Mongo in MONGO_URI and the Redis "
+            "in REDIS_URL (or --fake-redis).",
+        )
+        parser.add_argument(
+            "--fake-redis",
+            action="store_true",
+            help="In-process only: keep Redis in memory with fakeredis, so only "
+            "Mongo must be running, e.g. as a CI service. Without lupa the "
+            "leaderboard scripts fail and are only logged.",
+        )
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        if options["url"] and options["fake_redis"]:
+            raise CommandError("--fake-redis only applies without --url")
+        if options["url"]:
+            stats, elapsed = asyncio.run(self.run_load(mix, options))
+        else:
+            with override_settings(
+                CHANNEL_LAYERS={
+                    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+                },
+                BUILD_COMPLETION_BACKEND="memory",
+                REDIS_BACKEND="fake" if options["fake_redis"] else "redis",
+            ):
+                stats, elapsed = asyncio.run(self.run_load(mix, options))
+        self.report(stats, elapsed)
+
+    def transport(self, options):
+        if options["url"]:
+            return WebsocketTransport(options["url"])
+        return CommunicatorTransport()
+
+    async def run_load(self, mix, options):
+        run_id = uuid.uuid4().hex[:8]
+        seed_stats = {}
+        seeder = SimulatedClient(
+            self.transport(options), "seed", seed_stats, options["timeout"]
+        )
+        await seeder.transport.connect()
+        for i in range(options["buildings"]):
+            await seeder.request(
+                "create_building",
+                {
+                    "name": f"loadtest-{run_id}-{i}",
+                    "build_time": random.randint(5, 60),
+                    "required_wood": random.randint(1, 50),
+                    "required_stone": random.randint(1, 50),
+                    "dependencies": [],
+                },
+            )
+        await seeder.transport.close()
+
+        stats = {}
+        clients = [
+            SimulatedClient(
+                self.transport(options),
+                f"loadtest_{run_id}_{i}",
+                stats,
+                options["timeout"],
+            )
+            for i in range(options["clients"])
+        ]
+        for client in clients:
+            await client.transport.connect()
+        await asyncio.gather(*(client.authenticate() for client in clients))
+
+        scheduler = None
+        if not options["url"]:
+            scheduler = asyncio.create_task(self.run_scheduler())
+        started = time.perf_counter()
+        deadline = started + options["duration"]
+        await asyncio.gather(
+            *(client.run(mix, options["rate"], deadline) for client in clients)
+        )
+        elapsed = time.perf_counter() - started
+        if scheduler:
+            scheduler.cancel()
+        for client in clients:
+            await client.transport.close()
+        return stats, elapsed
+
+    async def run_scheduler(self):
+        from asgiref.sync import sync_to_async
+        from game_building.apps.players.scheduler import run_due_completions
+
+        while True:
+            await sync_to_async(run_due_completions)()
+            await asyncio.sleep(0.1)
+
+    def report(self, stats, elapsed):
+        self.stdout.write(
+            f"{'type':<24}{'count':>8}{'errors':>8}{'msg/s':>10}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        )
+        for msg_type, entry in sorted(stats.items()):
+            latencies = entry["latencies"]
+            self.stdout.write(
+                f"{msg_type:<24}{len(latencies):>8}{entry['errors']:>8}"
+                f"{len(latencies) / elapsed:>10.1f}"
+                f"{percentile(latencies, 50) * 1000:>10.2f}"
+                f"{percentile(latencies, 95) * 1000:>10.2f}"
+                f"{percentile(latencies, 99) * 1000:>10.2f}"
+            )
+        total = sum(len(entry["latencies"]) for entry in stats.values())
+        self.stdout.write(f"Total: {total} messages in {elapsed:.1f}s")
@@ -0,0 +1,68 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from game_building.apps.players.models import Player, PlayerBuilding, Resources
+from game_building.apps.players.serializers import player_patch, serialize_player
+from game_building.serialization import dumps, msgpack, packb
+
+
+def sample_player(buildings):
+    now = timezone.now()
+    return Player(
+        username="player1",
+        email="player1@example.com",
+        resources=Resources(
+            wood=12500, stone=9800, wood_rate=3, stone_rate=1, settled_at=now
+        ),
+        buildings=[
+            PlayerBuilding(
+                building_id=str(i),
+                status="in_progress" if i % 3 == 0 else "completed",
+                started_at=now - timedelta(seconds=600 + i),
+                finish_eta=now + timedelta(seconds=i if i % 3 == 0 else -i),
+                wood_rate=i % 4,
+                stone_rate=i % 2,
+            )
+            for i in range(buildings)
+        ],
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the size of a completion pushed as a player_patch with the "
+        "full player_updated snapshot, for players of growing size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--buildings",
+            type=int,
+            nargs="+",
+            default=[1, 10, 50, 200, 1000],
+            help="Buildings the player holds; one row per value",
+        )
+
+    def handle(self, *args, **options):
+        header = f"{'buildings':>10}{'snapshot B':>12}{'patch B':>9}{'ratio':>8}"
+        if msgpack is not None:
+            header += f"{'snap mpack':>12}{'patch mpack':>13}"
+        self.stdout.write(header)
+        for count in options["buildings"]:
+            player = sample_player(count)
+            # One build completing: the frame each mode sends for it
+            snapshot = {"type": "player_updated", "player": serialize_player(player)}
+            patch = {
+                "type": "player_patch",
+                "version": 42,
+                "changes": player_patch(player, player.buildings[:1]),
+            }
+            snapshot_bytes = len(dumps(snapshot).encode())
+            patch_bytes = len(dumps(patch).encode())
+            row = (
+                f"{count:>10}{snapshot_bytes:>12}{patch_bytes:>9}"
+                f"{snapshot_bytes / patch_bytes:>7.1f}x"
+            )
+            if msgpack is not None:
+                row += f"{len(packb(snapshot)):>12}{len(packb(patch)):>13}"
+            self.stdout.write(row)
@@ -0,0 +1,149 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.players.leaderboard import (
+    NAMES_KEY,
+    board_key,
+    building_cost,
+    leaderboard_keys,
+    staging_key,
+)
+from game_building.apps.players.mongo import player_collection
+from game_building.redis_client import get_redis
+
+# Keeps the staging keys in existence while nothing has been scanned yet
+PLACEHOLDER = "__rebuild__"
+# A crashed rebuild's staging keys expire, so writers stop mirroring
+STAGING_TTL = 3600
+
+# KEYS are (staging, live) pairs. Each staging key replaces its live key,
+# or the live key is dropped if nothing was staged.
+_SWAP_SCRIPT = """
+for i = 1, #KEYS, 2 do
+    if redis.call('TYPE', KEYS[i]).ok == 'hash' then
+        redis.call('HDEL', KEYS[i], ARGV[1])
+    else
+        redis.call('ZREM', KEYS[i], ARGV[1])
+    end
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('RENAME', KEYS[i], KEYS[i + 1])
+        redis.call('PERSIST', KEYS[i + 1])
+    else
+        redis.call('DEL', KEYS[i + 1])
+    end
+end
+return 0
+"""
+
+
+def completed_expression(now):
+    """Aggregation form of ``completed_match``: is ``$$b`` completed by ``now``."""
+    completed = {"$eq": ["$$b.status", "completed"]}
+    if not settings.LAZY_BUILD_COMPLETION:
+        return completed
+    return {
+        "$or": [
+            completed,
+            {
+                "$and": [
+                    {"$eq": ["$$b.status", "in_progress"]},
+                    {"$lte": ["$$b.finish_eta", now]},
+                ]
+            },
+        ]
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every leaderboard from the Player documents, streaming "
+        "players in batches, and swap the result in atomically. Safe to run "
+        "while players are being written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Players per batch"
+        )
+        parser.add_argument(
+            "--progress-every", type=int, default=100000, help="Report every N players"
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        costs = {str(b.building_id): building_cost(b) for b in building_catalog.all()}
+        client = get_redis()
+        # Created before the scan starts. Scores only go up, and every write
+        # after this point is mirrored into the staging keys with ZADD GT,
+        # so the staged value is the newer of the document read and the
+        # live write. Writes before it are already in the documents.
+        staging = {key: staging_key(key) for key in leaderboard_keys()}
+        setup = client.pipeline(transaction=True)
+        setup.delete(*staging.values())
+        for key, staged in staging.items():
+            if key == NAMES_KEY:
+                setup.hset(staged, PLACEHOLDER, "")
+            else:
+                setup.zadd(staged, {PLACEHOLDER: 0})
+            setup.expire(staged, STAGING_TTL)
+        setup.execute()
+        # Mongo counts completed builds; only the ids travel for the costs
+        cursor = player_collection().aggregate(
+            [
+                {
+                    "$project": {
+                        "username": 1,
+                        "building_ids": {"$ifNull": ["$buildings.building_id", []]},
+                        "completed": {
+                            "$size": {
+                                "$filter": {
+                                    "input": {"$ifNull": ["$buildings", []]},
+                                    "as": "b",
+                                    "cond": completed_expression(now),
+                                }
+                            }
+                        },
+                    }
+                }
+            ],
+            batchSize=options["batch_size"],
+        )
+        started = time.perf_counter()
+        count = 0
+        pipe = client.pipeline(transaction=False)
+        try:
+            for document in cursor:
+                member = str(document["_id"])
+                spent = sum(costs.get(str(b), 0) for b in document["building_ids"])
+                pipe.zadd(
+                    staging[board_key("completed")],
+                    {member: document["completed"]},
+                    gt=True,
+                )
+                pipe.zadd(staging[board_key("spent")], {member: spent}, gt=True)
+                pipe.hset(staging[NAMES_KEY], member, document.get("username", ""))
+                count += 1
+                if count % options["batch_size"] == 0:
+                    for staged in staging.values():
+                        pipe.expire(staged, STAGING_TTL)
+                    pipe.execute()
+                if count % options["progress_every"] == 0:
+                    self.report(count, started)
+            pipe.execute()
+        finally:
+            cursor.close()
+
+        # Readers see the old boards until this atomic swap
+        client.register_script(_SWAP_SCRIPT)(
+            keys=[k for key, staged in staging.items() for k in (staged, key)],
+            args=[PLACEHOLDER],
+        )
+        self.report(count, started, done=True)
+
+    def report(self, count, started, done=False):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        prefix = "Rebuilt leaderboards from" if done else "..."
+        self.stdout.write(f"{prefix} {count} players ({rate:.0f}/s)")
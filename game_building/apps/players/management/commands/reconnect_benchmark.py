@@ -0,0 +1,62 @@
+import time
+from bson import ObjectId
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from game_building.apps.players.models import Player
+from game_building.apps.players.tokens import (
+    decode_resume_token,
+    issue_resume_token,
+    password_fingerprint,
+)
+
+
+def per_call_ms(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the CPU a reconnect costs with a password login and with a "
+        "resume token, and what a reconnect storm takes with each. Needs no "
+        "database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clients", type=int, default=10_000, help="Reconnects in the storm"
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        password = "reconnect-benchmark"
+        player = Player(
+            id=ObjectId(), username="player1", password=make_password(password)
+        )
+        token = issue_resume_token(player)
+
+        def resume():
+            claims = decode_resume_token(token)
+            return claims["pwd"] == password_fingerprint(player)
+
+        login_ms = per_call_ms(
+            lambda: check_password(password, player.password), options["iterations"]
+        )
+        resume_ms = per_call_ms(resume, options["iterations"] * 100)
+        clients = options["clients"]
+        workers = settings.PASSWORD_HASHING_WORKERS
+        self.stdout.write(f"{'':<8}{'ms/reconnect':>14}{'storm s':>10}")
+        # Logins are spread over the hashing pool; resumes run on the loop
+        self.stdout.write(
+            f"{'login':<8}{login_ms:>14.3f}{login_ms * clients / workers / 1000:>10.1f}"
+        )
+        self.stdout.write(
+            f"{'resume':<8}{resume_ms:>14.3f}{resume_ms * clients / 1000:>10.1f}"
+        )
+        self.stdout.write(
+            f"Storm of {clients} reconnects; logins across {workers} hashing "
+            "workers. Both paths then load the player with one read by id."
+        )
@@ -0,0 +1,41 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from game_building.metrics import start_http_server
+from game_building.apps.players.scheduler import (
+    get_completion_backend,
+    run_due_completions,
+)
+
+
+class Command(BaseCommand):
+    help = "Complete buildings as their finish_eta passes, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.BUILD_COMPLETION_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.BUILD_COMPLETION_POLL_INTERVAL,
+            help="Seconds to sleep when nothing is due",
+        )
+        parser.add_argument(
+            "--metrics-port", type=int, help="Serve Prometheus metrics on this port"
+        )
+
+    def handle(self, *args, **options):
+        backend = get_completion_backend()
+        batch_size = options["batch_size"]
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+        self.stdout.write(f"Completion scheduler started ({len(backend)} pending)")
+        while True:
+            completed, max_lag = run_due_completions(backend, limit=batch_size)
+            if completed:
+                self.stdout.write(
+                    f"Completed {completed} buildings, max lag {max_lag:.3f}s"
+                )
+            if completed < batch_size:
+                time.sleep(options["interval"])
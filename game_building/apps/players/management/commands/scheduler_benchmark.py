@@ -0,0 +1,110 @@
+import random
+import resource
+import time
+from django.core.management.base import BaseCommand
+from game_building.apps.players.scheduler import (
+    InMemoryCompletionBackend,
+    RedisCompletionBackend,
+    wake_member,
+)
+
+BENCHMARK_KEY = "benchmark:completions"
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill a completion index with wake-ups spread over a day, then drain a "
+        "burst of due ones in scheduler-sized batches. Reports insert cost, "
+        "memory and the delay the index adds before the last of the burst is "
+        "picked up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=("memory", "redis"), default="memory")
+        parser.add_argument("--members", type=int, default=1_000_000)
+        parser.add_argument(
+            "--due", type=int, default=10_000, help="Wake-ups already due"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["backend"] == "redis":
+            # A separate key, so the live index is never touched
+            backend = RedisCompletionBackend(key=BENCHMARK_KEY)
+            backend.client.delete(backend.key, backend.versions_key)
+        else:
+            backend = InMemoryCompletionBackend()
+        rng = random.Random(options["seed"])
+        members, due = options["members"], min(options["due"], options["members"])
+        now = time.time()
+        rss = peak_rss_mb()
+
+        started = time.perf_counter()
+        for i in range(members):
+            eta = now - rng.uniform(0, 60) if i < due else now + rng.uniform(1, 86400)
+            backend.set_wake(wake_member(f"{i:024x}"), eta, 0)
+        insert_seconds = time.perf_counter() - started
+        rss = peak_rss_mb() - rss
+        if options["backend"] == "redis":
+            # What the production index costs Redis, sorted set and hash
+            redis_bytes = {
+                key: backend.client.memory_usage(key, samples=0) or 0
+                for key in (backend.key, backend.versions_key)
+            }
+
+        drained = batches = 0
+        worst_batch = 0.0
+        started = time.perf_counter()
+        while True:
+            batch_started = time.perf_counter()
+            entries = backend.due(now, options["batch_size"])
+            if not entries:
+                break
+            backend.ack(entries)
+            worst_batch = max(worst_batch, time.perf_counter() - batch_started)
+            drained += len(entries)
+            batches += 1
+        drain_seconds = time.perf_counter() - started
+        remaining = len(backend)
+        if options["backend"] == "redis":
+            versions_left = backend.client.hlen(backend.versions_key)
+            backend.client.delete(backend.key, backend.versions_key)
+
+        self.stdout.write(f"backend              {options['backend']}")
+        self.stdout.write(f"members              {members}")
+        self.stdout.write(
+            f"insert               {insert_seconds:.2f}s "
+            f"({insert_seconds / members * 1e6:.1f} us/member)"
+        )
+        if options["backend"] == "memory":
+            self.stdout.write(
+                f"peak RSS growth      {rss:.0f} MB "
+                f"({rss * 1024 * 1024 / members:.0f} B/member)"
+            )
+        else:
+            for label, key in (
+                ("redis zset", backend.key),
+                ("redis versions", backend.versions_key),
+            ):
+                self.stdout.write(
+                    f"{label:<21}{redis_bytes[key] / 1024 / 1024:.0f} MB "
+                    f"({redis_bytes[key] / members:.0f} B/member)"
+                )
+        self.stdout.write(f"drained              {drained} in {batches} batches")
+        self.stdout.write(
+            f"drain                {drain_seconds * 1000:.1f} ms "
+            f"(worst batch {worst_batch * 1000:.2f} ms)"
+        )
+        self.stdout.write(f"still indexed        {remaining}")
+        if options["backend"] == "redis":
+            self.stdout.write(f"versions left        {versions_left}")
+        self.stdout.write(
+            "The drain time is the lag the index adds for the last wake-up of "
+            "the burst; the database writes per batch come on top."
+        )
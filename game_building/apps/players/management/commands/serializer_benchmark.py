@@ -0,0 +1,51 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from game_building.apps.players.management.commands.patch_benchmark import (
+    sample_player,
+)
+from game_building.apps.players.serializers import PlayerSerializer, serialize_player
+from game_building.serialization import dumps, orjson
+
+
+def per_call_us(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the compiled player serializer against DRF's, and dumps() "
+        "against the standard library encoder."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--buildings",
+            type=int,
+            nargs="+",
+            default=[1, 10, 50, 200],
+            help="Buildings the player holds; one row per value",
+        )
+        parser.add_argument("--iterations", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        self.stdout.write(
+            f"{'buildings':>10}{'drf us':>9}{'compiled us':>13}"
+            f"{'json us':>9}{'dumps us':>10}"
+        )
+        for count in options["buildings"]:
+            player = sample_player(count)
+            message = {"type": "player_info", "player": serialize_player(player)}
+            self.stdout.write(
+                f"{count:>10}"
+                f"{per_call_us(lambda: PlayerSerializer(player).data, iterations):>9.1f}"
+                f"{per_call_us(lambda: serialize_player(player), iterations):>13.1f}"
+                f"{per_call_us(lambda: json.dumps(message), iterations):>9.1f}"
+                f"{per_call_us(lambda: dumps(message), iterations):>10.1f}"
+            )
+        if orjson is None:
+            self.stdout.write("orjson is not installed; dumps() used the fallback.")
@@ -0,0 +1,105 @@
+import json
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from game_building.serialization import dumps, msgpack, packb, unpackb
+
+
+def iso(dt):
+    # Matches DRF's DateTimeField output
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def sample_messages(buildings):
+    now = timezone.now()
+    player_buildings = [
+        {
+            "building_id": str(i),
+            "status": "completed" if i % 3 else "in_progress",
+            "started_at": iso(now - timedelta(seconds=600 + i)),
+            "finish_eta": iso(now + timedelta(seconds=i)),
+            "celery_task_id": None,
+            "wood_rate": i % 4,
+            "stone_rate": i % 2,
+        }
+        for i in range(buildings)
+    ]
+    player = {
+        "id": "687948b0bffebbedce620a57",
+        "username": "player1",
+        "email": "player1@example.com",
+        "resources": {
+            "wood": 12500,
+            "stone": 9800,
+            "wood_rate": 3,
+            "stone_rate": 1,
+            "settled_at": iso(now),
+        },
+        "buildings": player_buildings,
+    }
+    allowed = [
+        {
+            "id": "687948b0bffebbedce620a57",
+            "building_id": i,
+            "name": f"Building {i}",
+            "build_time": 60 + i,
+            "required_wood": 10 * i,
+            "required_stone": 5 * i,
+            "wood_rate": i % 4,
+            "stone_rate": i % 2,
+            "dependencies": [i - 1] if i else [],
+            "can_afford": bool(i % 2),
+            "missing_resources": None if i % 2 else {"wood": i, "stone": 0},
+        }
+        for i in range(buildings)
+    ]
+    return {
+        "get_player_info": {"type": "get_player_info"},
+        "player_info": {"type": "player_info", "player": player, "version": 42},
+        "allowed_buildings": {
+            "type": "allowed_buildings",
+            "version": "7:42",
+            "flags_only": False,
+            "buildings": allowed,
+            "total_count": len(allowed),
+        },
+        "building_completed": {"type": "building_completed", "building_id": "12"},
+        "player_updated": {"type": "player_updated", "player": player},
+    }
+
+
+def per_message_us(func, payload, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(payload)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+class Command(BaseCommand):
+    help = "Compare JSON and MessagePack frames: bytes and encode/decode CPU."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--buildings", type=int, default=50, help="Entries per list payload"
+        )
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if msgpack is None:
+            raise CommandError("msgpack is not installed")
+        iterations = options["iterations"]
+        self.stdout.write(
+            f"{'message':<20}{'json B':>9}{'mpack B':>9}"
+            f"{'json enc':>10}{'mpack enc':>10}{'json dec':>10}{'mpack dec':>10}"
+        )
+        for name, message in sample_messages(options["buildings"]).items():
+            text, binary = dumps(message), packb(message)
+            self.stdout.write(
+                f"{name:<20}{len(text.encode()):>9}{len(binary):>9}"
+                f"{per_message_us(dumps, message, iterations):>10.1f}"
+                f"{per_message_us(packb, message, iterations):>10.1f}"
+                f"{per_message_us(json.loads, text, iterations):>10.1f}"
+                f"{per_message_us(unpackb, binary, iterations):>10.1f}"
+            )
+        self.stdout.write("Times are microseconds per message.")
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0002_player_players_pla_usernam_5bba13_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on every write to the player'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0003_player_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resources',
+            name='wood_rate',
+            field=models.PositiveIntegerField(default=0, help_text='Base wood produced per second'),
+        ),
+        migrations.AddField(
+            model_name='resources',
+            name='stone_rate',
+            field=models.PositiveIntegerField(default=0, help_text='Base stone produced per second'),
+        ),
+        migrations.AddField(
+            model_name='resources',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, help_text='Whole second the amounts were settled at', null=True),
+        ),
+        migrations.AddField(
+            model_name='playerbuilding',
+            name='wood_rate',
+            field=models.PositiveIntegerField(default=0, help_text='Wood produced per second once completed'),
+        ),
+        migrations.AddField(
+            model_name='playerbuilding',
+            name='stone_rate',
+            field=models.PositiveIntegerField(default=0, help_text='Stone produced per second once completed'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+import django_mongodb_backend.fields
+import game_building.apps.players.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0004_resource_production'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedBuilding',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('building_id', models.CharField(help_text='Reference to Building.id', max_length=24)),
+                ('queued_at', models.DateTimeField(help_text='When the building was queued')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='queue',
+            field=django_mongodb_backend.fields.EmbeddedModelArrayField(blank=True, default=list, embedded_model=game_building.apps.players.models.QueuedBuilding, help_text='Buildings to start automatically, in order'),
+        ),
+    ]
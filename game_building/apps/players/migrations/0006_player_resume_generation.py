@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0005_player_build_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='resume_generation',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on logout to revoke resume tokens'),
+        ),
+    ]
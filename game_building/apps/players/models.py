@@ -1,15 +1,36 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django_mongodb_backend.fields import (
     ObjectIdAutoField,
     EmbeddedModelField,
     EmbeddedModelArrayField,
 )
 from django_mongodb_backend.models import EmbeddedModel
+from game_building.apps.players.exceptions import StalePlayerError
 
 
 class Resources(EmbeddedModel):
+    """Resource amounts as of ``settled_at``, plus base production rates.
+
+    The current amount is derived on read (see Player.current_resources),
+    so production never needs a write; the stored amounts only move when
+    resources are settled, i.e. on a spend or a rate change.
+    """
+
     wood = models.PositiveIntegerField(default=1000)
     stone = models.PositiveIntegerField(default=1000)
+    wood_rate = models.PositiveIntegerField(
+        default=0, help_text="Base wood produced per second"
+    )
+    stone_rate = models.PositiveIntegerField(
+        default=0, help_text="Base stone produced per second"
+    )
+    settled_at = models.DateTimeField(
+        null=True, blank=True, help_text="Whole second the amounts were settled at"
+    )
 
 
 class PlayerBuilding(EmbeddedModel):
@@ -32,10 +53,38 @@ class PlayerBuilding(EmbeddedModel):
         null=True,
         help_text="Celery task id for scheduled completion",
     )
+    wood_rate = models.PositiveIntegerField(
+        default=0, help_text="Wood produced per second once completed"
+    )
+    stone_rate = models.PositiveIntegerField(
+        default=0, help_text="Stone produced per second once completed"
+    )
 
     def __str__(self):
         return f"{self.building_id} ({self.status})"
 
+    def current_status(self, now=None):
+        """Return the status as of ``now``.
+
+        With LAZY_BUILD_COMPLETION an in-progress build whose finish_eta has
+        passed reads as completed before anything has persisted it.
+        """
+        if (
+            self.status == "in_progress"
+            and settings.LAZY_BUILD_COMPLETION
+            and self.finish_eta <= (now or timezone.now())
+        ):
+            return "completed"
+        return self.status
+
+
+class QueuedBuilding(EmbeddedModel):
+    building_id = models.CharField(max_length=24, help_text="Reference to Building.id")
+    queued_at = models.DateTimeField(help_text="When the building was queued")
+
+    def __str__(self):
+        return f"{self.building_id} (queued)"
+
 
 class Player(models.Model):
     id = ObjectIdAutoField(primary_key=True)
@@ -54,6 +103,21 @@ class Player(models.Model):
         help_text="List of buildings the player has started or completed",
     )
 
+    queue = EmbeddedModelArrayField(
+        QueuedBuilding,
+        blank=True,
+        default=list,
+        help_text="Buildings to start automatically, in order",
+    )
+
+    version = models.PositiveIntegerField(
+        default=0, help_text="Incremented on every write to the player"
+    )
+
+    resume_generation = models.PositiveIntegerField(
+        default=0, help_text="Incremented on logout to revoke resume tokens"
+    )
+
     def __str__(self):
         return self.username
 
@@ -66,16 +130,147 @@ class Player(models.Model):
             models.Index(fields=["email"]),
         ]
 
-    def has_sufficient_resources(self, required_wood, required_stone):
-        """Check if player has enough resources for building."""
-        return (
-            self.resources.wood >= required_wood
-            and self.resources.stone >= required_stone
+    def save(self, *args, **kwargs):
+        """Save the player and bump its version.
+
+        Updates only apply if the stored version still matches the one this
+        instance was loaded with; otherwise StalePlayerError is raised so a
+        concurrent write (e.g. a Celery completion) is never overwritten.
+        """
+        self.settle_buildings()
+        self.settle_resources()
+        self._expected_version = self.version
+        self.version += 1
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version -= 1
+            raise
+        finally:
+            self._expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, "_expected_version", None)
+        if expected is None:
+            return super()._do_update(
+                base_qs, using, pk_val, values, update_fields, forced_update
+            )
+        updated = super()._do_update(
+            base_qs.filter(version=expected),
+            using,
+            pk_val,
+            values,
+            update_fields,
+            forced_update,
+        )
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise StalePlayerError(f"Player {pk_val} was modified concurrently")
+        return updated
+
+    def settle_buildings(self, now=None):
+        """Persist lazily completed builds as completed on this write."""
+        now = now or timezone.now()
+        for b in self.buildings:
+            if b.current_status(now) != b.status:
+                b.status = "completed"
+                b.celery_task_id = None
+
+    def state_version(self, now=None):
+        """Return a token that changes whenever state derived from the
+        player (allowed buildings, affordability) can change.
+
+        ``version`` covers every write. Builds completing lazily and
+        resource production change things as time passes, so those are
+        counted in as well.
+        """
+        now = now or timezone.now()
+        settled = sum(1 for b in self.buildings if b.current_status(now) != b.status)
+        token = f"{self.version}.{settled}" if settled else str(self.version)
+        current = self.current_resources(now)
+        if current.wood_rate or current.stone_rate:
+            # Production changes affordability without any write
+            token += f"@{current.wood},{current.stone}"
+        return token
+
+    def current_resources(self, now=None):
+        """Return an unsaved Resources with the amounts and rates at ``now``.
+
+        Production is counted in whole seconds: the base rates from
+        ``settled_at``, and each building's rates from the first whole
+        second after its finish_eta. All integer arithmetic, so settling at
+        any sequence of times adds up to exactly the same balance.
+        """
+        now = now or timezone.now()
+        resources = self.resources
+        settled = (
+            int(resources.settled_at.timestamp()) if resources.settled_at else None
+        )
+        second = math.floor(now.timestamp())
+        if settled is not None:
+            second = max(second, settled)
+        wood, stone = resources.wood, resources.stone
+        wood_rate, stone_rate = resources.wood_rate, resources.stone_rate
+        if settled is not None:
+            wood += wood_rate * (second - settled)
+            stone += stone_rate * (second - settled)
+        for b in self.buildings:
+            if b.status == "failed" or not (b.wood_rate or b.stone_rate):
+                continue
+            producing_from = math.ceil(b.finish_eta.timestamp())
+            if settled is not None:
+                producing_from = max(producing_from, settled)
+            if second >= producing_from:
+                wood += (b.wood_rate or 0) * (second - producing_from)
+                stone += (b.stone_rate or 0) * (second - producing_from)
+                wood_rate += b.wood_rate or 0
+                stone_rate += b.stone_rate or 0
+        return Resources(
+            wood=wood,
+            stone=stone,
+            wood_rate=wood_rate,
+            stone_rate=stone_rate,
+            settled_at=datetime.fromtimestamp(second, tz=dt_timezone.utc),
         )
 
+    def settle_resources(self, now=None):
+        """Fold production up to ``now`` into the stored amounts.
+
+        Must run before the amounts or base rates are changed.
+        """
+        current = self.current_resources(now)
+        self.resources.wood = current.wood
+        self.resources.stone = current.stone
+        self.resources.settled_at = current.settled_at
+        return self.resources
+
+    def has_sufficient_resources(self, required_wood, required_stone, now=None):
+        """Check if player has enough resources for building."""
+        current = self.current_resources(now)
+        return current.wood >= required_wood and current.stone >= required_stone
+
+    def affordable_at(self, required_wood, required_stone, now=None):
+        """Return the whole second production covers the given cost.
+
+        Uses the rates at ``now``; None if a missing resource is not being
+        produced at all.
+        """
+        current = self.current_resources(now)
+        seconds = 0
+        for amount, rate, required in (
+            (current.wood, current.wood_rate, required_wood),
+            (current.stone, current.stone_rate, required_stone),
+        ):
+            if amount >= required:
+                continue
+            if not rate:
+                return None
+            seconds = max(seconds, -(-(required - amount) // rate))
+        return current.settled_at + timedelta(seconds=seconds)
+
     def consume_resources(self, wood, stone):
         """Consume resources for building if possible. Returns True if successful."""
         if self.has_sufficient_resources(wood, stone):
+            self.settle_resources()
             self.resources.wood -= wood
             self.resources.stone -= stone
             self.save()
@@ -84,26 +279,46 @@ class Player(models.Model):
 
     def add_resources(self, wood=0, stone=0):
         """Add resources to the player."""
+        self.settle_resources()
         self.resources.wood += wood
         self.resources.stone += stone
         self.save()
 
+    def buildings_by_id(self):
+        """Return a map of building_id (as str) to PlayerBuilding.
+
+        Built lazily and kept until ``buildings`` is replaced (e.g. by
+        refresh_from_db) or changes length; code that swaps entries in place
+        must call invalidate_building_index().
+        """
+        cache = self.__dict__.get("_building_index")
+        if (
+            cache is None
+            or cache[0] is not self.buildings
+            or cache[1] != len(self.buildings)
+        ):
+            index = {}
+            for b in self.buildings:
+                index.setdefault(str(b.building_id), b)
+            cache = self._building_index = (self.buildings, len(self.buildings), index)
+        return cache[2]
+
+    def invalidate_building_index(self):
+        self.__dict__.pop("_building_index", None)
+
     def get_building(self, building_id):
         """Return PlayerBuilding by building_id, or None if not found."""
-        for b in self.buildings:
-            if str(b.building_id) == str(building_id):
-                return b
-        return None
+        return self.buildings_by_id().get(str(building_id))
 
     def has_completed_building(self, building_id):
         """Check if player has completed a specific building."""
         b = self.get_building(building_id)
-        return b is not None and b.status == "completed"
+        return b is not None and b.current_status() == "completed"
 
     def add_building_progress(self, building_id, finish_eta):
         """Add a new PlayerBuilding entry for a started building."""
         pb = PlayerBuilding(
-            building_id=building_id, status="in_progress", finish_eta=finish_eta
+            building_id=str(building_id), status="in_progress", finish_eta=finish_eta
         )
         self.buildings.append(pb)
         self.save()
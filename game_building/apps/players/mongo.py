@@ -0,0 +1,152 @@
+from django.conf import settings
+from django.db import connections
+from pymongo import ReturnDocument
+from game_building.apps.players.models import Player
+from game_building.apps.players.exceptions import StalePlayerError
+
+
+def player_collection():
+    """Return the raw pymongo collection backing Player."""
+    return connections[Player.objects.db].get_collection(Player._meta.db_table)
+
+
+def completed_match(now):
+    """Match a building entry that is completed as of ``now``."""
+    if settings.LAZY_BUILD_COMPLETION:
+        return {
+            "$or": [
+                {"status": "completed"},
+                {"status": "in_progress", "finish_eta": {"$lte": now}},
+            ]
+        }
+    return {"status": "completed"}
+
+
+def start_building_filter(player, building, now):
+    """Match the player only if every start_building guard holds.
+
+    Current amounts depend on production since the last settlement, so the
+    resource check cannot be a query on stored fields. Instead the start is
+    checked against ``player`` and only applies to that same version.
+    """
+    query = {
+        "_id": player.id,
+        "version": player.version,
+        "buildings.building_id": {"$ne": str(building.building_id)},
+    }
+    if building.dependencies:
+        query["buildings"] = {
+            "$all": [
+                {"$elemMatch": {"building_id": str(dep_id), **completed_match(now)}}
+                for dep_id in building.dependencies
+            ]
+        }
+    return query
+
+
+def start_building_update(building, player_building, resources):
+    """Settle, spend and push the new building in the same write.
+
+    ``resources`` are the player's current resources at the start.
+    """
+    return {
+        "$set": {
+            "resources.wood": resources.wood - building.required_wood,
+            "resources.stone": resources.stone - building.required_stone,
+            "resources.settled_at": resources.settled_at,
+        },
+        "$inc": {"version": 1},
+        "$push": {
+            "buildings": {
+                "building_id": player_building.building_id,
+                "status": player_building.status,
+                "started_at": player_building.started_at,
+                "finish_eta": player_building.finish_eta,
+                "celery_task_id": player_building.celery_task_id,
+                "wood_rate": player_building.wood_rate,
+                "stone_rate": player_building.stone_rate,
+            }
+        },
+    }
+
+
+def start_building_atomic(player, building, player_building, resources, now):
+    """Apply a start in one conditional update.
+
+    Returns the player's new version, or None if a guard failed.
+    """
+    document = player_collection().find_one_and_update(
+        start_building_filter(player, building, now),
+        start_building_update(building, player_building, resources),
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return document["version"] if document else None
+
+
+def queue_update(player, queue):
+    """Return the (filter, update) pair that replaces the player's queue."""
+    return (
+        {"_id": player.id, "version": player.version},
+        {
+            "$set": {
+                "queue": [
+                    {"building_id": item.building_id, "queued_at": item.queued_at}
+                    for item in queue
+                ]
+            },
+            "$inc": {"version": 1},
+        },
+    )
+
+
+def revoke_resume_tokens_update(player):
+    """Return the (filter, update) pair that revokes ``player``'s resume tokens.
+
+    Unguarded, since it must apply whatever else changed. It still bumps
+    the version, so a stale copy saved later cannot write the old
+    generation back.
+    """
+    return (
+        {"_id": player.id},
+        {"$inc": {"resume_generation": 1, "version": 1}},
+    )
+
+
+def player_building_update(player, building_id, fields):
+    """Return the (filter, update) pair behind update_player_building."""
+    return (
+        {
+            "_id": player.id,
+            "version": player.version,
+            "buildings.building_id": str(building_id),
+        },
+        {
+            "$set": {f"buildings.$.{name}": value for name, value in fields.items()},
+            "$inc": {"version": 1},
+        },
+    )
+
+
+def mirror_player_building(player, building_id, fields):
+    """Apply a successful player_building_update to ``player`` in memory."""
+    player_building = player.get_building(building_id)
+    for name, value in fields.items():
+        setattr(player_building, name, value)
+    player.version += 1
+    return player_building
+
+
+def update_player_building(player, building_id, **fields):
+    """Set fields of one building entry in place, addressed by building_id.
+
+    Like Player.save() the write only applies to the version ``player`` was
+    loaded with, and raises StalePlayerError otherwise. On success the change
+    is mirrored on ``player``.
+    """
+    result = player_collection().update_one(
+        *player_building_update(player, building_id, fields)
+    )
+    if not result.matched_count:
+        raise StalePlayerError(f"Player {player.id} was modified concurrently")
+    return mirror_player_building(player, building_id, fields)
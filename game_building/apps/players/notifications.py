@@ -0,0 +1,52 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+
+def player_group(player_id):
+    return f"player_{player_id}"
+
+
+def notify_player_changed(player_id, version):
+    """Tell every connection of the player that ``version`` now exists."""
+    async_to_sync(anotify_player_changed)(player_id, version)
+
+
+async def anotify_player_changed(player_id, version):
+    await get_channel_layer().group_send(
+        player_group(player_id),
+        {"type": "player.version", "version": version},
+    )
+
+
+def notify_buildings_completed(player, building_ids, started=()):
+    """Send one combined completion event for ``building_ids`` of ``player``.
+
+    ``started`` lists the PlayerBuilding entries the build queue started in
+    the same write.
+    """
+    from game_building.apps.players.serializers import player_patch, serialize_player
+
+    event = {
+        "type": "buildings.completed",
+        "building_ids": list(building_ids),
+        "version": player.version,
+    }
+    if started:
+        event["started"] = [
+            {
+                "building_id": pb.building_id,
+                "completion_time": pb.finish_eta.isoformat(),
+            }
+            for pb in started
+        ]
+    if settings.PLAYER_UPDATES == "patch":
+        event["changes"] = player_patch(
+            player,
+            [player.get_building(b_id) for b_id in building_ids] + list(started),
+            queue=bool(started),
+        )
+    else:
+        event["player"] = serialize_player(player)
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(player_group(player.id), event)
@@ -0,0 +1,53 @@
+import time
+from django.conf import settings
+from game_building.redis_client import get_redis
+from game_building.apps.players.scheduler import cancel_wake, schedule_wake
+
+
+def presence_key(player_id):
+    # One member per open connection, scored by its last heartbeat
+    return f"players:presence:{player_id}"
+
+
+def is_online(player_id):
+    cutoff = time.time() - settings.PRESENCE_TTL
+    return get_redis().zcount(presence_key(player_id), cutoff, "+inf") > 0
+
+
+def mark_alive(player, channel_name):
+    now = time.time()
+    key = presence_key(player.id)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zadd(key, {channel_name: now})
+    # Connections whose worker died without a disconnect stop counting
+    # after PRESENCE_TTL; clear them out and let an abandoned key expire
+    pipe.zremrangebyscore(key, "-inf", now - settings.PRESENCE_TTL)
+    pipe.expire(key, settings.PRESENCE_TTL)
+    pipe.execute()
+
+
+def player_connected(player, channel_name):
+    """Record an open connection and, in lazy mode, arm the player's wake-up."""
+    if not settings.LAZY_BUILD_COMPLETION:
+        return
+    mark_alive(player, channel_name)
+    # Builds that finished while offline are due at once, so they get
+    # persisted and announced to the player who just connected.
+    schedule_wake(player)
+
+
+def refresh_presence(player, channel_name):
+    """Heartbeat for an open connection; see PRESENCE_TTL."""
+    if not settings.LAZY_BUILD_COMPLETION:
+        return
+    mark_alive(player, channel_name)
+
+
+def player_disconnected(player, channel_name):
+    """Forget a connection and, once the last one closes, drop the wake-up."""
+    if not settings.LAZY_BUILD_COMPLETION:
+        return
+    get_redis().zrem(presence_key(player.id), channel_name)
+    # A non-empty queue still needs the scheduler while the player is away
+    if not is_online(player.id) and not player.queue:
+        cancel_wake(player)
@@ -0,0 +1,92 @@
+"""Async data access for the WebSocket hot paths.
+
+These helpers talk to Mongo through the native async driver, so consumer
+handlers can await them on the event loop instead of handing the work to
+the ``sync_to_async`` executor. They return and mutate ordinary Player
+instances; the ORM stays in charge of admin, migrations and the sync
+services.
+"""
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from game_building.mongo_client import get_async_collection, model_from_document
+from game_building.apps.players.models import Player
+from game_building.apps.players.exceptions import StalePlayerError
+from game_building.apps.players.mongo import (
+    mirror_player_building,
+    player_building_update,
+    queue_update,
+    revoke_resume_tokens_update,
+    start_building_filter,
+    start_building_update,
+)
+
+
+def player_collection():
+    return get_async_collection(Player)
+
+
+async def find_player(query):
+    document = await player_collection().find_one(query)
+    return model_from_document(Player, document) if document else None
+
+
+async def get_player(player_id):
+    """Return the Player with ``player_id``, or None if there is none."""
+    try:
+        player_id = ObjectId(player_id)
+    except (InvalidId, TypeError):
+        return None
+    return await find_player({"_id": player_id})
+
+
+async def get_player_by_username(username):
+    return await find_player({"username": username})
+
+
+async def refresh_player(player):
+    """Reload ``player`` in place, like Player.refresh_from_db()."""
+    fresh = await get_player(player.id)
+    if fresh is None:
+        raise Player.DoesNotExist(f"Player {player.id} no longer exists")
+    for field in Player._meta.concrete_fields:
+        setattr(player, field.attname, getattr(fresh, field.attname))
+    player.invalidate_building_index()
+    return player
+
+
+async def start_building(player, building, player_building, resources, now):
+    """Async start_building_atomic: the new version, or None on a failed guard."""
+    document = await player_collection().find_one_and_update(
+        start_building_filter(player, building, now),
+        start_building_update(building, player_building, resources),
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return document["version"] if document else None
+
+
+async def update_player_building(player, building_id, **fields):
+    """Async update_player_building, with the same version guard."""
+    result = await player_collection().update_one(
+        *player_building_update(player, building_id, fields)
+    )
+    if not result.matched_count:
+        raise StalePlayerError(f"Player {player.id} was modified concurrently")
+    return mirror_player_building(player, building_id, fields)
+
+
+async def revoke_resume_tokens(player):
+    """Invalidate every resume token issued to ``player`` so far."""
+    await player_collection().update_one(*revoke_resume_tokens_update(player))
+
+
+async def set_queue(player, queue):
+    """Replace the player's build queue, guarded by the loaded version."""
+    result = await player_collection().update_one(*queue_update(player, queue))
+    if not result.matched_count:
+        raise StalePlayerError(f"Player {player.id} was modified concurrently")
+    player.queue = queue
+    player.version += 1
+    return player
@@ -0,0 +1,226 @@
+import heapq
+import logging
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+from game_building.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+COMPLETIONS_KEY = "buildings:completions"
+
+# Each player has one member, scored by their next wake-up. The hash keeps
+# the player version each wake-up was computed from, so a writer working
+# from an older version can never replace a newer one's wake-up.
+_SET_WAKE_SCRIPT = """
+local stored = redis.call('HGET', KEYS[2], ARGV[1])
+if stored and tonumber(stored) > tonumber(ARGV[2]) then
+    return 0
+end
+if ARGV[3] == '' then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+else
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+end
+return 1
+"""
+
+# Drop every member whose score is still the one we read, so a completion
+# rescheduled while its batch was being processed stays in the index. Its
+# version goes with it, as when a wake-up is cleared, so the hash only
+# holds players that have a wake-up.
+_ACK_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) == tonumber(ARGV[i + 1]) then
+        redis.call('ZREM', KEYS[1], ARGV[i])
+        redis.call('HDEL', KEYS[2], ARGV[i])
+    end
+end
+return 0
+"""
+
+
+def wake_member(player_id):
+    return str(player_id)
+
+
+def parse_wake_member(member):
+    """Return the player id of a member.
+
+    Members indexed before per-player wake-ups were ``player_id:building_id``.
+    """
+    return member.split(":", 1)[0]
+
+
+class RedisCompletionBackend:
+    """Player wake-ups in a Redis sorted set scored by their time."""
+
+    def __init__(self, client=None, key=COMPLETIONS_KEY):
+        self.client = client or get_redis()
+        self.key = key
+        self.versions_key = f"{key}:versions"
+        self._set_wake = self.client.register_script(_SET_WAKE_SCRIPT)
+        self._ack = self.client.register_script(_ACK_SCRIPT)
+
+    def set_wake(self, member, eta, version):
+        """Set (or with ``eta`` None, clear) a wake-up computed at ``version``."""
+        return bool(
+            self._set_wake(
+                keys=[self.key, self.versions_key],
+                args=[member, version, "" if eta is None else repr(eta)],
+            )
+        )
+
+    def due(self, now, limit):
+        return [
+            (member.decode(), score)
+            for member, score in self.client.zrangebyscore(
+                self.key, "-inf", now, start=0, num=limit, withscores=True
+            )
+        ]
+
+    def ack(self, entries):
+        if entries:
+            args = []
+            for member, score in entries:
+                args += [member, repr(score)]
+            self._ack(keys=[self.key, self.versions_key], args=args)
+
+    def __len__(self):
+        return self.client.zcard(self.key)
+
+
+class InMemoryCompletionBackend:
+    """Process-local heap with lazy deletion, for tests and offline runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []
+        self._scores = {}
+        self._versions = {}
+
+    def set_wake(self, member, eta, version):
+        with self._lock:
+            if self._versions.get(member, -1) > version:
+                return False
+            if eta is None:
+                self._scores.pop(member, None)
+                self._versions.pop(member, None)
+            else:
+                self._scores[member] = eta
+                self._versions[member] = version
+                heapq.heappush(self._heap, (eta, member))
+            return True
+
+    def due(self, now, limit):
+        with self._lock:
+            entries = []
+            seen = set()
+            while self._heap and self._heap[0][0] <= now and len(entries) < limit:
+                eta, member = heapq.heappop(self._heap)
+                # Skip heap entries superseded by a reschedule or cancel.
+                if self._scores.get(member) == eta and member not in seen:
+                    seen.add(member)
+                    entries.append((member, eta))
+            # Keep the entries indexed until they are acknowledged.
+            for member, eta in entries:
+                heapq.heappush(self._heap, (eta, member))
+            return entries
+
+    def ack(self, entries):
+        with self._lock:
+            for member, eta in entries:
+                if self._scores.get(member) == eta:
+                    del self._scores[member]
+                    self._versions.pop(member, None)
+
+    def __len__(self):
+        return len(self._scores)
+
+
+_backend = None
+
+
+def get_completion_backend():
+    global _backend
+    if _backend is None:
+        if settings.BUILD_COMPLETION_BACKEND == "memory":
+            _backend = InMemoryCompletionBackend()
+        else:
+            _backend = RedisCompletionBackend()
+    return _backend
+
+
+def schedule_wake(player, now=None):
+    """Point the player's wake-up at their next completion or queue step.
+
+    Call after every write that changes builds, the queue or resources,
+    with ``player`` as written.
+    """
+    from game_building.apps.buildings.cache import building_catalog
+    from game_building.apps.players.build_queue import next_wake
+    from game_building.apps.players.presence import is_online
+
+    now = now or timezone.now()
+    if player.queue:
+        building_catalog.all()
+    eta = next_wake(player, now, building_catalog.lookup)
+    if (
+        eta is not None
+        and settings.LAZY_BUILD_COMPLETION
+        and not player.queue
+        and not is_online(player.id)
+    ):
+        # Completions are derived on read; only the queue needs the server
+        eta = None
+    get_completion_backend().set_wake(
+        wake_member(player.id),
+        None if eta is None else eta.timestamp(),
+        player.version,
+    )
+
+
+def cancel_wake(player):
+    get_completion_backend().set_wake(wake_member(player.id), None, player.version)
+
+
+def run_due_completions(backend=None, now=None, limit=None):
+    """Process one batch of due wake-ups.
+
+    Returns ``(completed, max_lag)``: the number of buildings completed and
+    the largest delay in seconds between a building's ``finish_eta`` and
+    its completion.
+    """
+    from game_building.apps.players.tasks import wake_players
+
+    backend = backend or get_completion_backend()
+    now = now if now is not None else time.time()
+    limit = limit or settings.BUILD_COMPLETION_BATCH_SIZE
+    entries = backend.due(now, limit)
+    if not entries:
+        return 0, 0.0
+    player_ids = {parse_wake_member(member) for member, _ in entries}
+    try:
+        found, missed, completed = wake_players(player_ids)
+    except Exception:
+        # Leave the whole batch indexed; it is retried on the next pass.
+        logger.exception("Failed to wake %d players", len(player_ids))
+        return 0, 0.0
+    # Woken players already have their next wake-up. Legacy per-building
+    # members and players that no longer exist are dropped; players that
+    # lost a race with a write stay due for the next pass.
+    backend.ack(
+        [
+            (member, score)
+            for member, score in entries
+            if parse_wake_member(member) not in missed
+            and (":" in member or parse_wake_member(member) not in found)
+        ]
+    )
+    finished = time.time()
+    max_lag = max((finished - b.finish_eta.timestamp() for b in completed), default=0.0)
+    return len(completed), max_lag
@@ -1,15 +1,19 @@
 from rest_framework import serializers
-from .models import Player, PlayerBuilding, Resources
+from .models import Player, PlayerBuilding, QueuedBuilding, Resources
 from django.contrib.auth.hashers import make_password
+from game_building.serialization import CompiledSerializer
 
 
 class ResourcesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Resources
-        fields = ["wood", "stone"]
+        # Amounts as of settled_at; clients extrapolate with the rates
+        fields = ["wood", "stone", "wood_rate", "stone_rate", "settled_at"]
 
 
 class PlayerBuildingSerializer(serializers.ModelSerializer):
+    status = serializers.SerializerMethodField()
+
     class Meta:
         model = PlayerBuilding
         fields = [
@@ -18,14 +22,26 @@ class PlayerBuildingSerializer(serializers.ModelSerializer):
             "started_at",
             "finish_eta",
             "celery_task_id",
+            "wood_rate",
+            "stone_rate",
         ]
         read_only_fields = ["building_id"]
 
+    def get_status(self, obj):
+        return obj.current_status()
+
+
+class QueuedBuildingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QueuedBuilding
+        fields = ["building_id", "queued_at"]
+
 
 class PlayerSerializer(serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
-    resources = ResourcesSerializer()
+    resources = ResourcesSerializer(source="current_resources")
     buildings = PlayerBuildingSerializer(many=True, read_only=True)
+    queue = QueuedBuildingSerializer(many=True, read_only=True)
 
     class Meta:
         model = Player
@@ -35,6 +51,7 @@ class PlayerSerializer(serializers.ModelSerializer):
             "email",
             "resources",
             "buildings",
+            "queue",
         ]
         read_only_fields = ["id"]
 
@@ -42,6 +59,31 @@ class PlayerSerializer(serializers.ModelSerializer):
         return str(obj.id)
 
 
+# Read paths use these instead of the DRF classes, which stay in use for
+# input validation.
+serialize_resources = CompiledSerializer(ResourcesSerializer)
+serialize_player_building = CompiledSerializer(PlayerBuildingSerializer)
+serialize_queued_building = CompiledSerializer(QueuedBuildingSerializer)
+serialize_player = CompiledSerializer(PlayerSerializer)
+
+
+def player_patch(player, buildings=(), queue=False):
+    """Return only the parts of ``player`` touched by a change.
+
+    Resources are always included; ``buildings`` lists the PlayerBuilding
+    entries that changed, keyed by building_id, and ``queue`` adds the
+    whole build queue.
+    """
+    changes = {"resources": serialize_resources(player.current_resources())}
+    if buildings:
+        changes["buildings"] = {
+            str(b.building_id): serialize_player_building(b) for b in buildings
+        }
+    if queue:
+        changes["queue"] = [serialize_queued_building(q) for q in player.queue]
+    return changes
+
+
 class PlayerCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
@@ -50,7 +92,9 @@ class PlayerCreateSerializer(serializers.ModelSerializer):
         fields = ["username", "email", "password"]
 
     def create(self, validated_data):
-        validated_data["password"] = make_password(validated_data["password"])
+        # register_player hashes in the hashing pool and says so in context
+        if not self.context.get("password_hashed"):
+            validated_data["password"] = make_password(validated_data["password"])
         return super().create(validated_data)
 
 
@@ -74,6 +118,8 @@ class PlayerBuildingCreateSerializer(serializers.ModelSerializer):
 class PlayerResourcesUpdateSerializer(serializers.Serializer):
     wood = serializers.IntegerField(min_value=0, required=False)
     stone = serializers.IntegerField(min_value=0, required=False)
+    wood_rate = serializers.IntegerField(min_value=0, required=False)
+    stone_rate = serializers.IntegerField(min_value=0, required=False)
 
     def validate(self, data):
         if not data:
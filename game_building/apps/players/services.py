@@ -1,74 +1,152 @@
 from asgiref.sync import sync_to_async
+from game_building.metrics import timed_async, timed_sync_to_async
+from django.conf import settings
 from django.utils import timezone
-from game_building.apps.players.models import Player, PlayerBuilding
+from game_building.apps.players.models import PlayerBuilding, QueuedBuilding
 from game_building.apps.players.serializers import (
     PlayerCreateSerializer,
-    PlayerSerializer,
     PlayerLoginSerializer,
+    serialize_player,
 )
-from game_building.apps.buildings.models import Building
+from game_building.apps.buildings.repository import get_building, refresh_catalog
 from datetime import timedelta
-from game_building.apps.players.tasks import complete_building_task
+from game_building.apps.players.scheduler import schedule_wake
+from game_building.apps.players.build_queue import project_queue
+from game_building.apps.players.exceptions import StalePlayerError
+from game_building.apps.players.leaderboard import (
+    BOARDS,
+    arecord_player,
+    get_page,
+    get_rank,
+)
+from game_building.apps.players.notifications import (
+    anotify_player_changed,
+    notify_player_changed,
+)
+from game_building.apps.players.repository import (
+    get_player,
+    get_player_by_username,
+    refresh_player,
+    revoke_resume_tokens,
+    set_queue,
+    start_building,
+)
+from game_building.apps.players.tokens import (
+    decode_resume_token,
+    password_fingerprint,
+    resume_generation,
+)
 from game_building.apps.players.serializers import PlayerResourcesUpdateSerializer
-from django.contrib.auth.hashers import check_password
+from game_building.apps.players.hashing import (
+    HashingPoolBusy,
+    hash_password,
+    verify_password,
+)
 
 
-@sync_to_async
-def register_player(data):
-    serializer = PlayerCreateSerializer(data=data)
-    if serializer.is_valid():
-        player = serializer.save()
-        return {"type": "register_success", "player": PlayerSerializer(player).data}
-    else:
+@timed_sync_to_async
+def validate_registration(data):
+    serializer = PlayerCreateSerializer(data=data, context={"password_hashed": True})
+    serializer.is_valid()
+    return serializer
+
+
+@timed_sync_to_async
+def save_registration(serializer, password):
+    return serializer.save(password=password)
+
+
+async def register_player(data):
+    serializer = await validate_registration(data)
+    if serializer.errors:
         return {"type": "register_failed", "error": serializer.errors}
+    # PBKDF2 runs in the hashing pool so it cannot stall other connections
+    try:
+        password = await hash_password(serializer.validated_data["password"])
+    except HashingPoolBusy as e:
+        return {"type": "register_failed", "error": str(e)}
+    player = await save_registration(serializer, password)
+    return {"type": "register_success", "player": serialize_player(player)}
 
 
-@sync_to_async
-def login_player(data):
+@timed_async
+async def login_player(data):
     serializer = PlayerLoginSerializer(data=data)
     if not serializer.is_valid():
         return None, "Invalid login data"
+    player = await get_player_by_username(data["username"])
+    if player is None:
+        return None, "Invalid credentials"
     try:
-        player = Player.objects.get(username=data["username"])
-        if not check_password(data["password"], player.password):
+        if not await verify_password(data["password"], player.password):
             return None, "Invalid credentials"
-        return player, None
-    except Player.DoesNotExist:
-        return None, "Invalid credentials"
+    except HashingPoolBusy as e:
+        return None, str(e)
+    return player, None
 
 
-@sync_to_async
-def can_start_building(player, building_id):
-    try:
-        building = Building.objects.get(building_id=building_id)
-    except Building.DoesNotExist:
-        return False, "Building not found", None
+@timed_async
+async def resume_player(token):
+    claims = decode_resume_token(token) if isinstance(token, str) else None
+    if claims is None:
+        return None, "Invalid or expired token"
+    player = await get_player(claims["sub"])
+    if (
+        player is None
+        or claims.get("pwd") != password_fingerprint(player)
+        or claims.get("gen", 0) != resume_generation(player)
+    ):
+        return None, "Invalid or expired token"
+    return player, None
+
+
+@timed_async
+async def logout_player(player):
+    """Revoke the resume tokens ``player`` was given, on every connection."""
+    await revoke_resume_tokens(player)
+
+
+def get_start_building_error(player, building, now=None):
+    """Return why ``player`` cannot start ``building``, or "" if it can."""
+    now = now or timezone.now()
     # Check if already started/completed
-    player = Player.objects.get(id=player.id)
-    for b in player.buildings:
-        if str(b.building_id) == str(building_id):
-            if b.status == "in_progress":
-                return False, "Building already in progress", None
-            elif b.status == "completed":
-                return False, "Building already completed", None
+    b = player.get_building(building.building_id)
+    if b is not None:
+        status = b.current_status(now)
+        if status == "in_progress":
+            return "Building already in progress"
+        elif status == "completed":
+            return "Building already completed"
+        return "Building already started"
     # Check resources
     if not player.has_sufficient_resources(
-        building.required_wood, building.required_stone
+        building.required_wood, building.required_stone, now
     ):
-        return False, "Not enough resources", None
+        return "Not enough resources"
     # Check dependencies
     for dep_id in building.dependencies:
-        found = any(
-            str(b.building_id) == str(dep_id) and b.status == "completed"
-            for b in player.buildings
-        )
-        if not found:
-            return False, f"Dependency {dep_id} not completed", None
+        dep = player.get_building(dep_id)
+        if dep is None or dep.current_status(now) != "completed":
+            return f"Dependency {dep_id} not completed"
+    return ""
+
+
+@timed_async
+async def can_start_building(player, building_id):
+    building = await get_building(building_id)
+    if building is None:
+        return False, "Building not found", None
+    error = get_start_building_error(player, building)
+    if error:
+        return False, error, None
     return True, "", building
 
 
-@sync_to_async
-def start_building_for_player(player, building):
+START_BUILDING_ATTEMPTS = 3
+
+
+@timed_async
+async def start_building_for_player(player, building):
     now = timezone.now()
     completion_time = now + timedelta(seconds=building.build_time)
     pb = PlayerBuilding(
@@ -77,34 +155,200 @@ def start_building_for_player(player, building):
         started_at=now,
         finish_eta=completion_time,
         celery_task_id=None,
+        wood_rate=building.wood_rate,
+        stone_rate=building.stone_rate,
     )
+    # Settlement, resource spend and the new entry all go in a single
+    # write guarded by the version the amounts were computed from, so
+    # concurrent starts cannot double-spend.
+    for _ in range(START_BUILDING_ATTEMPTS):
+        # Checked before every write, at the time the amounts are computed
+        # for: the version guard only proves nothing changed since the
+        # player was read, not that it could afford the building then
+        error = get_start_building_error(player, building, now)
+        if error:
+            raise ValueError(error)
+        resources = player.current_resources(now)
+        version = await start_building(player, building, pb, resources, now)
+        if version is not None:
+            break
+        # Another write got in first; re-check against the fresh player
+        await refresh_player(player)
+    else:
+        raise ValueError("Player changed concurrently, please retry")
     player.buildings.append(pb)
-    player.consume_resources(building.required_wood, building.required_stone)
-    player.save()
-    # Schedule Celery task
-    result = complete_building_task.apply_async(
-        args=[str(player.id), str(building.building_id)],
-        countdown=building.build_time,
-    )
-    pb.celery_task_id = result.id
-    player.save()
+    player.invalidate_building_index()
+    player.resources.wood = resources.wood - building.required_wood
+    player.resources.stone = resources.stone - building.required_stone
+    player.resources.settled_at = resources.settled_at
+    player.version = version
+    await sync_to_async(schedule_wake)(player, now)
+    await anotify_player_changed(player.id, version)
+    await arecord_player(player, now)
     return completion_time
 
 
-@sync_to_async
+@timed_sync_to_async
 def update_player_resources(player, data):
     serializer = PlayerResourcesUpdateSerializer(data=data)
     if not serializer.is_valid():
         return {"type": "update_failed", "error": serializer.errors}
     update_data = serializer.validated_data
-    if "wood" in update_data:
-        player.resources.wood = update_data["wood"]
-    if "stone" in update_data:
-        player.resources.stone = update_data["stone"]
+    # Production so far is kept at the old rates before anything changes
+    player.settle_resources()
+    for field in ("wood", "stone", "wood_rate", "stone_rate"):
+        if field in update_data:
+            setattr(player.resources, field, update_data[field])
     player.save()
-    return {"type": "update_success", "player": PlayerSerializer(player).data}
+    # Rates and amounts move the time the head of the build queue is affordable
+    schedule_wake(player)
+    notify_player_changed(player.id, player.version)
+    return {
+        "type": "update_success",
+        "player": serialize_player(player),
+        "version": player.version,
+    }
+
 
+@timed_async
+async def get_player_info(player):
+    return {
+        "type": "player_info",
+        "player": serialize_player(player),
+        "version": player.version,
+    }
 
-@sync_to_async
-def get_player_info(player):
-    return {"type": "player_info", "player": PlayerSerializer(player).data}
+
+QUEUE_UPDATE_ATTEMPTS = 3
+
+
+async def change_queue(player, change):
+    """Write the queue ``change(player)`` returns, re-reading on a race.
+
+    ``change`` raises ValueError if the change is not allowed.
+    """
+    for _ in range(QUEUE_UPDATE_ATTEMPTS):
+        queue = change(player)
+        try:
+            await set_queue(player, queue)
+            break
+        except StalePlayerError:
+            await refresh_player(player)
+    else:
+        raise ValueError("Player changed concurrently, please retry")
+    # Moves the player's wake-up to now if something can start right away
+    await sync_to_async(schedule_wake)(player)
+    await anotify_player_changed(player.id, player.version)
+
+
+async def queue_result(player, msg_type, **fields):
+    catalog = await refresh_catalog()
+    return {
+        "type": msg_type,
+        **fields,
+        "queue": project_queue(player, timezone.now(), catalog.lookup),
+        "version": player.version,
+    }
+
+
+@timed_async
+async def enqueue_building(player, building_id):
+    building = await get_building(building_id)
+    if building is None:
+        return {"type": "enqueue_failed", "error": "Building not found"}
+    building_id = str(building.building_id)
+
+    def change(player):
+        if player.get_building(building_id) is not None:
+            raise ValueError("Building already started")
+        if any(item.building_id == building_id for item in player.queue):
+            raise ValueError("Building already queued")
+        if len(player.queue) >= settings.BUILD_QUEUE_LIMIT:
+            raise ValueError("Build queue is full")
+        item = QueuedBuilding(building_id=building_id, queued_at=timezone.now())
+        return player.queue + [item]
+
+    try:
+        await change_queue(player, change)
+    except ValueError as e:
+        return {"type": "enqueue_failed", "error": str(e)}
+    return await queue_result(player, "building_queued", building_id=building_id)
+
+
+@timed_async
+async def reorder_queue(player, building_ids):
+    def change(player):
+        by_id = {item.building_id: item for item in player.queue}
+        if not isinstance(building_ids, list) or sorted(
+            map(str, building_ids)
+        ) != sorted(by_id):
+            raise ValueError("building_ids must list every queued building once")
+        return [by_id[str(b)] for b in building_ids]
+
+    try:
+        await change_queue(player, change)
+    except ValueError as e:
+        return {"type": "reorder_queue_failed", "error": str(e)}
+    return await queue_result(player, "queue_reordered")
+
+
+@timed_async
+async def cancel_queued(player, building_id):
+    building_id = str(building_id)
+
+    def change(player):
+        queue = [item for item in player.queue if item.building_id != building_id]
+        if len(queue) == len(player.queue):
+            raise ValueError("Building not queued")
+        return queue
+
+    try:
+        await change_queue(player, change)
+    except ValueError as e:
+        return {"type": "cancel_queued_failed", "error": str(e)}
+    return await queue_result(
+        player, "queued_building_cancelled", building_id=building_id
+    )
+
+
+def parse_board(data):
+    board = data.get("board", "completed")
+    if board not in BOARDS:
+        raise ValueError(f"Unknown leaderboard: {board}")
+    return board
+
+
+@timed_async
+async def get_leaderboard(data):
+    try:
+        board = parse_board(data)
+        offset = int(data.get("offset", 0))
+        limit = int(data.get("limit", settings.LEADERBOARD_PAGE_SIZE))
+    except (TypeError, ValueError) as e:
+        return {"type": "leaderboard_failed", "error": str(e)}
+    offset = max(0, offset)
+    limit = max(1, min(limit, settings.LEADERBOARD_MAX_PAGE_SIZE))
+    entries, total = await get_page(board, offset, limit)
+    return {
+        "type": "leaderboard",
+        "board": board,
+        "offset": offset,
+        "total": total,
+        "entries": entries,
+    }
+
+
+@timed_async
+async def get_my_rank(player, data):
+    try:
+        board = parse_board(data)
+    except ValueError as e:
+        return {"type": "my_rank_failed", "error": str(e)}
+    rank, score, total = await get_rank(board, player.id)
+    return {
+        "type": "my_rank",
+        "board": board,
+        "rank": rank,
+        "score": score,
+        "total": total,
+    }
@@ -1,6 +1,15 @@
+import logging
+from django.utils import timezone
+from pymongo import UpdateOne
+from bson import ObjectId
 from game_building.config.celery import app as celery_app
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from game_building.apps.players.exceptions import StalePlayerError
+from game_building.apps.players.leaderboard import record_players
+from game_building.apps.players.notifications import notify_buildings_completed
+from game_building.apps.players.scheduler import schedule_wake
+from game_building.metrics import COMPLETION_LAG
+
+logger = logging.getLogger(__name__)
 
 
 def update_building_status(player, building_id):
@@ -15,25 +24,169 @@ def update_building_status(player, building_id):
     return updated
 
 
-@celery_app.task
-def complete_building_task(player_id, building_id):
+def observe_completion_lag(player_building):
+    lag = timezone.now() - player_building.finish_eta
+    COMPLETION_LAG.observe(max(0.0, lag.total_seconds()))
+
+
+def complete_building(player_id, building_id):
     from game_building.apps.players.models import Player
-    from game_building.apps.players.serializers import PlayerSerializer
 
     player = Player.objects.get(id=player_id)
     updated = update_building_status(player, building_id)
+    record_players([player])
+    schedule_wake(player)
     # Send WebSocket notification if updated
     if updated:
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"player_{player_id}",
+        observe_completion_lag(player.get_building(building_id))
+        logger.info("Building %s completed for player %s", building_id, player_id)
+        notify_buildings_completed(player, [building_id])
+    return updated
+
+
+def wake_players(player_ids, now=None):
+    """Process the due wake-ups of ``player_ids``.
+
+    Completes every build whose finish_eta has passed and starts whatever
+    the build queue allows. Players whose queue moved are saved one by one;
+    the rest of the completions go out in one bulk write. Each write is
+    guarded by the version that was read, so a concurrent write makes it
+    miss instead of being overwritten.
+
+    Returns ``(found, missed, completed)``: the ids of the players that
+    exist, the ids of those whose write missed (to retry) and the
+    PlayerBuilding entries completed.
+    """
+    from game_building.apps.buildings.cache import building_catalog
+    from game_building.apps.players.build_queue import start_queued
+    from game_building.apps.players.models import Player
+
+    now = now or timezone.now()
+    players = list(
+        Player.objects.filter(
+            id__in=[ObjectId(p) for p in player_ids if ObjectId.is_valid(p)]
+        )
+    )
+    building_catalog.all()
+    missed = set()
+    completed = {}
+    started = {}
+    bulk = []
+    for player in players:
+        player_id = str(player.id)
+        due = [
+            b
+            for b in player.buildings
+            if b.status == "in_progress" and b.finish_eta <= now
+        ]
+        # Completed first, so they free slots and satisfy dependencies
+        for b in due:
+            b.status = "completed"
+            b.celery_task_id = None
+        completed[player_id] = due
+        started[player_id], dropped = (
+            start_queued(player, now, building_catalog.lookup)
+            if player.queue
+            else ([], 0)
+        )
+        if started[player_id] or dropped:
+            try:
+                player.save()
+            except StalePlayerError:
+                missed.add(player_id)
+        elif due:
+            bulk.append((player, [b.building_id for b in due]))
+    missed |= complete_in_bulk(bulk)
+
+    woken = [p for p in players if str(p.id) not in missed]
+    for player in woken:
+        player_id = str(player.id)
+        if completed[player_id] or started[player_id]:
+            for b in completed[player_id]:
+                observe_completion_lag(b)
+            notify_buildings_completed(
+                player,
+                [b.building_id for b in completed[player_id]],
+                started=[pb for pb, _ in started[player_id]],
+            )
+        schedule_wake(player, now)
+    record_players(woken)
+    return (
+        {str(p.id) for p in players},
+        missed,
+        [b for p in woken for b in completed[str(p.id)]],
+    )
+
+
+def complete_in_bulk(entries):
+    """Persist ``(player, building_ids)`` completions in one bulk write.
+
+    The entries are already completed on the players in memory. Returns the
+    ids of the players whose write missed; the others get their version
+    bumped to match.
+    """
+    from game_building.apps.players.mongo import player_collection
+
+    if not entries:
+        return set()
+    operations = [
+        UpdateOne(
+            {"_id": player.id, "version": player.version},
             {
-                "type": "building.completed",
-                "building_id": building_id,
+                "$set": {
+                    "buildings.$[b].status": "completed",
+                    "buildings.$[b].celery_task_id": None,
+                },
+                "$inc": {"version": 1},
             },
+            array_filters=[
+                {"b.building_id": {"$in": building_ids}, "b.status": "in_progress"}
+            ],
         )
-        print(f"Building {building_id} completed for player {player_id}")
-        serializer = PlayerSerializer(player)
-        async_to_sync(channel_layer.group_send)(
-            f"player_{player_id}", {"type": "player.updated", "player": serializer.data}
-        )
+        for player, building_ids in entries
+    ]
+    result = player_collection().bulk_write(operations, ordered=False)
+    if result.matched_count == len(operations):
+        for player, _ in entries:
+            player.version += 1
+        return set()
+    return confirm_completions(entries)
+
+
+def confirm_completions(entries):
+    """Sort out a bulk completion that did not match every player.
+
+    The bulk result does not say whose update missed, so every player is
+    reloaded. One that is exactly one version ahead with all of our
+    buildings completed takes the stored state (correct even if a
+    concurrent write did the completing); the rest count as missed and are
+    retried, which is a no-op once their builds are completed.
+    """
+    from game_building.apps.players.models import Player
+
+    fresh = {p.id: p for p in Player.objects.filter(id__in=[p.id for p, _ in entries])}
+    missed = set()
+    for player, building_ids in entries:
+        stored = fresh.get(player.id)
+        if (
+            stored is None
+            or stored.version != player.version + 1
+            or any(
+                b.status == "in_progress"
+                for b in stored.buildings
+                if b.building_id in building_ids
+            )
+        ):
+            missed.add(str(player.id))
+            continue
+        for field in Player._meta.concrete_fields:
+            setattr(player, field.attname, getattr(stored, field.attname))
+        player.invalidate_building_index()
+    return missed
+
+
+@celery_app.task(autoretry_for=(StalePlayerError,), max_retries=5, retry_backoff=True)
+def complete_building_task(player_id, building_id):
+    # Completions are driven by the completion scheduler; this task only
+    # drains countdown tasks queued before it was introduced.
+    complete_building(player_id, building_id)
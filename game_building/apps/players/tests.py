@@ -0,0 +1,860 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+import asyncio
+import json
+import random
+import statistics
+import time
+import jwt
+from asgiref.sync import sync_to_async
+from channels.testing.websocket import WebsocketCommunicator
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from game_building.apps.buildings.cache import building_catalog
+from game_building.apps.buildings.models import Building
+from game_building.apps.buildings.services import accelerate_building
+from game_building import serialization
+from game_building.apps.players import hashing, scheduler
+from game_building.apps.players.build_queue import (
+    next_wake,
+    project_queue,
+    start_queued,
+)
+from game_building.apps.players.exceptions import StalePlayerError
+from game_building.apps.players.hashing import (
+    HashingPoolBusy,
+    hash_password,
+    verify_password,
+)
+from game_building.apps.players.models import (
+    Player,
+    PlayerBuilding,
+    QueuedBuilding,
+    Resources,
+)
+from game_building.apps.players.repository import get_player
+from game_building.apps.players.serializers import (
+    PlayerBuildingSerializer,
+    PlayerSerializer,
+    QueuedBuildingSerializer,
+    ResourcesSerializer,
+    serialize_player,
+    serialize_player_building,
+    serialize_queued_building,
+    serialize_resources,
+)
+from game_building.apps.players.scheduler import run_due_completions
+from game_building.apps.players.services import (
+    cancel_queued,
+    enqueue_building,
+    reorder_queue,
+    start_building_for_player,
+    update_player_resources,
+)
+from game_building.apps.players.tasks import (
+    complete_building,
+    complete_in_bulk,
+    update_building_status,
+)
+from game_building.apps.players.tokens import (
+    RESUME_TOKEN_ALGORITHM,
+    decode_resume_token,
+    issue_resume_token,
+)
+from game_building.consumers import GameConsumer
+from game_building.ratelimit import ConnectionRateLimiter, TokenBucket
+
+# The channel layer and the completion index stay in process; Mongo is the
+# test database and Redis is only used by the leaderboard, whose failures
+# are logged, not raised.
+TEST_SETTINGS = {
+    "CHANNEL_LAYERS": {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    "BUILD_COMPLETION_BACKEND": "memory",
+    "LAZY_BUILD_COMPLETION": False,
+    "PLAYER_UPDATES": "snapshot",
+}
+
+
+def create_player(username="player1", buildings=(), **resources):
+    return Player.objects.create(
+        username=username,
+        email=f"{username}@example.com",
+        password="!",
+        resources=Resources(**resources),
+        buildings=list(buildings),
+    )
+
+
+def in_progress(building_id, finish_in=3600):
+    now = timezone.now()
+    return PlayerBuilding(
+        building_id=str(building_id),
+        status="in_progress",
+        started_at=now,
+        finish_eta=now + timedelta(seconds=finish_in),
+    )
+
+
+@override_settings(**TEST_SETTINGS)
+class GameTestCase(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(scheduler, "_backend", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class PlayerVersionTests(GameTestCase):
+    def test_stale_save_raises(self):
+        player = create_player()
+        first = Player.objects.get(id=player.id)
+        second = Player.objects.get(id=player.id)
+        first.add_resources(wood=10)
+        with self.assertRaises(StalePlayerError):
+            second.add_resources(wood=20)
+        # The failed save leaves the copy at the version it was loaded with
+        self.assertEqual(second.version, player.version)
+        self.assertEqual(Player.objects.get(id=player.id).resources.wood, 1010)
+
+    def test_completion_is_not_overwritten_by_stale_copy(self):
+        player = create_player(buildings=[in_progress(1)])
+        connection_copy = Player.objects.get(id=player.id)
+        self.assertTrue(update_building_status(Player.objects.get(id=player.id), 1))
+        with self.assertRaises(StalePlayerError):
+            connection_copy.add_resources(wood=10)
+        connection_copy.refresh_from_db()
+        self.assertEqual(connection_copy.get_building(1).status, "completed")
+        connection_copy.add_resources(wood=10)
+        stored = Player.objects.get(id=player.id)
+        self.assertEqual(stored.get_building(1).status, "completed")
+        self.assertEqual(stored.version, player.version + 2)
+
+
+class ConnectionCacheTests(GameTestCase):
+    @asynccontextmanager
+    async def connect(self, player):
+        communicator = WebsocketCommunicator(GameConsumer.as_asgi(), "/ws/game/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        try:
+            await communicator.send_json_to(
+                {"type": "resume", "token": issue_resume_token(player)}
+            )
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "resume_success")
+            yield communicator
+        finally:
+            await communicator.disconnect()
+
+    async def receive_type(self, communicator, msg_type):
+        while True:
+            response = await communicator.receive_json_from()
+            if response["type"] == msg_type:
+                return response
+
+    async def test_unannounced_write_is_reloaded_and_retried(self):
+        player = await sync_to_async(create_player)(buildings=[in_progress(1)])
+        async with self.connect(player) as communicator:
+            # Completed behind the connection's back, without a notification
+            await sync_to_async(
+                lambda: update_building_status(Player.objects.get(id=player.id), 1)
+            )()
+            await communicator.send_json_to({"type": "update_resources", "wood": 5000})
+            response = await communicator.receive_json_from()
+        self.assertEqual(response["type"], "update_success")
+        self.assertEqual(response["version"], player.version + 2)
+        self.assertEqual(response["player"]["buildings"][0]["status"], "completed")
+        stored = await sync_to_async(Player.objects.get)(id=player.id)
+        self.assertEqual(stored.get_building(1).status, "completed")
+        self.assertEqual(stored.resources.wood, 5000)
+
+    async def test_announced_write_reloads_before_handling(self):
+        player = await sync_to_async(create_player)(buildings=[in_progress(1)])
+        async with self.connect(player) as communicator:
+            await sync_to_async(complete_building)(player.id, "1")
+            completed = await self.receive_type(communicator, "building_completed")
+            self.assertEqual(completed["building_id"], "1")
+            await communicator.send_json_to({"type": "get_player_info"})
+            response = await self.receive_type(communicator, "player_info")
+        self.assertEqual(response["version"], player.version + 1)
+        self.assertEqual(response["player"]["buildings"][0]["status"], "completed")
+
+
+class ResumeTokenTests(GameTestCase):
+    async def resume(self, token):
+        communicator = WebsocketCommunicator(GameConsumer.as_asgi(), "/ws/game/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        try:
+            await communicator.send_json_to({"type": "resume", "token": token})
+            response = await communicator.receive_json_from()
+            if response["type"] == "resume_success":
+                await communicator.send_json_to({"type": "logout"})
+                self.assertEqual(
+                    (await communicator.receive_json_from())["type"],
+                    "logout_success",
+                )
+            return response
+        finally:
+            await communicator.disconnect()
+
+    async def test_logout_revokes_outstanding_tokens(self):
+        player = await sync_to_async(create_player)()
+        first = issue_resume_token(player)
+        second = issue_resume_token(player)
+        # Logging out of the first session revokes both tokens
+        self.assertEqual((await self.resume(first))["type"], "resume_success")
+        for token in (first, second):
+            response = await self.resume(token)
+            self.assertEqual(response["type"], "resume_failed")
+            self.assertEqual(response["error"], "Invalid or expired token")
+        stored = await sync_to_async(Player.objects.get)(id=player.id)
+        self.assertEqual(stored.resume_generation, 1)
+        self.assertEqual(stored.version, player.version + 1)
+        # Tokens issued after the logout work
+        response = await self.resume(issue_resume_token(stored))
+        self.assertEqual(response["type"], "resume_success")
+
+    async def test_tokens_from_before_generations_resume_at_zero(self):
+        player = await sync_to_async(create_player)()
+        # Issued before logout revoked tokens, so without a generation
+        claims = decode_resume_token(issue_resume_token(player))
+        del claims["gen"]
+        legacy = jwt.encode(
+            claims, settings.RESUME_TOKEN_SECRET, algorithm=RESUME_TOKEN_ALGORITHM
+        )
+        self.assertEqual((await self.resume(legacy))["type"], "resume_success")
+
+
+class StartBuildingConcurrencyTests(GameTestCase):
+    CONCURRENCY = 20
+
+    def building(self, building_id, wood=100, stone=50):
+        return Building(
+            building_id=building_id,
+            name=f"Building {building_id}",
+            build_time=60,
+            required_wood=wood,
+            required_stone=stone,
+        )
+
+    async def start_concurrently(self, player, buildings):
+        # One copy per caller, as if each came from its own connection
+        copies = [await get_player(player.id) for _ in buildings]
+        return await asyncio.gather(
+            *(
+                start_building_for_player(copy, building)
+                for copy, building in zip(copies, buildings)
+            ),
+            return_exceptions=True,
+        )
+
+    def assert_single_start(self, player, results, wood, stone):
+        succeeded = [r for r in results if not isinstance(r, BaseException)]
+        failed = [r for r in results if isinstance(r, BaseException)]
+        self.assertEqual(len(succeeded), 1)
+        self.assertTrue(all(isinstance(r, ValueError) for r in failed), failed)
+        stored = Player.objects.get(id=player.id)
+        self.assertEqual(len(stored.buildings), 1)
+        self.assertEqual(stored.resources.wood, 1000 - wood)
+        self.assertEqual(stored.resources.stone, 1000 - stone)
+        self.assertEqual(stored.version, player.version + 1)
+
+    async def test_same_building_starts_once(self):
+        player = await sync_to_async(create_player)()
+        results = await self.start_concurrently(
+            player, [self.building(1)] * self.CONCURRENCY
+        )
+        await sync_to_async(self.assert_single_start)(player, results, 100, 50)
+
+    async def test_resources_are_spent_once(self):
+        # Each building is affordable alone, but no two of them together
+        player = await sync_to_async(create_player)()
+        results = await self.start_concurrently(
+            player,
+            [self.building(i, wood=600) for i in range(1, self.CONCURRENCY + 1)],
+        )
+        await sync_to_async(self.assert_single_start)(player, results, 600, 50)
+
+    async def test_unaffordable_start_is_refused_without_a_prior_check(self):
+        created = await sync_to_async(create_player)(wood=50)
+        player = await get_player(created.id)
+        with self.assertRaisesMessage(ValueError, "Not enough resources"):
+            await start_building_for_player(player, self.building(1))
+        stored = await sync_to_async(Player.objects.get)(id=player.id)
+        self.assertEqual(stored.resources.wood, 50)
+        self.assertEqual(stored.buildings, [])
+        self.assertEqual(stored.version, created.version)
+
+
+def sample_player():
+    """An unsaved player touching every field the read serializers emit."""
+    now = timezone.now()
+    return Player(
+        username="jörð",
+        email="jord@example.com",
+        resources=Resources(
+            wood=1200, stone=800, wood_rate=2, stone_rate=1, settled_at=now
+        ),
+        buildings=[
+            in_progress(1),
+            PlayerBuilding(
+                building_id="2",
+                status="completed",
+                started_at=now - timedelta(seconds=90),
+                finish_eta=now - timedelta(seconds=30),
+                celery_task_id="task-2",
+                wood_rate=3,
+            ),
+        ],
+        queue=[QueuedBuilding(building_id="3", queued_at=now)],
+    )
+
+
+class SerializationTests(SimpleTestCase):
+    def test_compiled_serializers_match_drf(self):
+        player = sample_player()
+        for serializer_class, compiled, obj in (
+            (PlayerSerializer, serialize_player, player),
+            (ResourcesSerializer, serialize_resources, player.current_resources()),
+            (PlayerBuildingSerializer, serialize_player_building, player.buildings[1]),
+            (QueuedBuildingSerializer, serialize_queued_building, player.queue[0]),
+        ):
+            with self.subTest(serializer_class.__name__):
+                # Compared as JSON, so key order counts too
+                self.assertEqual(
+                    json.dumps(compiled(obj)), json.dumps(serializer_class(obj).data)
+                )
+
+    def test_dumps_fallback_matches_orjson(self):
+        if serialization.orjson is None:
+            self.skipTest("orjson is not installed")
+        message = {
+            "type": "player_info",
+            "player": serialize_player(sample_player()),
+            "version": 3,
+            "ratio": 0.25,
+            "missing_resources": None,
+            "can_afford": True,
+        }
+        encoded = serialization.dumps(message)
+        with mock.patch.object(serialization, "orjson", None):
+            self.assertEqual(serialization.dumps(message), encoded)
+
+
+class CompleteInBulkTests(GameTestCase):
+    def due_copy(self, player):
+        copy = Player.objects.get(id=player.id)
+        copy.get_building(1).status = "completed"
+        return copy
+
+    def test_unmatched_player_with_build_still_running_is_missed(self):
+        player = create_player(buildings=[in_progress(1, finish_in=-5)])
+        copy = self.due_copy(player)
+        Player.objects.get(id=player.id).add_resources(wood=10)
+        self.assertEqual(complete_in_bulk([(copy, ["1"])]), {str(player.id)})
+        self.assertEqual(copy.version, player.version)
+
+    def test_build_completed_by_another_write_takes_stored_state(self):
+        player = create_player(buildings=[in_progress(1, finish_in=-5)])
+        copy = self.due_copy(player)
+        other = Player.objects.get(id=player.id)
+        other.resources.wood = 5
+        update_building_status(other, "1")
+        self.assertEqual(complete_in_bulk([(copy, ["1"])]), set())
+        # No extra version bump; the reply carries what is actually stored
+        self.assertEqual(copy.version, player.version + 1)
+        self.assertEqual(copy.resources.wood, 5)
+
+    def test_player_written_twice_is_missed(self):
+        player = create_player(buildings=[in_progress(1, finish_in=-5)])
+        copy = self.due_copy(player)
+        update_building_status(Player.objects.get(id=player.id), "1")
+        Player.objects.get(id=player.id).add_resources(wood=10)
+        self.assertEqual(complete_in_bulk([(copy, ["1"])]), {str(player.id)})
+        self.assertEqual(Player.objects.get(id=player.id).version, player.version + 2)
+
+
+class PasswordHashingTests(GameTestCase):
+    async def timed_update(self, player):
+        started = time.perf_counter()
+        # Yield first, so time spent waiting for the loop is counted
+        await asyncio.sleep(0)
+        # Runs on the thread-sensitive sync_to_async executor, which
+        # hashing used to occupy
+        result = await update_player_resources(player, {"wood": 500})
+        self.assertEqual(result["type"], "update_success")
+        return time.perf_counter() - started
+
+    async def test_sync_handler_latency_stays_flat_during_login_flood(self):
+        created = await sync_to_async(create_player)()
+        player = await sync_to_async(Player.objects.get)(id=created.id)
+        encoded = await hash_password("secret")  # Also starts the pool
+        baseline = [await self.timed_update(player) for _ in range(30)]
+        flood = [
+            asyncio.create_task(verify_password("secret", encoded))
+            for _ in range(4 * settings.PASSWORD_HASHING_WORKERS)
+        ]
+        during = []
+        while not all(task.done() for task in flood):
+            during.append(await self.timed_update(player))
+            await asyncio.sleep(0.001)
+        self.assertTrue(all(await asyncio.gather(*flood)))
+        self.assertGreater(len(during), 10)
+        p95 = statistics.quantiles(during, n=20)[-1]
+        self.assertLess(p95, max(5 * statistics.quantiles(baseline, n=20)[-1], 0.05))
+
+    @override_settings(PASSWORD_HASHING_QUEUE_LIMIT=2)
+    async def test_saturated_pool_rejects_without_queueing(self):
+        running = [asyncio.create_task(hash_password("secret")) for _ in range(2)]
+        await asyncio.sleep(0)  # Both take their slot
+        started = time.perf_counter()
+        with self.assertRaises(HashingPoolBusy):
+            await verify_password("secret", "!")
+        self.assertLess(time.perf_counter() - started, 0.05)
+        await asyncio.gather(*running)
+        # Slots are released once the work finishes
+        self.assertTrue(await hash_password("secret"))
+
+    @override_settings(PASSWORD_HASHING_QUEUE_LIMIT=1)
+    async def test_cancelled_caller_keeps_the_slot_until_the_job_finishes(self):
+        await hash_password("secret")  # Starts the pool
+        caller = asyncio.create_task(hash_password("secret"))
+        await asyncio.sleep(0.1)  # An idle worker has picked the job up
+        caller.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await caller
+        # The job is still hashing, so the pool is still full
+        with self.assertRaises(HashingPoolBusy):
+            await verify_password("secret", "!")
+        deadline = time.perf_counter() + 10
+        while hashing._in_flight and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        self.assertEqual(hashing._in_flight, 0)
+        self.assertTrue(await hash_password("secret"))
+
+
+@override_settings(**TEST_SETTINGS)
+class ConsumerProtocolTests(SimpleTestCase):
+    async def test_malformed_types_are_rejected_without_closing(self):
+        communicator = WebsocketCommunicator(GameConsumer.as_asgi(), "/ws/game/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        try:
+            for data in ({"type": []}, {"type": {"nested": 1}}, {"commands": []}):
+                await communicator.send_json_to(data)
+                response = await communicator.receive_json_from()
+                self.assertEqual(response["type"], "error")
+            await communicator.send_json_to(
+                {"type": "batch", "commands": [{"type": ["get_catalog"]}]}
+            )
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "batch_result")
+            self.assertEqual(
+                response["results"],
+                [[{"type": "error", "error": "Invalid batch command"}]],
+            )
+            # The worker is still serving the connection
+            await communicator.send_json_to({"type": "logout"})
+            response = await communicator.receive_json_from()
+            self.assertEqual(response, {"type": "error", "error": "Not authenticated"})
+        finally:
+            await communicator.disconnect()
+
+
+class ResourceAccrualTests(SimpleTestCase):
+    def random_spec(self, rng, start):
+        resources = {
+            "wood": rng.randint(0, 5000),
+            "stone": rng.randint(0, 5000),
+            "wood_rate": rng.randint(0, 5),
+            "stone_rate": rng.randint(0, 5),
+            "settled_at": start,
+        }
+        buildings = [
+            {
+                "building_id": str(i),
+                "status": rng.choice(["in_progress", "completed", "failed"]),
+                "started_at": start,
+                # Fractional finish times, before and after the settlement
+                "finish_eta": start + timedelta(seconds=rng.uniform(-600, 3600)),
+                "wood_rate": rng.randint(0, 4),
+                "stone_rate": rng.randint(0, 4),
+            }
+            for i in range(rng.randint(0, 6))
+        ]
+        return resources, buildings
+
+    def build(self, spec):
+        resources, buildings = spec
+        return Player(
+            resources=Resources(**resources),
+            buildings=[PlayerBuilding(**b) for b in buildings],
+        )
+
+    def test_settling_at_any_times_matches_a_single_read(self):
+        rng = random.Random(21)
+        start = timezone.now().replace(microsecond=0) - timedelta(seconds=0.3)
+        for trial in range(300):
+            spec = self.random_spec(rng, start)
+            end = start + timedelta(seconds=rng.uniform(0, 7200))
+            expected = self.build(spec).current_resources(end)
+            player = self.build(spec)
+            # Random moments up to the read, in any order; settling at a
+            # moment before the last settlement is a no-op
+            for _ in range(rng.randint(1, 12)):
+                player.settle_resources(start + (end - start) * rng.random())
+            actual = player.current_resources(end)
+            with self.subTest(trial=trial):
+                self.assertEqual(
+                    (actual.wood, actual.stone, actual.wood_rate, actual.stone_rate),
+                    (
+                        expected.wood,
+                        expected.stone,
+                        expected.wood_rate,
+                        expected.stone_rate,
+                    ),
+                )
+                self.assertEqual(actual.settled_at, expected.settled_at)
+
+
+def catalog_building(building_id, wood=100, stone=50, build_time=60, dependencies=()):
+    return Building(
+        building_id=building_id,
+        name=f"Building {building_id}",
+        build_time=build_time,
+        required_wood=wood,
+        required_stone=stone,
+        dependencies=list(dependencies),
+    )
+
+
+def queued(*building_ids):
+    now = timezone.now()
+    return [QueuedBuilding(building_id=str(b), queued_at=now) for b in building_ids]
+
+
+def catalog_lookup(*buildings):
+    by_id = {b.building_id: b for b in buildings}
+    return lambda building_id: by_id.get(int(building_id))
+
+
+@override_settings(BUILD_QUEUE_SLOTS=1, LAZY_BUILD_COMPLETION=False)
+class BuildQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.now = timezone.now().replace(microsecond=0)
+        self.lookup = catalog_lookup(
+            catalog_building(1),
+            catalog_building(2),
+            catalog_building(3, build_time=30, dependencies=[1]),
+            catalog_building(4, wood=10),
+        )
+
+    def player(self, queue, buildings=(), **resources):
+        resources.setdefault("wood", 1000)
+        resources.setdefault("stone", 1000)
+        return Player(
+            resources=Resources(settled_at=self.now, **resources),
+            buildings=list(buildings),
+            queue=queued(*queue),
+        )
+
+    def started_ids(self, started):
+        return [pb.building_id for pb, _ in started]
+
+    def test_head_starts_once_a_slot_frees(self):
+        player = self.player([2], [in_progress(1, 60)])
+        self.assertEqual(start_queued(player, self.now, self.lookup), ([], 0))
+        self.assertEqual(
+            next_wake(player, self.now, self.lookup), player.buildings[0].finish_eta
+        )
+        player.buildings[0].status = "completed"
+        started, dropped = start_queued(player, self.now, self.lookup)
+        self.assertEqual((self.started_ids(started), dropped), (["2"], 0))
+        self.assertEqual(player.queue, [])
+        self.assertEqual(player.resources.wood, 900)
+        self.assertEqual(
+            player.get_building(2).finish_eta, self.now + timedelta(seconds=60)
+        )
+
+    @override_settings(BUILD_QUEUE_SLOTS=2)
+    def test_item_waiting_on_a_dependency_is_passed_over(self):
+        player = self.player([3, 2], [in_progress(1, 60)])
+        started, _ = start_queued(player, self.now, self.lookup)
+        self.assertEqual(self.started_ids(started), ["2"])
+        self.assertEqual([item.building_id for item in player.queue], ["3"])
+        # Both slots are taken until building 1 completes
+        player.buildings[0].status = "completed"
+        started, _ = start_queued(player, self.now, self.lookup)
+        self.assertEqual(self.started_ids(started), ["3"])
+
+    def test_unknown_and_started_items_are_dropped(self):
+        player = self.player([99, 1, 2], [in_progress(1, 60)])
+        player.buildings[0].status = "completed"
+        started, dropped = start_queued(player, self.now, self.lookup)
+        self.assertEqual((self.started_ids(started), dropped), (["2"], 2))
+        self.assertEqual(player.queue, [])
+
+    def test_unaffordable_head_holds_back_the_queue(self):
+        player = self.player([2, 4], wood=50, wood_rate=10)
+        self.assertEqual(start_queued(player, self.now, self.lookup), ([], 0))
+        self.assertEqual(len(player.queue), 2)
+        affordable = self.now + timedelta(seconds=5)
+        self.assertEqual(next_wake(player, self.now, self.lookup), affordable)
+        started, _ = start_queued(player, affordable, self.lookup)
+        self.assertEqual(self.started_ids(started), ["2"])
+        self.assertEqual(player.resources.wood, 0)
+
+    def test_next_wake(self):
+        self.assertIsNone(next_wake(self.player([]), self.now, self.lookup))
+        self.assertEqual(next_wake(self.player([2]), self.now, self.lookup), self.now)
+        # Nothing running and the head is never affordable without production
+        self.assertIsNone(next_wake(self.player([2], wood=0), self.now, self.lookup))
+        running = self.player([2], [in_progress(1, 60)], wood=0)
+        self.assertEqual(
+            next_wake(running, self.now, self.lookup), running.buildings[0].finish_eta
+        )
+
+    def test_project_queue_follows_slots_and_dependencies(self):
+        player = self.player([3, 2, 99], [in_progress(1, 600)])
+        finish = player.buildings[0].finish_eta
+        projection = project_queue(player, self.now, self.lookup)
+        self.assertEqual([p["building_id"] for p in projection], ["3", "2", "99"])
+        self.assertEqual(
+            [(p["estimated_start"], p["estimated_finish"]) for p in projection],
+            [
+                (finish.isoformat(), (finish + timedelta(seconds=30)).isoformat()),
+                (
+                    (finish + timedelta(seconds=30)).isoformat(),
+                    (finish + timedelta(seconds=90)).isoformat(),
+                ),
+                (None, None),
+            ],
+        )
+
+
+class BuildQueueServiceTests(GameTestCase):
+    def setUp(self):
+        super().setUp()
+        Building.objects.bulk_create(
+            [
+                catalog_building(1),
+                catalog_building(2),
+                catalog_building(3, build_time=30, dependencies=[1]),
+                catalog_building(4, wood=10),
+            ]
+        )
+        building_catalog.bump()
+
+    async def stored(self, player):
+        return await sync_to_async(Player.objects.get)(id=player.id)
+
+    def wake_at(self, player):
+        return scheduler.get_completion_backend()._scores.get(str(player.id))
+
+    async def test_queue_starts_when_running_build_completes(self):
+        created = await sync_to_async(create_player)(buildings=[in_progress(1, -1)])
+        player = await get_player(created.id)
+        result = await enqueue_building(player, 2)
+        self.assertEqual(result["type"], "building_queued")
+        # The single wake-up is at the running build's completion
+        self.assertEqual(
+            self.wake_at(player), player.buildings[0].finish_eta.timestamp()
+        )
+        await sync_to_async(run_due_completions)()
+        stored = await self.stored(player)
+        self.assertEqual(stored.get_building(1).status, "completed")
+        self.assertEqual(stored.get_building(2).status, "in_progress")
+        self.assertEqual(stored.queue, [])
+        self.assertEqual(stored.resources.wood, 900)
+
+    @override_settings(BUILD_QUEUE_SLOTS=2)
+    async def test_queue_starts_when_dependency_completes(self):
+        created = await sync_to_async(create_player)(buildings=[in_progress(1, -1)])
+        player = await get_player(created.id)
+        await enqueue_building(player, 3)
+        # A free slot alone does not start it
+        self.assertIsNone((await self.stored(player)).get_building(3))
+        await sync_to_async(run_due_completions)()
+        stored = await self.stored(player)
+        self.assertEqual(stored.get_building(3).status, "in_progress")
+        self.assertEqual(stored.queue, [])
+
+    async def test_reorder_and_cancel(self):
+        created = await sync_to_async(create_player)(buildings=[in_progress(1)])
+        player = await get_player(created.id)
+        await enqueue_building(player, 2)
+        await enqueue_building(player, 4)
+        result = await reorder_queue(player, ["4", 2])
+        self.assertEqual(result["type"], "queue_reordered")
+        self.assertEqual([p["building_id"] for p in result["queue"]], ["4", "2"])
+        result = await reorder_queue(player, ["4"])
+        self.assertEqual(result["type"], "reorder_queue_failed")
+        result = await cancel_queued(player, 4)
+        self.assertEqual(result["type"], "queued_building_cancelled")
+        self.assertEqual([p["building_id"] for p in result["queue"]], ["2"])
+        result = await cancel_queued(player, 4)
+        self.assertEqual(result["type"], "cancel_queued_failed")
+        stored = await self.stored(player)
+        self.assertEqual([item.building_id for item in stored.queue], ["2"])
+        self.assertEqual(stored.version, player.version)
+
+    async def test_accelerating_a_build_moves_queue_estimates(self):
+        created = await sync_to_async(create_player)(buildings=[in_progress(1)])
+        player = await get_player(created.id)
+        result = await enqueue_building(player, 2)
+        before = datetime.fromisoformat(result["queue"][0]["estimated_start"])
+        self.assertEqual(before, player.buildings[0].finish_eta)
+        result = await accelerate_building(player, "1", 50)
+        after = datetime.fromisoformat(result["queue"][0]["estimated_start"])
+        self.assertEqual(after, datetime.fromisoformat(result["new_finish_eta"]))
+        self.assertLess(after, before - timedelta(seconds=1700))
+        self.assertEqual(self.wake_at(player), after.timestamp())
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_bucket_refills_at_rate_up_to_burst(self):
+        bucket = TokenBucket(2, 3, self.clock)
+        for _ in range(3):
+            self.assertEqual(bucket.wait_time(), 0.0)
+            bucket.take()
+        self.assertEqual(bucket.wait_time(), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(bucket.wait_time(), 0.0)
+        # Idle time never saves up more than the burst
+        self.clock.now += 60
+        bucket.wait_time()
+        self.assertEqual(bucket.tokens, 3)
+
+    def test_cost_above_burst_is_charged_in_full(self):
+        bucket = TokenBucket(2, 4, self.clock)
+        self.assertEqual(bucket.wait_time(10), 0.0)
+        bucket.take(10)
+        self.assertEqual(bucket.tokens, -6)
+        self.assertEqual(bucket.wait_time(), 3.5)
+        # Not even a full-bucket cost until the debt is paid off
+        self.assertEqual(bucket.wait_time(10), 5.0)
+        self.clock.now += 3.5
+        self.assertEqual(bucket.wait_time(), 0.0)
+
+    def test_limiter_charges_only_when_every_bucket_can_pay(self):
+        limiter = ConnectionRateLimiter(10, 2, {"login": (1, 1)}, self.clock)
+        self.assertEqual(limiter.check("login"), 0.0)
+        self.assertEqual(limiter.check("login"), 1.0)
+        # The refused login was not charged to the connection bucket
+        self.assertEqual(limiter.check("get_player_info"), 0.0)
+        self.assertAlmostEqual(limiter.check("get_player_info"), 0.1)
+        self.clock.now += 1
+        self.assertEqual(limiter.check("login"), 0.0)
+
+    def test_batch_pays_for_every_command(self):
+        limiter = ConnectionRateLimiter(1, 2, {}, self.clock)
+        self.assertEqual(limiter.check("batch", 5), 0.0)
+        self.assertEqual(limiter.check("get_player_info"), 4.0)
+
+    def test_zero_rate_disables_the_connection_bucket(self):
+        limiter = ConnectionRateLimiter(0, 0, {}, self.clock)
+        self.assertTrue(all(limiter.check("batch", 20) == 0 for _ in range(100)))
+
+
+@override_settings(**TEST_SETTINGS)
+class ConsumerRateLimitTests(SimpleTestCase):
+    @asynccontextmanager
+    async def connect(self):
+        communicator = WebsocketCommunicator(GameConsumer.as_asgi(), "/ws/game/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        try:
+            yield communicator
+        finally:
+            await communicator.disconnect()
+
+    @override_settings(WS_RATE_LIMIT=1, WS_RATE_BURST=2, WS_RATE_LIMITS={})
+    async def test_over_rate_message_gets_rate_limited_frame(self):
+        async with self.connect() as communicator:
+            for _ in range(2):
+                await communicator.send_json_to({"type": "get_player_info"})
+                response = await communicator.receive_json_from()
+                self.assertEqual(response["error"], "Not authenticated")
+            await communicator.send_json_to({"type": "get_player_info"})
+            response = await communicator.receive_json_from()
+        self.assertEqual(response["type"], "rate_limited")
+        self.assertEqual(response["message_type"], "get_player_info")
+        self.assertEqual(response["reason"], "rate")
+        self.assertGreater(response["retry_after"], 0.5)
+        self.assertLessEqual(response["retry_after"], 1.0)
+
+    @override_settings(WS_RATE_LIMIT=1, WS_RATE_BURST=2, WS_RATE_LIMITS={})
+    async def test_batch_larger_than_burst_leaves_the_bucket_in_debt(self):
+        async with self.connect() as communicator:
+            await communicator.send_json_to(
+                {"type": "batch", "commands": [{"type": "get_player_info"}] * 5}
+            )
+            response = await communicator.receive_json_from()
+            self.assertEqual(response["type"], "batch_result")
+            self.assertEqual(len(response["results"]), 5)
+            await communicator.send_json_to({"type": "get_player_info"})
+            response = await communicator.receive_json_from()
+        self.assertEqual(response["type"], "rate_limited")
+        # Four more tokens than the bucket held, at one per second
+        self.assertGreater(response["retry_after"], 3.5)
+
+    @override_settings(WS_RATE_LIMIT=0, WS_RATE_LIMITS={}, WS_MAX_IN_FLIGHT=1)
+    async def test_messages_beyond_max_in_flight_are_shed(self):
+        release = asyncio.Event()
+
+        async def slow_catalog(if_version=None):
+            await release.wait()
+            return {"type": "catalog", "version": "1", "buildings": []}
+
+        with mock.patch("game_building.consumers.get_catalog", slow_catalog):
+            async with self.connect() as communicator:
+                await communicator.send_json_to({"type": "get_catalog"})
+                await communicator.send_json_to({"type": "get_catalog"})
+                response = await communicator.receive_json_from()
+                self.assertEqual(response["type"], "rate_limited")
+                self.assertEqual(response["reason"], "in_flight")
+                self.assertGreaterEqual(response["retry_after"], 0.1)
+                release.set()
+                response = await communicator.receive_json_from()
+                self.assertEqual(response["type"], "catalog")
+                # The slot is free again once the handler finishes
+                await communicator.send_json_to({"type": "get_catalog"})
+                response = await communicator.receive_json_from()
+                self.assertEqual(response["type"], "catalog")
+
+
+class CompletionBackendTests(SimpleTestCase):
+    def test_ack_drops_the_version_with_the_wake_up(self):
+        backend = scheduler.InMemoryCompletionBackend()
+        backend.set_wake("due", 1.0, 5)
+        backend.set_wake("later", 2.0, 1)
+        backend.ack(backend.due(1.5, 10))
+        self.assertEqual(len(backend), 1)
+        self.assertEqual(backend._versions, {"later": 1})
+        # A wake-up rescheduled after it was read survives the ack
+        backend.set_wake("later", 3.0, 2)
+        backend.ack([("later", 2.0)])
+        self.assertEqual(backend._versions, {"later": 2})
+
+
+class LazyCompletionTests(SimpleTestCase):
+    @override_settings(LAZY_BUILD_COMPLETION=True)
+    async def test_lazily_completed_build_cannot_be_accelerated(self):
+        player = Player(buildings=[in_progress(1, finish_in=-5)])
+        result = await accelerate_building(player, "1", 50)
+        self.assertEqual(result, {"type": "error", "error": "Building not in progress"})
+        # Nothing was written or changed in memory
+        self.assertEqual(player.buildings[0].status, "in_progress")
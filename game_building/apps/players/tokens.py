@@ -0,0 +1,50 @@
+import hashlib
+from datetime import timedelta
+import jwt
+from django.conf import settings
+from django.utils import timezone
+
+RESUME_TOKEN_ALGORITHM = "HS256"
+
+
+def password_fingerprint(player):
+    # Changing the password invalidates every outstanding resume token.
+    return hashlib.sha256(player.password.encode()).hexdigest()[:16]
+
+
+def resume_generation(player):
+    # Logging out bumps it, revoking every token issued before. Documents
+    # written before the field existed are generation 0.
+    return player.resume_generation or 0
+
+
+def issue_resume_token(player):
+    """Return a signed, short-lived token that resumes ``player``'s session."""
+    now = timezone.now()
+    payload = {
+        "sub": str(player.id),
+        "typ": "resume",
+        "pwd": password_fingerprint(player),
+        "gen": resume_generation(player),
+        "iat": now,
+        "exp": now + timedelta(seconds=settings.RESUME_TOKEN_TTL),
+    }
+    return jwt.encode(
+        payload, settings.RESUME_TOKEN_SECRET, algorithm=RESUME_TOKEN_ALGORITHM
+    )
+
+
+def decode_resume_token(token):
+    """Return the token's claims, or None if it is invalid or expired."""
+    try:
+        claims = jwt.decode(
+            token,
+            settings.RESUME_TOKEN_SECRET,
+            algorithms=[RESUME_TOKEN_ALGORITHM],
+            options={"require": ["sub", "exp"]},
+        )
+    except jwt.InvalidTokenError:
+        return None
+    if claims.get("typ") != "resume":
+        return None
+    return claims
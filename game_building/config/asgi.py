@@ -8,6 +8,10 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
 import django
 
 from channels.routing import ProtocolTypeRouter, URLRouter
@@ -17,6 +21,7 @@ from channels.auth import AuthMiddlewareStack
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game_building.config.settings")
 django.setup()
 import game_building.routing
+from game_building.warmup import LifespanApp, warmup
 
 application = ProtocolTypeRouter(
     {
@@ -24,5 +29,7 @@ application = ProtocolTypeRouter(
         "websocket": AuthMiddlewareStack(
             URLRouter(game_building.routing.websocket_urlpatterns)
         ),
+        "lifespan": LifespanApp(),
     }
 )
+warmup.imported(IMPORT_STARTED)
@@ -1,8 +1,16 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game_building.config.settings")
 
 app = Celery("game_building.config")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    from game_building.warmup import warmup
+
+    warmup.run_sync()
@@ -91,6 +91,38 @@ CELERY_TIMEZONE = os.getenv("TIME_ZONE", "UTC")
 CELERY_ENABLE_UTC = True
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# "fake" keeps every Redis key in process with fakeredis (installed
+# separately), e.g. for an offline loadtest; Lua scripts also need lupa
+REDIS_BACKEND = os.getenv("REDIS_BACKEND", "redis")
+
+# ─── LAZY BUILD COMPLETION ─────────────────────────────────────────────────────
+# When enabled, a build whose finish_eta has passed reads as completed and is
+# persisted on the player's next write; completion timers only exist while
+# the player has an open connection or a non-empty build queue.
+LAZY_BUILD_COMPLETION = os.getenv("LAZY_BUILD_COMPLETION", "False") == "True"
+# Seconds a connection counts as online without a heartbeat; open connections
+# refresh it every third of that, so one left by a crashed worker expires
+PRESENCE_TTL = int(os.getenv("PRESENCE_TTL", "90"))
+
+# ─── PLAYER NOTIFICATIONS ──────────────────────────────────────────────────────
+# "snapshot" pushes the whole player on every change, "patch" pushes only
+# the changed resources and building entry plus the player version.
+PLAYER_UPDATES = os.getenv("PLAYER_UPDATES", "snapshot")
+
+# ─── BUILD COMPLETION SCHEDULER ────────────────────────────────────────────────
+# One wake-up per player, at their next completion or queue step. "redis"
+# keeps them in a sorted set shared by all workers, "memory" in-process
+# (tests and offline runs).
+BUILD_COMPLETION_BACKEND = os.getenv("BUILD_COMPLETION_BACKEND", "redis")
+BUILD_COMPLETION_BATCH_SIZE = int(os.getenv("BUILD_COMPLETION_BATCH_SIZE", "500"))
+BUILD_COMPLETION_POLL_INTERVAL = float(
+    os.getenv("BUILD_COMPLETION_POLL_INTERVAL", "0.5")
+)
+
+# ─── BUILD QUEUE ───────────────────────────────────────────────────────────────
+# Queued buildings start while fewer than SLOTS builds are in progress
+BUILD_QUEUE_SLOTS = int(os.getenv("BUILD_QUEUE_SLOTS", "1"))
+BUILD_QUEUE_LIMIT = int(os.getenv("BUILD_QUEUE_LIMIT", "10"))
 
 # ─── CHANNELS ──────────────────────────────────────────────────────────────────
 CHANNEL_LAYERS = {
@@ -101,6 +133,37 @@ CHANNEL_LAYERS = {
         },
     },
 }
+# ─── WARMUP ────────────────────────────────────────────────────────────────────
+# Seconds between warmup attempts while a dependency is unreachable
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "2"))
+
+# ─── PASSWORD HASHING ──────────────────────────────────────────────────────────
+# PBKDF2 runs in a process pool; once QUEUE_LIMIT hashes are pending, new
+# logins and registrations are rejected immediately instead of waiting.
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", "2"))
+PASSWORD_HASHING_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASHING_QUEUE_LIMIT", "64"))
+
+# ─── WEBSOCKET ─────────────────────────────────────────────────────────────────
+RESUME_TOKEN_SECRET = os.getenv("RESUME_TOKEN_SECRET", SECRET_KEY)
+RESUME_TOKEN_TTL = int(os.getenv("RESUME_TOKEN_TTL", "900"))  # seconds
+WS_MAX_BATCH_SIZE = int(os.getenv("WS_MAX_BATCH_SIZE", "20"))
+# Token bucket per connection: messages per second and burst (0 disables)
+WS_RATE_LIMIT = float(os.getenv("WS_RATE_LIMIT", "20"))
+WS_RATE_BURST = int(os.getenv("WS_RATE_BURST", "40"))
+# Extra buckets per message type: (messages per second, burst)
+WS_RATE_LIMITS = {
+    "register": (0.2, 3),
+    "login": (0.5, 5),
+    "get_allowed_buildings": (2, 5),
+    "create_buildings": (0.1, 2),
+}
+# Messages a connection may have queued or running before new ones are shed
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "8"))
+
+# ─── LEADERBOARD ───────────────────────────────────────────────────────────────
+LEADERBOARD_PAGE_SIZE = int(os.getenv("LEADERBOARD_PAGE_SIZE", "20"))
+LEADERBOARD_MAX_PAGE_SIZE = int(os.getenv("LEADERBOARD_MAX_PAGE_SIZE", "100"))
+
 # ─── REST FRAMEWORK ────────────────────────────────────────────────────────────
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
@@ -1,67 +1,254 @@
+import asyncio
+import contextvars
 import json
+import time
+import redis
+from django.conf import settings
+from game_building.serialization import (
+    MSGPACK_SUBPROTOCOL,
+    dumps,
+    negotiate_subprotocol,
+    packb,
+    unpackb,
+)
+from game_building.metrics import (
+    WS_MESSAGE_DURATION,
+    WS_MESSAGES,
+    WS_MESSAGE_ERRORS,
+    WS_RATE_LIMITED,
+)
+from game_building.ratelimit import ConnectionRateLimiter
+from game_building.warmup import warmup
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 from .decorators import require_auth
 from game_building.apps.players.models import Player
-from game_building.apps.players.serializers import PlayerSerializer
-from game_building.apps.buildings.serializers import BuildingSerializer
+from game_building.apps.players.repository import refresh_player
+from game_building.apps.players.presence import (
+    player_connected,
+    player_disconnected,
+    refresh_presence,
+)
+from game_building.apps.players.tokens import issue_resume_token
+from game_building.apps.players.serializers import serialize_player
+from game_building.apps.buildings.serializers import serialize_building
+from game_building.apps.buildings.notifications import CATALOG_GROUP
 from game_building.apps.players.services import (
     register_player,
     login_player,
+    logout_player,
+    resume_player,
     can_start_building,
     start_building_for_player,
     update_player_resources,
     get_player_info,
+    get_leaderboard,
+    get_my_rank,
+    enqueue_building,
+    reorder_queue,
+    cancel_queued,
 )
 from game_building.apps.buildings.services import (
     accelerate_building,
     create_building,
+    create_buildings,
     get_allowed_buildings,
+    get_catalog,
 )
 
+# Frames sent by the batch command being run, instead of going out. Set only
+# in the worker task, so pushes and replies sent from the dispatch loop
+# while a batch runs are never captured.
+captured_frames = contextvars.ContextVar("captured_frames", default=None)
+
+
 class GameConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        await self.accept()
+        subprotocol = negotiate_subprotocol(self.scope.get("subprotocols") or [])
+        self.binary = subprotocol == MSGPACK_SUBPROTOCOL
+        await self.accept(subprotocol=subprotocol)
+        await self.channel_layer.group_add(CATALOG_GROUP, self.channel_name)
         self.player = None
+        self.known_player_version = 0
+        self.heartbeat = None
+        self.rate_limiter = ConnectionRateLimiter.from_settings()
+        # Messages are handled one at a time, in order, by a worker task, so
+        # receive() returns at once and can shed a flood instead of letting
+        # it pile up behind a slow handler.
+        self.pending = asyncio.Queue()
+        self.in_flight = 0
+        self.handler_time = 0.0
+        self.worker = asyncio.create_task(self.process_messages())
 
     async def disconnect(self, close_code):
+        self.worker.cancel()
+        self.stop_heartbeat()
+        await self.channel_layer.group_discard(CATALOG_GROUP, self.channel_name)
         if self.player:
             await self.channel_layer.group_discard(
                 f"player_{self.player.id}", self.channel_name
             )
+            await sync_to_async(player_disconnected)(self.player, self.channel_name)
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
-            msg_type = data.get("type")
-            handler = {
-                "register": self.handle_register,
-                "login": self.handle_login,
-                "logout": self.handle_logout,
-                "start_building": self.handle_start_building,
-                "create_building": self.handle_create_building,
-                "accelerate_building": self.handle_accelerate_building,
-                "update_resources": self.handle_update_resources,
-                "get_player_info": self.handle_get_player_info,
-                "get_allowed_buildings": self.handle_get_allowed_buildings,
-            }.get(msg_type)
-
-            if handler:
-                await handler(data)
+            if bytes_data is not None and self.binary:
+                data = unpackb(bytes_data)
             else:
-                await self.send_error(f"Unknown message type: {msg_type}")
+                data = json.loads(text_data)
+            msg_type = data.get("type")
+            if not isinstance(msg_type, str):
+                raise ValueError("Message type must be a string")
         except Exception as e:
-            await self.send_error(str(e))
+            return await self.send_error(str(e))
+        commands = data.get("commands")
+        cost = (
+            len(commands) if msg_type == "batch" and isinstance(commands, list) else 1
+        )
+        retry_after = self.rate_limiter.check(msg_type, cost)
+        if retry_after:
+            return await self.send_rate_limited(msg_type, retry_after, "rate")
+        if self.in_flight >= settings.WS_MAX_IN_FLIGHT:
+            # Roughly how long the queue ahead of a retry takes to drain
+            retry_after = max(0.1, self.in_flight * self.handler_time)
+            return await self.send_rate_limited(msg_type, retry_after, "in_flight")
+        self.in_flight += 1
+        self.pending.put_nowait(data)
+
+    async def process_messages(self):
+        while True:
+            data = await self.pending.get()
+            started = time.perf_counter()
+            try:
+                await self.handle_command(data)
+            except Exception as e:
+                await self.send_error(str(e))
+            finally:
+                self.in_flight -= 1
+                self.handler_time = 0.8 * self.handler_time + 0.2 * (
+                    time.perf_counter() - started
+                )
+
+    async def send_rate_limited(self, msg_type, retry_after, reason):
+        WS_RATE_LIMITED.inc(reason)
+        await self.send_json(
+            {
+                "type": "rate_limited",
+                "message_type": msg_type,
+                "reason": reason,
+                "retry_after": round(retry_after, 3),
+            }
+        )
+
+    async def handle_command(self, data):
+        msg_type = data.get("type")
+        handler = {
+            "register": self.handle_register,
+            "login": self.handle_login,
+            "resume": self.handle_resume,
+            "logout": self.handle_logout,
+            "start_building": self.handle_start_building,
+            "create_building": self.handle_create_building,
+            "create_buildings": self.handle_create_buildings,
+            "accelerate_building": self.handle_accelerate_building,
+            "update_resources": self.handle_update_resources,
+            "get_player_info": self.handle_get_player_info,
+            "get_allowed_buildings": self.handle_get_allowed_buildings,
+            "get_catalog": self.handle_get_catalog,
+            "get_leaderboard": self.handle_get_leaderboard,
+            "get_my_rank": self.handle_get_my_rank,
+            "enqueue_building": self.handle_enqueue_building,
+            "reorder_queue": self.handle_reorder_queue,
+            "cancel_queued": self.handle_cancel_queued,
+            "resync": self.handle_resync,
+            "batch": self.handle_batch,
+        }.get(msg_type)
+
+        if not handler:
+            WS_MESSAGES.inc("unknown")
+            return await self.send_error(f"Unknown message type: {msg_type}")
+        started = time.perf_counter()
+        WS_MESSAGES.inc(msg_type)
+        try:
+            await handler(data)
+        except Exception:
+            WS_MESSAGE_ERRORS.inc(msg_type)
+            raise
+        finally:
+            WS_MESSAGE_DURATION.observe(time.perf_counter() - started, msg_type)
+            warmup.response_sent()
+
+    async def handle_batch(self, data):
+        # Commands run one after another, in order, each seeing the effects
+        # of the ones before it. A batch is not atomic: a failing command
+        # does not undo earlier ones or stop later ones.
+        commands = data.get("commands")
+        if not isinstance(commands, list) or not commands:
+            return await self.send_error(
+                "Batch needs a list of commands", "batch_failed"
+            )
+        if len(commands) > settings.WS_MAX_BATCH_SIZE:
+            return await self.send_error(
+                f"Batch exceeds {settings.WS_MAX_BATCH_SIZE} commands", "batch_failed"
+            )
+        results = []
+        for command in commands:
+            frames = []
+            token = captured_frames.set(frames)
+            try:
+                if (
+                    not isinstance(command, dict)
+                    or not isinstance(command.get("type"), str)
+                    or command["type"] == "batch"
+                ):
+                    await self.send_error("Invalid batch command")
+                else:
+                    # The batch already paid the connection-wide bucket
+                    retry_after = self.rate_limiter.check(command.get("type"), 0)
+                    if retry_after:
+                        await self.send_rate_limited(
+                            command.get("type"), retry_after, "rate"
+                        )
+                    else:
+                        await self.handle_command(command)
+            except Exception as e:
+                await self.send_error(str(e))
+            finally:
+                captured_frames.reset(token)
+            # Always the list of frames the command sent, usually just one
+            results.append(frames)
+        await self.send_json({"type": "batch_result", "results": results})
+
+    async def start_session(self, player):
+        self.player = player
+        self.known_player_version = player.version
+        await self.channel_layer.group_add(f"player_{player.id}", self.channel_name)
+        await sync_to_async(player_connected)(player, self.channel_name)
+        if settings.LAZY_BUILD_COMPLETION:
+            self.heartbeat = asyncio.create_task(self.keep_presence())
+
+    async def keep_presence(self):
+        # Presence expires unless refreshed, so a crashed worker's
+        # connections stop counting as online on their own
+        while True:
+            await asyncio.sleep(settings.PRESENCE_TTL / 3)
+            try:
+                await sync_to_async(refresh_presence)(self.player, self.channel_name)
+            except redis.RedisError:
+                pass  # Retried on the next beat, well within the TTL
+
+    def stop_heartbeat(self):
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+            self.heartbeat = None
 
     async def handle_register(self, data):
         result = await register_player(data)
         if result["type"] == "register_success":
-            self.player = await sync_to_async(Player.objects.get)(
-                username=data["username"]
-            )
-            await self.channel_layer.group_add(
-                f"player_{self.player.id}", self.channel_name
+            await self.start_session(
+                await sync_to_async(Player.objects.get)(username=data["username"])
             )
+            result["resume_token"] = issue_resume_token(self.player)
         await self.send_json(result)
 
     async def handle_login(self, data):
@@ -73,21 +260,47 @@ class GameConsumer(AsyncWebsocketConsumer):
             return
         player, error = await login_player(data)
         if player:
-            self.player = player
-            await self.channel_layer.group_add(
-                f"player_{self.player.id}", self.channel_name
+            await self.start_session(player)
+            await self.send_json(
+                {
+                    "type": "login_success",
+                    "player": serialize_player(player),
+                    "version": player.version,
+                    "resume_token": issue_resume_token(player),
+                }
             )
-            serialized = PlayerSerializer(player)
-            await self.send_json({"type": "login_success", "player": serialized.data})
         else:
             await self.send_json({"type": "login_failed", "error": error})
+
+    async def handle_resume(self, data):
+        # Reconnects skip password hashing: the signed token is checked and
+        # the player loaded with one read by id.
+        if self.player:
+            return await self.send_error("Already logged in", "resume_failed")
+        player, error = await resume_player(data.get("token"))
+        if not player:
+            return await self.send_error(error, "resume_failed")
+        await self.start_session(player)
+        await self.send_json(
+            {
+                "type": "resume_success",
+                "player": serialize_player(player),
+                "version": player.version,
+                "resume_token": issue_resume_token(player),
+            }
+        )
     @require_auth
     async def handle_logout(self, data):
         # Leave the group
         await self.channel_layer.group_discard(
             f"player_{self.player.id}", self.channel_name
         )
+        self.stop_heartbeat()
+        await sync_to_async(player_disconnected)(self.player, self.channel_name)
+        # A captured resume token must not outlive the session
+        await logout_player(self.player)
         self.player = None  # Clear session
+        self.known_player_version = 0
         await self.send_json({"type": "logout_success"})
 
     @require_auth
@@ -104,6 +317,7 @@ class GameConsumer(AsyncWebsocketConsumer):
                     "type": "building_started",
                     "building_id": str(building_id),
                     "completion_time": completion_time.isoformat(),
+                    "version": self.player.version,
                 }
             )
         except ValueError as e:
@@ -113,16 +327,45 @@ class GameConsumer(AsyncWebsocketConsumer):
                 f"Unexpected error starting building: {str(e)}", "building_start_failed"
             )
 
+    @require_auth
+    async def handle_enqueue_building(self, data):
+        result = await enqueue_building(self.player, data.get("building_id"))
+        await self.send_json(result)
+
+    @require_auth
+    async def handle_reorder_queue(self, data):
+        result = await reorder_queue(self.player, data.get("building_ids"))
+        await self.send_json(result)
+
+    @require_auth
+    async def handle_cancel_queued(self, data):
+        result = await cancel_queued(self.player, data.get("building_id"))
+        await self.send_json(result)
+
     async def handle_create_building(self, data):
         building, error = await create_building(data)
         if building:
-            serializer = BuildingSerializer(building)
             await self.send_json(
-                {"type": "create_building_success", "building": serializer.data}
+                {
+                    "type": "create_building_success",
+                    "building": serialize_building(building),
+                }
             )
         else:
             await self.send_error(error, "create_building_failed")
 
+    async def handle_create_buildings(self, data):
+        buildings, errors = await create_buildings(data.get("buildings"))
+        if errors:
+            return await self.send_error(errors, "create_buildings_failed")
+        await self.send_json(
+            {
+                "type": "create_buildings_success",
+                "count": len(buildings),
+                "building_ids": [b.building_id for b in buildings],
+            }
+        )
+
     @require_auth
     async def handle_accelerate_building(self, data):
         building_id = data.get("building_id")
@@ -142,19 +385,101 @@ class GameConsumer(AsyncWebsocketConsumer):
 
     @require_auth
     async def handle_get_allowed_buildings(self, data):
-        result = await get_allowed_buildings(self.player)
+        result = await get_allowed_buildings(self.player, data.get("if_version"))
+        await self.send_json(result)
+
+    async def handle_get_catalog(self, data):
+        result = await get_catalog(data.get("if_version"))
+        await self.send_json(result)
+
+    async def handle_get_leaderboard(self, data):
+        result = await get_leaderboard(data)
+        await self.send_json(result)
+
+    @require_auth
+    async def handle_get_my_rank(self, data):
+        result = await get_my_rank(self.player, data)
+        await self.send_json(result)
+
+    @require_auth
+    async def handle_resync(self, data):
+        # The client saw a version gap, so always serve a fresh copy
+        await self.reload_player()
+        result = await get_player_info(self.player)
+        result["type"] = "player_snapshot"
         await self.send_json(result)
 
+    async def reload_player(self):
+        await refresh_player(self.player)
+        self.known_player_version = max(self.known_player_version, self.player.version)
+
+    def observe_player_version(self, event):
+        self.known_player_version = max(
+            self.known_player_version, event.get("version", 0)
+        )
+
+    async def player_version(self, event):
+        self.observe_player_version(event)
+
+    async def buildings_completed(self, event):
+        # One channel-layer event per player and completion batch, forwarded
+        # to the client as the usual building_completed and update frames.
+        self.observe_player_version(event)
+        for building_id in event["building_ids"]:
+            await self.send_json(
+                {"type": "building_completed", "building_id": building_id}
+            )
+        for started in event.get("started", ()):
+            await self.send_json({"type": "queued_building_started", **started})
+        if "changes" in event:
+            await self.send_json(
+                {
+                    "type": "player_patch",
+                    "version": event["version"],
+                    "changes": event["changes"],
+                }
+            )
+        else:
+            await self.send_json({"type": "player_updated", "player": event["player"]})
+
     async def building_completed(self, event):
+        self.observe_player_version(event)
         await self.send_json(
             {"type": "building_completed", "building_id": event["building_id"]}
         )
 
     async def player_updated(self, event):
+        self.observe_player_version(event)
         await self.send_json({"type": "player_updated", "player": event["player"]})
 
+    async def player_patch(self, event):
+        self.observe_player_version(event)
+        await self.send_json(
+            {
+                "type": "player_patch",
+                "version": event["version"],
+                "changes": event["changes"],
+            }
+        )
+
+    async def catalog_changed(self, event):
+        # Without "buildings" the change was too big to push; clients
+        # re-fetch it with get_catalog.
+        message = {"type": "catalog_updated", "version": str(event["version"])}
+        if "buildings" in event:
+            message["buildings"] = event["buildings"]
+        await self.send_json(message)
+
     async def send_error(self, error, msg_type="error"):
         await self.send_json({"type": msg_type, "error": error})
 
     async def send_json(self, data):
-        await self.send(text_data=json.dumps(data))
+        frames = captured_frames.get()
+        if frames is not None:
+            # Inside a batch: collected into the single batch_result frame
+            frames.append(data)
+            return
+        if self.binary:
+            await self.send(bytes_data=packb(data))
+        else:
+            await self.send(text_data=dumps(data))
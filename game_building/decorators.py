@@ -1,5 +1,5 @@
 from functools import wraps
-from asgiref.sync import sync_to_async
+from game_building.apps.players.exceptions import StalePlayerError
 
 def require_auth(func):
     @wraps(func)
@@ -7,7 +7,14 @@ def require_auth(func):
         if not self.player:
             return await self.send_error("Not authenticated")
 
-        await sync_to_async(self.player.refresh_from_db)()
-        return await func(self, *args, **kwargs)
+        # Only reload when another writer has announced a newer version.
+        if self.player.version < self.known_player_version:
+            await self.reload_player()
+        try:
+            return await func(self, *args, **kwargs)
+        except StalePlayerError:
+            # Lost a race with a writer whose notification is still in flight.
+            await self.reload_player()
+            return await func(self, *args, **kwargs)
 
-    return wrapper
\ No newline at end of file
+    return wrapper
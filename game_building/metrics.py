@@ -0,0 +1,277 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from asgiref.sync import sync_to_async
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+REGISTRY = []
+
+
+def _format_labels(labelnames, labels, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter, rendered in Prometheus text format."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                )
+        return lines
+
+
+class Gauge:
+    """Value that can go up and down, rendered in Prometheus text format."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+        ]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                )
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; observing is a bisect and two additions."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+WS_MESSAGE_DURATION = Histogram(
+    "game_ws_message_duration_seconds",
+    "Time spent handling a WebSocket message",
+    ("type",),
+)
+WS_MESSAGES = Counter("game_ws_messages_total", "WebSocket messages handled", ("type",))
+WS_MESSAGE_ERRORS = Counter(
+    "game_ws_message_errors_total",
+    "WebSocket messages whose handler raised",
+    ("type",),
+)
+WS_RATE_LIMITED = Counter(
+    "game_ws_rate_limited_total",
+    "WebSocket messages shed by rate limits or the in-flight cap",
+    ("reason",),
+)
+SERVICE_DURATION = Histogram(
+    "game_service_duration_seconds", "Time spent inside a service", ("service",)
+)
+SERVICE_ERRORS = Counter(
+    "game_service_errors_total", "Services that raised", ("service",)
+)
+THREADPOOL_WAIT = Histogram(
+    "game_threadpool_wait_seconds",
+    "Time a service waited for the sync_to_async executor",
+    ("service",),
+)
+MONGO_COMMANDS = Counter(
+    "game_mongo_commands_total", "Mongo commands issued", ("command",)
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "game_mongo_command_failures_total", "Mongo commands that failed", ("command",)
+)
+STARTUP_IMPORT_SECONDS = Gauge(
+    "game_startup_import_seconds", "Time spent importing the application"
+)
+WARMUP_STEP_SECONDS = Gauge(
+    "game_warmup_step_seconds", "Duration of each warmup step", ("step",)
+)
+WARMUP_READY = Gauge("game_warmup_ready", "1 once warmup has completed")
+FIRST_RESPONSE_SECONDS = Gauge(
+    "game_time_to_first_response_seconds",
+    "Time from process start to the first handled WebSocket message",
+)
+COMPLETION_LAG = Histogram(
+    "game_build_completion_lag_seconds",
+    "Delay between a building's finish_eta and its completion",
+    buckets=LAG_BUCKETS,
+)
+
+
+def timed_sync_to_async(func):
+    """``sync_to_async`` that records executor wait, duration and errors."""
+    name = func.__name__
+
+    def run(queued_at, *args, **kwargs):
+        started = time.perf_counter()
+        THREADPOOL_WAIT.observe(started - queued_at, name)
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            SERVICE_ERRORS.inc(name)
+            raise
+        finally:
+            SERVICE_DURATION.observe(time.perf_counter() - started, name)
+
+    run_async = sync_to_async(run)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_async(time.perf_counter(), *args, **kwargs)
+
+    return wrapper
+
+
+def timed_async(func):
+    """Record duration and errors of a native async service."""
+    name = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            SERVICE_ERRORS.inc(name)
+            raise
+        finally:
+            SERVICE_DURATION.observe(time.perf_counter() - started, name)
+
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port):
+    """Serve metrics from a daemon thread, for processes without Django views."""
+    server = ThreadingHTTPServer(("", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class MongoCommandCounter(monitoring.CommandListener):
+    def started(self, event):
+        MONGO_COMMANDS.inc(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        MONGO_COMMAND_FAILURES.inc(event.command_name)
+
+
+monitoring.register(MongoCommandCounter())
@@ -0,0 +1,58 @@
+import asyncio
+import weakref
+from django.conf import settings
+from django_mongodb_backend.fields import EmbeddedModelArrayField, EmbeddedModelField
+from pymongo import AsyncMongoClient
+
+# An AsyncMongoClient is bound to the event loop it was first used on.
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_db():
+    """Return the async database for ``MONGO_URI`` on the running loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncMongoClient(settings.MONGO_URI, tz_aware=True)
+    return client[settings.DATABASES["default"]["NAME"]]
+
+
+def get_async_collection(model):
+    return get_async_db()[model._meta.db_table]
+
+
+def _from_value(field, value):
+    if value is None:
+        return value
+    if isinstance(field, EmbeddedModelArrayField):
+        return [_embedded_from_document(field.embedded_model, v) for v in value]
+    if isinstance(field, EmbeddedModelField):
+        return _embedded_from_document(field.embedded_model, value)
+    return value
+
+
+def _embedded_from_document(model, document):
+    return model(
+        **{
+            field.attname: _from_value(field, document[field.column])
+            for field in model._meta.concrete_fields
+            if field.column in document
+        }
+    )
+
+
+def model_from_document(model, document):
+    """Build a saved ``model`` instance from a raw document.
+
+    The instance is indistinguishable from one the ORM loaded, so it can be
+    passed to sync services and saved normally.
+    """
+    names, values = [], []
+    for field in model._meta.concrete_fields:
+        key = "_id" if field.primary_key else field.column
+        names.append(field.attname)
+        if key in document:
+            values.append(_from_value(field, document[key]))
+        else:
+            values.append(field.get_default())
+    return model.from_db(model.objects.db, names, values)
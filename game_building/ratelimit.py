@@ -0,0 +1,74 @@
+import time
+from django.conf import settings
+
+
+class TokenBucket:
+    """Allows ``rate`` messages per second on average, ``burst`` at once."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost=1):
+        """Seconds until ``cost`` tokens are available; 0 if they are now.
+
+        A cost above ``burst`` only needs a full bucket, but take() charges
+        all of it, so the balance goes negative and pays the rest off.
+        """
+        self._refill()
+        needed = min(cost, self.burst)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self, cost=1):
+        self.tokens -= cost
+
+
+class ConnectionRateLimiter:
+    """Token buckets for one WebSocket connection.
+
+    Every message is charged to the connection-wide bucket and to the
+    bucket of its message type, if that type has a limit. A message is only
+    charged when both buckets can afford it.
+    """
+
+    def __init__(self, rate, burst, limits_by_type, clock=time.monotonic):
+        self.connection = TokenBucket(rate, burst, clock) if rate else None
+        self.by_type = {
+            msg_type: TokenBucket(type_rate, type_burst, clock)
+            for msg_type, (type_rate, type_burst) in limits_by_type.items()
+        }
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.WS_RATE_LIMIT, settings.WS_RATE_BURST, settings.WS_RATE_LIMITS
+        )
+
+    def check(self, msg_type, connection_cost=1):
+        """Charge one ``msg_type`` message.
+
+        Returns 0 if it may run, otherwise the seconds to wait before
+        retrying. ``connection_cost`` is what the message costs against the
+        connection-wide bucket (a batch pays for all of its commands there).
+        """
+        charges = []
+        if self.connection is not None and connection_cost:
+            charges.append((self.connection, connection_cost))
+        bucket = self.by_type.get(msg_type)
+        if bucket is not None:
+            charges.append((bucket, 1))
+        retry_after = max((b.wait_time(cost) for b, cost in charges), default=0.0)
+        if not retry_after:
+            for b, cost in charges:
+                b.take(cost)
+        return retry_after
@@ -0,0 +1,52 @@
+import asyncio
+import weakref
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+_client = None
+_fake_server = None
+
+
+def _fakeredis():
+    """Return the fakeredis module and the process-wide server it shares."""
+    global _fake_server
+    try:
+        import fakeredis
+        import fakeredis.aioredis
+    except ImportError:
+        raise ImproperlyConfigured('REDIS_BACKEND = "fake" needs the fakeredis package')
+    if _fake_server is None:
+        _fake_server = fakeredis.FakeServer()
+    return fakeredis, _fake_server
+
+
+def get_redis():
+    """Return the process-wide Redis client for ``settings.REDIS_URL``."""
+    global _client
+    if _client is None:
+        if settings.REDIS_BACKEND == "fake":
+            fakeredis, server = _fakeredis()
+            _client = fakeredis.FakeRedis(server=server)
+        else:
+            _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+# redis.asyncio connections are bound to the loop they were opened on.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis():
+    """Return a ``redis.asyncio`` client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if settings.REDIS_BACKEND == "fake":
+            fakeredis, server = _fakeredis()
+            client = fakeredis.aioredis.FakeRedis(server=server)
+        else:
+            client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+        _async_clients[loop] = client
+    return client
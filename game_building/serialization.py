@@ -0,0 +1,141 @@
+import json
+from datetime import datetime
+from rest_framework import serializers
+from rest_framework.fields import is_simple_callable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - installed with channels-redis
+    msgpack = None
+
+JSON_SUBPROTOCOL = "game.json"
+MSGPACK_SUBPROTOCOL = "game.msgpack"
+
+# Keys that hold ISO datetimes in every payload; MessagePack frames carry
+# them as integer epoch milliseconds instead.
+TIMESTAMP_KEYS = frozenset(
+    {
+        "started_at",
+        "finish_eta",
+        "settled_at",
+        "completion_time",
+        "new_finish_eta",
+        "queued_at",
+        "estimated_start",
+        "estimated_finish",
+    }
+)
+
+
+class CompiledSerializer:
+    """Read-only fast path for a DRF serializer class.
+
+    The serializer's readable fields are resolved once into a list of
+    ``(name, source_attrs, to_representation)`` accessors, so serializing an
+    object no longer instantiates and binds a serializer. Each field still
+    uses DRF's own ``to_representation``, so the output is identical to
+    ``serializer_class(obj).data``.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self._fields = None
+
+    def _compile(self, serializer):
+        fields = []
+        for field in serializer._readable_fields:
+            if isinstance(field, serializers.ListSerializer):
+                child = self._compile(field.child)
+                to_representation = self._many(child)
+            elif isinstance(field, serializers.BaseSerializer):
+                to_representation = self._one(self._compile(field))
+            else:
+                to_representation = field.to_representation
+            fields.append((field.field_name, field.source_attrs, to_representation))
+        return fields
+
+    def _one(self, fields):
+        return lambda obj: self._serialize(fields, obj)
+
+    def _many(self, fields):
+        return lambda objs: [self._serialize(fields, obj) for obj in objs]
+
+    @staticmethod
+    def _serialize(fields, obj):
+        data = {}
+        for name, source_attrs, to_representation in fields:
+            value = obj
+            for attr in source_attrs:
+                value = getattr(value, attr)
+                if is_simple_callable(value):
+                    value = value()
+            data[name] = None if value is None else to_representation(value)
+        return data
+
+    def __call__(self, obj):
+        if self._fields is None:
+            self._fields = self._compile(self.serializer_class())
+        return self._serialize(self._fields, obj)
+
+
+def dumps(data):
+    """Encode ``data`` as a JSON string, using orjson when it is installed.
+
+    The fallback is configured to match orjson's output byte for byte:
+    compact separators and non-ASCII characters left unescaped.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode()
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _epoch_ms(value):
+    try:
+        return round(datetime.fromisoformat(value).timestamp() * 1000)
+    except ValueError:
+        return value
+
+
+def _compact(value):
+    if isinstance(value, dict):
+        return {
+            key: (
+                _epoch_ms(item)
+                if key in TIMESTAMP_KEYS and isinstance(item, str)
+                else _compact(item)
+            )
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value]
+    return value
+
+
+def negotiate_subprotocol(offered):
+    """Pick the WebSocket subprotocol to accept from the client's offer.
+
+    MessagePack is opt-in; without an offer the connection speaks JSON and
+    no subprotocol is echoed back.
+    """
+    if MSGPACK_SUBPROTOCOL in offered and msgpack is not None:
+        return MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
+
+
+def packb(data):
+    """Encode ``data`` as MessagePack, with timestamps as epoch milliseconds."""
+    return msgpack.packb(_compact(data))
+
+
+def unpackb(data):
+    return msgpack.unpackb(data)
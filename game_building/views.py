@@ -0,0 +1,16 @@
+from django.http import HttpResponse, JsonResponse
+from game_building import metrics
+from game_building.warmup import warmup
+
+
+def metrics_view(request):
+    """Expose this process's metrics in Prometheus text format."""
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def ready_view(request):
+    """Report 200 once warmup has completed, 503 until then."""
+    warmup.ensure_started()
+    return JsonResponse(warmup.status(), status=200 if warmup.ready else 503)
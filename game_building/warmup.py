@@ -0,0 +1,222 @@
+"""Cold-start warmup.
+
+Opens the database and Redis connections, loads the building catalog and
+exercises the serializers before a process takes traffic, so the first
+players after a deploy do not pay for that lazy work. ``/ready`` reports
+ready only once this has completed.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from game_building.metrics import (
+    FIRST_RESPONSE_SECONDS,
+    STARTUP_IMPORT_SECONDS,
+    WARMUP_READY,
+    WARMUP_STEP_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def warm_database():
+    from game_building.apps.players.mongo import player_collection
+
+    # One round trip opens the pool behind the ORM and the raw collections
+    player_collection().find_one({}, {"_id": 1})
+
+
+def warm_redis():
+    from game_building.redis_client import get_redis
+
+    get_redis().ping()
+
+
+def warm_catalog():
+    from game_building.apps.buildings.cache import building_catalog
+
+    building_catalog.index()
+
+
+def warm_serializers():
+    from game_building.apps.buildings.models import Building
+    from game_building.apps.buildings.serializers import (
+        BuildingCreateSerializer,
+        BuildingImportSerializer,
+        serialize_building,
+    )
+    from game_building.apps.players.models import Player
+    from game_building.apps.players.serializers import (
+        PlayerCreateSerializer,
+        PlayerLoginSerializer,
+        PlayerResourcesUpdateSerializer,
+        serialize_player,
+    )
+
+    serialize_player(Player(username="warmup", email="warmup@example.com"))
+    serialize_building(
+        Building(
+            building_id=0,
+            name="warmup",
+            build_time=0,
+            required_wood=0,
+            required_stone=0,
+        )
+    )
+    for serializer_class in (
+        BuildingCreateSerializer,
+        BuildingImportSerializer,
+        PlayerCreateSerializer,
+        PlayerLoginSerializer,
+        PlayerResourcesUpdateSerializer,
+    ):
+        serializer_class().fields
+
+
+def warm_celery():
+    from game_building.config.celery import app
+
+    # Leaves a broker connection in the producer pool for the first publish
+    with app.producer_pool.acquire(block=True) as producer:
+        producer.connection.ensure_connection(max_retries=1)
+
+
+async def warm_async_clients():
+    from game_building.mongo_client import get_async_db
+    from game_building.redis_client import get_async_redis
+
+    await get_async_db().command("ping")
+    await get_async_redis().ping()
+
+
+async def warm_channel_layer():
+    from channels.layers import get_channel_layer
+
+    # Sending to a group nobody is in still opens the layer's connection
+    await get_channel_layer().group_send("warmup", {"type": "warmup"})
+
+
+SYNC_STEPS = (
+    ("database", warm_database),
+    ("redis", warm_redis),
+    ("catalog", warm_catalog),
+    ("serializers", warm_serializers),
+)
+ASGI_STEPS = SYNC_STEPS + (("celery", warm_celery),)
+ASYNC_STEPS = (
+    ("async_clients", warm_async_clients),
+    ("channel_layer", warm_channel_layer),
+)
+
+
+class Warmup:
+    def __init__(self):
+        self.process_started = time.perf_counter()
+        self.ready = False
+        self.started = False
+        self.error = None
+        self.durations = {}
+        self.first_response_seen = False
+        self._lock = threading.Lock()
+
+    def imported(self, started):
+        """Record how long importing the application took since ``started``."""
+        self.process_started = started
+        STARTUP_IMPORT_SECONDS.set(round(time.perf_counter() - started, 6))
+
+    def _claim(self):
+        with self._lock:
+            if self.started:
+                return False
+            self.started = True
+            return True
+
+    def _record(self, name, started):
+        self.durations[name] = round(time.perf_counter() - started, 6)
+        WARMUP_STEP_SECONDS.set(self.durations[name], name)
+
+    def _done(self):
+        self.ready = True
+        self.error = None
+        WARMUP_READY.set(1)
+        logger.info("Warmup complete: %s", self.durations)
+
+    def run_sync(self, steps=SYNC_STEPS):
+        """Run the sync steps once, in the calling thread."""
+        try:
+            for name, step in steps:
+                started = time.perf_counter()
+                step()
+                self._record(name, started)
+        except Exception as e:
+            self.error = f"{name}: {e}"
+            logger.exception("Warmup step %s failed", name)
+            return False
+        self._done()
+        return True
+
+    async def run(self):
+        """Run every step, retrying until warmup succeeds."""
+        if not self._claim():
+            return
+        while True:
+            try:
+                for name, step in ASGI_STEPS:
+                    started = time.perf_counter()
+                    # Same thread as the services, so it warms their connection
+                    await sync_to_async(step)()
+                    self._record(name, started)
+                for name, step in ASYNC_STEPS:
+                    started = time.perf_counter()
+                    await step()
+                    self._record(name, started)
+            except Exception as e:
+                self.error = f"{name}: {e}"
+                logger.exception("Warmup step %s failed, retrying", name)
+                await asyncio.sleep(settings.WARMUP_RETRY_INTERVAL)
+                continue
+            self._done()
+            return
+
+    def _run_fallback(self):
+        if not self.run_sync(ASGI_STEPS):
+            # Let the next readiness probe try again
+            self.started = False
+
+    def ensure_started(self):
+        """Warm up in a background thread if no lifespan startup did."""
+        if self._claim():
+            threading.Thread(target=self._run_fallback, daemon=True).start()
+
+    def response_sent(self):
+        if not self.first_response_seen:
+            self.first_response_seen = True
+            FIRST_RESPONSE_SECONDS.set(
+                round(time.perf_counter() - self.process_started, 6)
+            )
+
+    def status(self):
+        return {"ready": self.ready, "error": self.error, "steps": self.durations}
+
+
+warmup = Warmup()
+
+
+class LifespanApp:
+    """ASGI lifespan handler that starts warmup without delaying startup."""
+
+    async def __call__(self, scope, receive, send):
+        task = None
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                task = asyncio.create_task(warmup.run())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if task is not None:
+                    task.cancel()
+                await send({"type": "lifespan.shutdown.complete"})
+                return